@@ -0,0 +1,170 @@
+"""Bin coordinates and walking-order planning for set bins.
+
+A bin is addressed by (aisle, shelf, position). Aisles are joined by a single
+cross aisle at position 0, so moving between aisles means walking back to the
+front of one aisle and up the next. Shelf changes cost a little (reaching up or
+down) but far less than walking.
+"""
+import os
+import re
+
+AISLE_SPACING = float(os.getenv('BIN_AISLE_SPACING', '4'))
+SHELF_COST = float(os.getenv('BIN_SHELF_COST', '0.25'))
+START = (0, 0, 0)
+
+# Planned routes keyed by the exact set of bin coordinates visited; picklist
+# refreshes re-request the same walk many times while bins rarely change.
+_route_cache = {}
+
+
+def parse_location(location):
+    """Best-effort (aisle, shelf, position) from a label like "A-3-12" or "2.1.7".
+
+    Two-part labels ("B4", "B-4") are aisle and position, with no shelf.
+    Letters count from 1 (A=1, B=2, ... AA=27). Missing parts are None.
+    """
+    parts = [p for p in re.split(r'[^0-9A-Za-z]+', (location or '').strip()) if p]
+    # "A12" style: split a letter prefix from the digits that follow it.
+    if len(parts) == 1:
+        m = re.fullmatch(r'([A-Za-z]+)(\d+)', parts[0])
+        if m:
+            parts = [m.group(1), m.group(2)]
+    out = []
+    for p in parts[:3]:
+        if p.isdigit():
+            out.append(int(p))
+        elif p.isalpha():
+            n = 0
+            for ch in p.upper():
+                n = n * 26 + (ord(ch) - 64)
+            out.append(n)
+        else:
+            out.append(None)
+    if len(out) == 2:
+        out.insert(1, None)
+    while len(out) < 3:
+        out.append(None)
+    return tuple(out)
+
+
+def bin_coords(row):
+    """Coordinates for a set_bins row, falling back to parsing its location."""
+    aisle, shelf, position = row.get('aisle'), row.get('shelf'), row.get('position')
+    if aisle is None and shelf is None and position is None:
+        aisle, shelf, position = parse_location(row.get('location'))
+    if aisle is None and position is None:
+        return None
+    return (aisle or 0, shelf or 0, position or 0)
+
+
+def distance(a, b):
+    aisle_a, shelf_a, pos_a = a
+    aisle_b, shelf_b, pos_b = b
+    shelf = SHELF_COST * abs(shelf_a - shelf_b)
+    if aisle_a == aisle_b:
+        return abs(pos_a - pos_b) + shelf
+    return pos_a + pos_b + AISLE_SPACING * abs(aisle_a - aisle_b) + shelf
+
+
+def route_length(points, start=START):
+    total = 0.0
+    prev = start
+    for p in points:
+        total += distance(prev, p)
+        prev = p
+    return total
+
+
+def _nearest_neighbor(points, start):
+    remaining = list(range(len(points)))
+    order = []
+    here = start
+    while remaining:
+        best = min(remaining, key=lambda i: (distance(here, points[i]), i))
+        remaining.remove(best)
+        order.append(best)
+        here = points[best]
+    return order
+
+
+def _two_opt(order, points, start, max_passes=50):
+    """Reverse segments while doing so shortens the open path from `start`."""
+    if len(order) < 3:
+        return order
+    order = list(order)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(len(order) - 1):
+            before = start if i == 0 else points[order[i - 1]]
+            first = points[order[i]]
+            for j in range(i + 1, len(order)):
+                last = points[order[j]]
+                after = points[order[j + 1]] if j + 1 < len(order) else None
+                old = distance(before, first) + (distance(last, after) if after is not None else 0.0)
+                new = distance(before, last) + (distance(first, after) if after is not None else 0.0)
+                if new + 1e-9 < old:
+                    order[i:j + 1] = reversed(order[i:j + 1])
+                    first = points[order[i]]
+                    improved = True
+        if not improved:
+            break
+    return order
+
+
+def plan_route(points, start=START):
+    """Visit order (indexes into `points`) via nearest-neighbor then 2-opt."""
+    if not points:
+        return []
+    return _two_opt(_nearest_neighbor(points, start), points, start)
+
+
+def set_key(game, set_code):
+    return ((game or '').strip().lower(), (set_code or '').strip().lower())
+
+
+def load_bins_from_rows(rows):
+    """{(game, set_code): (aisle, shelf, position)} for every bin with a usable location."""
+    out = {}
+    for row in rows:
+        coords = bin_coords(dict(row))
+        if coords is not None:
+            out[set_key(row['game'], row['set_code'])] = coords
+    return out
+
+
+def load_bins(conn):
+    return load_bins_from_rows(
+        conn.execute('SELECT game, set_code, location, aisle, shelf, position FROM set_bins ORDER BY id').fetchall()
+    )
+
+
+def set_order(set_keys, bins):
+    """Order (game, set_code) pairs along the shortest walk through their bins.
+
+    Sets without a bin go last, alphabetically.
+    """
+    keys = list(dict.fromkeys(set_key(g, s) for g, s in set_keys))
+    located = [k for k in keys if k in bins]
+    unlocated = sorted(k for k in keys if k not in bins)
+    # Sets sharing a bin are picked together; route over distinct coordinates.
+    points = tuple(sorted(set(bins[k] for k in located)))
+    rank = _route_cache.get(points)
+    if rank is None:
+        rank = {p: i for i, p in enumerate(points[i] for i in plan_route(points))}
+        if len(_route_cache) >= 64:
+            _route_cache.clear()
+        _route_cache[points] = rank
+    located.sort(key=lambda k: (rank[bins[k]], k))
+    return located + unlocated
+
+
+def path_rank(conn, items):
+    """{(game, set_code): walk position} for the sets present in `items`."""
+    order = set_order([(r.get('game'), r.get('set_code')) for r in items], load_bins(conn))
+    return {k: i for i, k in enumerate(order)}
+
+
+def batch_path_rank(conn, batch_id):
+    """path_rank for every set in a batch (not just pending ones, so the walk is stable)."""
+    rows = conn.execute('SELECT DISTINCT game, set_code FROM batch_items WHERE batch_id = ?', (batch_id,)).fetchall()
+    return path_rank(conn, [dict(r) for r in rows])
@@ -0,0 +1,266 @@
+"""Ingest Scryfall bulk-data files into card_cache.
+
+The default-cards file is large (~500 MB), so it is streamed: downloaded to
+disk in chunks, parsed one card at a time (app/jsonstream.py) and upserted in
+chunks. Cards whose JSON is byte-for-byte unchanged since the last ingest are
+skipped by comparing a content hash.
+"""
+import os
+
+from .env import load_optional_dotenv
+
+load_optional_dotenv()
+import gzip
+import hashlib
+import io
+import json
+import time
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime
+
+import requests
+
+from . import cardnames, jsonstream, scryfall
+from .db import get_conn
+
+log = logging.getLogger('bulkdata')
+
+BULK_TYPE = os.getenv('SCRYFALL_BULK_TYPE', 'default_cards')
+# Hours between scheduled ingests; 0 disables the background job.
+INTERVAL_HOURS = float(os.getenv('SCRYFALL_BULK_INTERVAL_HOURS', '0'))
+CHUNK_SIZE = int(os.getenv('SCRYFALL_BULK_CHUNK', '500'))
+# Bound parameters per IN (...) list; old SQLite builds allow 999 per statement.
+IN_CHUNK = 500
+DOWNLOAD_DIR = Path('data/cache/bulk')
+
+_run_lock = threading.Lock()
+_worker_lock = threading.Lock()
+_worker = None
+
+
+def _utc_now():
+    return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+
+_COLUMNS = scryfall.CARD_COLUMNS + ('content_hash',)
+_UPSERT_SQL = (
+    f"INSERT INTO card_cache ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' for _ in _COLUMNS)}) "
+    'ON CONFLICT(scryfall_id) DO UPDATE SET '
+    + ', '.join(f'{c} = excluded.{c}' for c in _COLUMNS if c != 'scryfall_id')
+)
+
+
+def _card_row(card, now):
+    # Hash the full card (before pruning) so any upstream change is noticed.
+    digest = hashlib.sha1(json.dumps(card, sort_keys=True).encode('utf-8')).hexdigest()
+    return scryfall.card_row(card, now) + (digest,)
+
+
+def _existing_hashes(conn, ids):
+    out = {}
+    for start in range(0, len(ids), IN_CHUNK):
+        chunk = ids[start:start + IN_CHUNK]
+        placeholders = ','.join(['?'] * len(chunk))
+        for r in conn.execute(
+            f'SELECT scryfall_id, content_hash FROM card_cache WHERE scryfall_id IN ({placeholders})',
+            tuple(chunk),
+        ).fetchall():
+            out[r['scryfall_id']] = r['content_hash']
+    return out
+
+
+def _flush(conn, rows, summary, cards):
+    existing = _existing_hashes(conn, [r[0] for r in rows])
+    changed = []
+    changed_cards = []
+    unchanged = []
+    for row, card in zip(rows, cards):
+        old = existing.get(row[0], False)
+        if old == row[-1]:
+            summary['unchanged'] += 1
+            unchanged.append(row[0])
+            continue
+        summary['inserted' if old is False else 'updated'] += 1
+        changed.append(row)
+        changed_cards.append(card)
+    if changed:
+        conn.executemany(_UPSERT_SQL, changed)
+        scryfall.save_sets(conn, changed_cards)
+        scryfall.clear_misses(conn, changed_cards)
+    if unchanged:
+        # An unchanged card has still been revalidated: reset its TTL.
+        for start in range(0, len(unchanged), IN_CHUNK):
+            chunk = unchanged[start:start + IN_CHUNK]
+            placeholders = ','.join(['?'] * len(chunk))
+            conn.execute(
+                f'UPDATE card_cache SET updated_at = ? WHERE scryfall_id IN ({placeholders})',
+                (rows[0][-2], *chunk),
+            )
+    conn.commit()
+    scryfall.forget_cards([r[0] for r in changed] + unchanged)
+
+
+def ingest(conn, fp, chunk_size=CHUNK_SIZE):
+    """Upsert every card in the JSON array read from text stream `fp`.
+
+    Returns counts: seen, inserted, updated, unchanged, skipped (no id).
+    """
+    summary = {'seen': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
+    now = _utc_now()
+    rows = []
+    cards = []
+    try:
+        for card in jsonstream.iter_array(fp):
+            summary['seen'] += 1
+            if not isinstance(card, dict) or not card.get('id'):
+                summary['skipped'] += 1
+                continue
+            rows.append(_card_row(card, now))
+            cards.append(card)
+            if len(rows) >= chunk_size:
+                _flush(conn, rows, summary, cards)
+                rows = []
+                cards = []
+        if rows:
+            _flush(conn, rows, summary, cards)
+    finally:
+        # Cheaper to rebuild the name index once than to patch it per chunk.
+        if summary['inserted'] or summary['updated']:
+            cardnames.invalidate()
+    return summary
+
+
+def ingest_path(conn, path, chunk_size=CHUNK_SIZE):
+    path = Path(path)
+    opener = gzip.open if path.suffix == '.gz' else open
+    with opener(path, 'rb') as raw:
+        return ingest(conn, io.TextIOWrapper(raw, encoding='utf-8'), chunk_size=chunk_size)
+
+
+def bulk_info(bulk_type=BULK_TYPE):
+    """Scryfall's metadata for a bulk file (download_uri, updated_at, size), or None."""
+    scryfall.API_LIMIT.acquire()
+    try:
+        resp = scryfall.http_session().get(f"{scryfall.BASE_URL}/bulk-data/{bulk_type}", timeout=30)
+        if resp.status_code == 200:
+            return resp.json()
+    except (requests.RequestException, ValueError):
+        return None
+    return None
+
+
+def download(info, dest_dir=DOWNLOAD_DIR):
+    """Stream a bulk file to disk; returns its path."""
+    dest_dir = Path(dest_dir)
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    dest = dest_dir / f"{info.get('type') or BULK_TYPE}.json"
+    tmp = dest.with_suffix('.part')
+    scryfall.IMAGE_LIMIT.acquire()
+    with scryfall.http_session().get(info['download_uri'], stream=True, timeout=300) as resp:
+        resp.raise_for_status()
+        with open(tmp, 'wb') as f:
+            for chunk in resp.iter_content(chunk_size=1 << 20):
+                f.write(chunk)
+    os.replace(tmp, dest)
+    return dest
+
+
+def last_run(conn):
+    row = conn.execute(
+        "SELECT * FROM scryfall_sync_log WHERE status IN ('ok', 'unchanged') "
+        'ORDER BY id DESC LIMIT 1'
+    ).fetchone()
+    if not row:
+        return None
+    out = dict(row)
+    try:
+        out['summary'] = json.loads(out.get('summary_json') or '{}')
+    except ValueError:
+        out['summary'] = {}
+    return out
+
+
+def _log(conn, started_at, status, summary=None, error=None):
+    conn.execute(
+        'INSERT INTO scryfall_sync_log (started_at, finished_at, status, summary_json, error_text) VALUES (?, ?, ?, ?, ?)',
+        (started_at, _utc_now(), status, json.dumps(summary) if summary else None, error),
+    )
+    conn.commit()
+
+
+def run(conn, path=None, force=False, bulk_type=BULK_TYPE):
+    """Ingest a local file, or download the latest bulk file if it changed.
+
+    Returns (summary, err). Only one run happens at a time per process.
+    """
+    if not _run_lock.acquire(blocking=False):
+        return None, 'bulk ingest already running'
+    started_at = _utc_now()
+    downloaded = None
+    try:
+        summary = {'source': str(path) if path else bulk_type}
+        if path is None:
+            info = bulk_info(bulk_type)
+            if not info or not info.get('download_uri'):
+                _log(conn, started_at, 'error', summary, 'bulk-data lookup failed')
+                return None, 'bulk-data lookup failed'
+            summary['bulk_updated_at'] = info.get('updated_at')
+            previous = last_run(conn)
+            if not force and previous and previous['summary'].get('bulk_updated_at') == info.get('updated_at'):
+                _log(conn, started_at, 'unchanged', summary)
+                return summary, None
+            downloaded = path = download(info)
+        started = time.monotonic()
+        summary.update(ingest_path(conn, path))
+        summary['seconds'] = round(time.monotonic() - started, 1)
+        _log(conn, started_at, 'ok', summary)
+        return summary, None
+    except Exception as exc:
+        log.exception('scryfall bulk ingest failed')
+        _log(conn, started_at, 'error', None, str(exc))
+        return None, str(exc)
+    finally:
+        if downloaded is not None:
+            Path(downloaded).unlink(missing_ok=True)
+        _run_lock.release()
+
+
+def _seconds_until_due(conn):
+    previous = last_run(conn)
+    if not previous:
+        return 0.0
+    finished = datetime.strptime(previous['finished_at'] or previous['started_at'], '%Y-%m-%d %H:%M:%S')
+    elapsed = (datetime.utcnow() - finished).total_seconds()
+    return max(0.0, INTERVAL_HOURS * 3600 - elapsed)
+
+
+def _run_forever():
+    while True:
+        try:
+            with get_conn() as conn:
+                wait = _seconds_until_due(conn)
+            if wait > 0:
+                time.sleep(min(wait, 3600))
+                continue
+            with get_conn() as conn:
+                _, err = run(conn)
+            if err:
+                time.sleep(600)
+        except Exception:
+            log.exception('scryfall bulk scheduler error')
+            time.sleep(600)
+
+
+def kick():
+    """Start the scheduled ingest thread if SCRYFALL_BULK_INTERVAL_HOURS is set."""
+    global _worker
+    if INTERVAL_HOURS <= 0:
+        return False
+    with _worker_lock:
+        if _worker is not None and _worker.is_alive():
+            return False
+        _worker = threading.Thread(target=_run_forever, name='scryfall-bulk', daemon=True)
+        _worker.start()
+        return True
@@ -0,0 +1,85 @@
+"""Compact storage format for card_cache.data_json.
+
+Stored values are BLOBs: one version byte followed by the payload. Version 1
+is raw-deflate (zlib) compressed JSON using a preset dictionary of the keys
+and URL prefixes every Scryfall card repeats, after dropping fields the app
+never reads. Plain JSON text from before the migration still decodes.
+
+ZDICT_V1 must never change once rows are written with it; a new dictionary
+needs a new version byte.
+"""
+import json
+import zlib
+
+VERSION = 1
+LEVEL = 6
+
+# Large per-card fields nothing in the app reads (the URIs are all derivable
+# from the id/set; legalities alone are ~1 KB per card).
+PRUNED_FIELDS = frozenset({
+    'legalities', 'purchase_uris', 'related_uris', 'uri', 'scryfall_uri', 'rulings_uri',
+    'prints_search_uri', 'set_uri', 'set_search_uri', 'scryfall_set_uri',
+    'multiverse_ids', 'mtgo_id', 'mtgo_foil_id', 'arena_id', 'tcgplayer_id', 'tcgplayer_etched_id',
+    'cardmarket_id', 'resource_id',
+})
+
+# Most common substrings last: deflate references them with the shortest
+# distances.
+ZDICT_V1 = (
+    '"preview":{"source":"","source_uri":"","previewed_at":"'
+    '"promo_types":["'
+    '"frame_effects":["legendary","'
+    '"all_parts":[{"object":"related_card","id":"","component":"combo_piece","name":"","type_line":"","uri":"'
+    '"card_faces":[{"object":"card_face","name":"","mana_cost":"","type_line":"","oracle_text":"",'
+    '"watermark":"","flavor_text":"","power":"","toughness":"","loyalty":"",'
+    '"produced_mana":["W","U","B","R","G","C"],"keywords":[],'
+    '"color_indicator":[],"colors":[],"color_identity":[],'
+    '"prices":{"usd":null,"usd_foil":null,"usd_etched":null,"eur":null,"eur_foil":null,"tix":null},'
+    '"finishes":["nonfoil","foil"],"games":["paper","mtgo","arena"],'
+    '"reserved":false,"foil":true,"nonfoil":true,"oversized":false,"promo":false,"reprint":true,'
+    '"variation":false,"digital":false,"full_art":false,"textless":false,"booster":true,'
+    '"story_spotlight":false,"highres_image":true,"image_status":"highres_scan",'
+    '"set_type":"expansion","border_color":"black","frame":"2015","security_stamp":"oval",'
+    '"rarity":"common","rarity":"uncommon","rarity":"rare","rarity":"mythic",'
+    '"layout":"normal","lang":"en","released_at":"20","edhrec_rank":,"penny_rank":,'
+    '"artist":"","artist_ids":["","illustration_id":"","card_back_id":"0aeebaf5-8c7d-4636-9e82-8c27447861f7",'
+    '"set_id":"","set":"","set_name":"","collector_number":"","cmc":0.0,'
+    '"type_line":"Legendary Creature — ","type_line":"Instant","type_line":"Sorcery",'
+    '"type_line":"Artifact","type_line":"Enchantment","type_line":"Basic Land — ",'
+    '"mana_cost":"{1}{W}{U}{B}{R}{G}","oracle_text":"When this creature enters,",'
+    '"png":"https://cards.scryfall.io/png/front/",'
+    '"art_crop":"https://cards.scryfall.io/art_crop/front/",'
+    '"border_crop":"https://cards.scryfall.io/border_crop/front/",'
+    '"image_uris":{"small":"https://cards.scryfall.io/small/front/",'
+    '"normal":"https://cards.scryfall.io/normal/front/",'
+    '"large":"https://cards.scryfall.io/large/front/",'
+    '{"object":"card","id":"","oracle_id":"","name":"'
+).encode('utf-8')
+
+
+def prune(card):
+    return {k: v for k, v in card.items() if k not in PRUNED_FIELDS}
+
+
+def encode(card):
+    """Card dict -> BLOB for card_cache.data_json."""
+    text = json.dumps(prune(card), separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    comp = zlib.compressobj(LEVEL, zlib.DEFLATED, -15, zdict=ZDICT_V1)
+    return bytes([VERSION]) + comp.compress(text) + comp.flush()
+
+
+def to_json(value):
+    """Stored value -> JSON text. Accepts BLOBs and legacy plain-JSON rows."""
+    if isinstance(value, str):
+        return value
+    value = bytes(value)
+    if value[:1] == b'{':
+        return value.decode('utf-8')
+    if value[0] != VERSION:
+        raise ValueError(f'unknown card_cache encoding version {value[0]}')
+    decomp = zlib.decompressobj(-15, zdict=ZDICT_V1)
+    return (decomp.decompress(value[1:]) + decomp.flush()).decode('utf-8')
+
+
+def decode(value):
+    return json.loads(to_json(value))
@@ -3,16 +3,40 @@ import os
 from .env import load_optional_dotenv
 
 load_optional_dotenv()
+import io
+import re
 import time
+import tempfile
+import threading
+from pathlib import Path
+from datetime import datetime
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process serialization only
+    fcntl = None
+
 import requests
 from requests.adapters import HTTPAdapter
-from datetime import datetime
+
+from . import jsonstream, pricehistory
 
 BASE_URL = os.getenv('CARDKINGDOM_BASE_URL', 'https://api.cardkingdom.com')
 PRICELIST_PATH = os.getenv('CARDKINGDOM_PRICELIST_PATH', '/api/v2/pricelist')
 
 MAX_RETRIES = int(os.getenv('CARDKINGDOM_MAX_RETRIES', '3'))
 TIMEOUT_SECONDS = int(os.getenv('CARDKINGDOM_TIMEOUT_SECONDS', '120'))
+CHUNK_SIZE = 2000
+# How much of a download to search for `meta` before giving up on stopping early.
+PEEK_BYTES = 1 << 20
+DOWNLOAD_DIR = Path('data/cache/cardkingdom')
+
+ROW_COLUMNS = ('scryfall_id', 'is_foil', 'name', 'edition', 'sku', 'url', 'price_buy', 'qty_buying')
+
+# Refreshes and rollbacks share ck_buylist_next / ck_buylist_prev, so only one
+# may run at a time: a thread lock here and an fcntl lock across workers.
+_buylist_lock = threading.Lock()
 
 SESSION = requests.Session()
 SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=4))
@@ -54,90 +78,263 @@ def _to_foil(value):
     return 1 if s in ('true', '1', 'yes', 'foil') else 0
 
 
-def fetch_pricelist():
-    """Download the full CardKingdom pricelist. Returns (payload_dict, error)."""
+def _peek_meta(head):
+    """The pricelist's `meta` from the first bytes of a download, if they hold all of it."""
+    rest = {}
+    try:
+        for _ in jsonstream.iter_member(io.StringIO(head.decode('utf-8', 'ignore')), 'data', rest):
+            break
+    except ValueError:
+        pass  # cut off mid-element; `meta` is there if it came first and is complete
+    return rest.get('meta')
+
+
+def download_pricelist(dest_dir=None, validators=None):
+    """Stream the full CardKingdom pricelist to disk.
+
+    `validators` ({'etag', 'last_modified', 'created_at'} of the loaded
+    pricelist) make the request conditional, and a download whose
+    meta.created_at matches is abandoned as soon as the meta has arrived.
+    Returns ({'path', 'etag', 'last_modified'}, error); path is None when the
+    pricelist hasn't changed.
+    """
+    validators = validators or {}
     url = f"{BASE_URL}{PRICELIST_PATH}"
+    headers = {}
+    if validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+    known_created_at = validators.get('created_at')
+    dest_dir = Path(dest_dir or DOWNLOAD_DIR)
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    # Each download gets its own file; the caller deletes it once loaded.
+    fd, tmp = tempfile.mkstemp(dir=dest_dir, prefix='pricelist-', suffix='.part')
+    os.close(fd)
+    tmp = Path(tmp)
     last_err = None
     for attempt in range(MAX_RETRIES):
         try:
-            resp = SESSION.get(url, timeout=TIMEOUT_SECONDS)
+            with SESSION.get(url, headers=headers, stream=True, timeout=TIMEOUT_SECONDS) as resp:
+                result = {'path': None, 'etag': resp.headers.get('ETag'), 'last_modified': resp.headers.get('Last-Modified')}
+                if resp.status_code == 304:
+                    tmp.unlink(missing_ok=True)
+                    return result, None
+                if resp.status_code in (429, 500, 502, 503, 504):
+                    last_err = f"CardKingdom error: {resp.status_code}"
+                    time.sleep(0.5 * (2 ** attempt))
+                    continue
+                if resp.status_code != 200:
+                    tmp.unlink(missing_ok=True)
+                    return None, f"CardKingdom error: {resp.status_code}"
+                # Most servers ignore the validators, so also compare
+                # meta.created_at (sent ahead of `data`) from the first chunks.
+                head = b'' if known_created_at else None
+                with open(tmp, 'wb') as f:
+                    for chunk in resp.iter_content(chunk_size=1 << 16):
+                        f.write(chunk)
+                        if head is None:
+                            continue
+                        head += chunk
+                        meta = _peek_meta(head)
+                        if meta is not None or len(head) >= PEEK_BYTES:
+                            head = None
+                        if meta is not None and meta.get('created_at') == known_created_at:
+                            break
+                    else:
+                        result['path'] = tmp
+                if result['path'] is None:
+                    tmp.unlink(missing_ok=True)
+                return result, None
         except requests.RequestException as exc:
             last_err = str(exc)
             time.sleep(0.5 * (2 ** attempt))
             continue
-        if resp.status_code in (429, 500, 502, 503, 504):
-            last_err = f"CardKingdom error: {resp.status_code}"
-            time.sleep(0.5 * (2 ** attempt))
-            continue
-        if resp.status_code != 200:
-            return None, f"CardKingdom error: {resp.status_code}"
-        try:
-            return resp.json(), None
-        except ValueError as exc:
-            return None, f"CardKingdom response not JSON: {exc}"
+    tmp.unlink(missing_ok=True)
     return None, last_err or 'CardKingdom request failed'
 
 
-def normalize_rows(data):
-    """Normalize raw pricelist entries into dedup'd buylist rows.
+def _normalize_entry(entry):
+    """One raw pricelist entry -> buylist row tuple (ROW_COLUMNS order), or None if not worth keeping."""
+    if not isinstance(entry, dict):
+        return None
+    scryfall_id = entry.get('scryfall_id')
+    if not scryfall_id:
+        return None
+    price_buy = _to_float(entry.get('price_buy'))
+    if price_buy is None or price_buy <= 0:
+        return None
+    return (
+        scryfall_id, _to_foil(entry.get('is_foil')), entry.get('name'), entry.get('edition'),
+        entry.get('sku'), entry.get('url'), price_buy, _to_int(entry.get('qty_buying')),
+    )
+
+
+# Deduplication happens in SQLite as rows stream in: a duplicate
+# (scryfall_id, is_foil) only replaces a lower price_buy.
+_UPSERT_SQL = (
+    f"INSERT INTO ck_buylist_next ({', '.join(ROW_COLUMNS)}) VALUES ({', '.join('?' for _ in ROW_COLUMNS)}) "
+    'ON CONFLICT(scryfall_id, is_foil) DO UPDATE SET '
+    + ', '.join(f'{c} = excluded.{c}' for c in ROW_COLUMNS[2:])
+    + ' WHERE excluded.price_buy > ck_buylist_next.price_buy'
+)
+
+
+def _create_staging(conn):
+    # Same definition as the live table, whatever migrations have made it.
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'ck_buylist'").fetchone()[0]
+    conn.execute('DROP TABLE IF EXISTS ck_buylist_next')
+    conn.execute(re.sub(r'^CREATE TABLE\s+("?)ck_buylist\1', 'CREATE TABLE ck_buylist_next', sql))
+    conn.commit()
+
+
+def _swap(conn, statements):
+    # DDL only, so this is the whole transaction: a few catalog updates.
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        for sql in statements:
+            conn.execute(sql)
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def load_buylist(conn, fp, chunk_size=CHUNK_SIZE):
+    """Replace ck_buylist with the pricelist read from text stream `fp`.
 
-    Keeps only rows with price_buy > 0, deduplicates on (scryfall_id, is_foil)
-    keeping the highest price_buy. Returns a list of dict rows.
+    Entries are parsed one at a time and loaded in committed chunks into the
+    ck_buylist_next staging table, so memory doesn't grow with the pricelist
+    and readers are never blocked by the load. The staging table is then
+    renamed into place in one short transaction; the replaced snapshot is
+    kept as ck_buylist_prev for rollback_buylist(). If parsing fails the
+    live table is untouched. Returns (row count, meta dict).
     """
-    best = {}
-    for entry in data or []:
-        scryfall_id = entry.get('scryfall_id')
-        if not scryfall_id:
+    meta = {}
+    _create_staging(conn)
+    rows = []
+    for entry in jsonstream.iter_member(fp, 'data', meta):
+        row = _normalize_entry(entry)
+        if row is None:
             continue
-        price_buy = _to_float(entry.get('price_buy'))
-        if price_buy is None or price_buy <= 0:
-            continue
-        is_foil = _to_foil(entry.get('is_foil'))
-        key = (scryfall_id, is_foil)
-        existing = best.get(key)
-        if existing and existing['price_buy'] >= price_buy:
-            continue
-        best[key] = {
-            'scryfall_id': scryfall_id,
-            'is_foil': is_foil,
-            'name': entry.get('name'),
-            'edition': entry.get('edition'),
-            'sku': entry.get('sku'),
-            'url': entry.get('url'),
-            'price_buy': price_buy,
-            'qty_buying': _to_int(entry.get('qty_buying')),
-        }
-    return list(best.values())
-
-
-def refresh_buylist_cache(conn):
+        rows.append(row)
+        if len(rows) >= chunk_size:
+            conn.executemany(_UPSERT_SQL, rows)
+            conn.commit()
+            rows = []
+    if rows:
+        conn.executemany(_UPSERT_SQL, rows)
+    conn.commit()
+    count = conn.execute('SELECT COUNT(*) FROM ck_buylist_next').fetchone()[0]
+    _swap(conn, [
+        'DROP TABLE IF EXISTS ck_buylist_prev',
+        'ALTER TABLE ck_buylist RENAME TO ck_buylist_prev',
+        'ALTER TABLE ck_buylist_next RENAME TO ck_buylist',
+    ])
+    return count, meta.get('meta') or {}
+
+
+@contextmanager
+def _serialized():
+    with _buylist_lock:
+        if fcntl is None:
+            yield
+            return
+        DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
+        with open(DOWNLOAD_DIR / 'buylist.lock', 'a') as fp:
+            fcntl.flock(fp, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fp, fcntl.LOCK_UN)
+
+
+def rollback_buylist(conn):
+    """Swap the previous buylist snapshot back in. Returns (row count, error)."""
+    with _serialized():
+        return _rollback_buylist(conn)
+
+
+def _rollback_buylist(conn):
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ck_buylist_prev'").fetchone()
+    if not exists:
+        return None, 'No previous buylist to roll back to'
+    _swap(conn, [
+        'DROP TABLE IF EXISTS ck_buylist_next',
+        'ALTER TABLE ck_buylist RENAME TO ck_buylist_next',
+        'ALTER TABLE ck_buylist_prev RENAME TO ck_buylist',
+        'ALTER TABLE ck_buylist_next RENAME TO ck_buylist_prev',
+    ])
+    # The pricelist metadata described the snapshot now in ck_buylist_prev, so
+    # the next refresh must download again rather than report "unchanged".
+    conn.execute('DELETE FROM ck_pricelist_meta')
+    conn.commit()
+    return conn.execute('SELECT COUNT(*) FROM ck_buylist').fetchone()[0], None
+
+
+def pricelist_state(conn):
+    """created_at / etag / last_modified / fetched_at of the loaded pricelist ({} if none)."""
+    row = conn.execute('SELECT * FROM ck_pricelist_meta WHERE id = 1').fetchone()
+    return dict(row) if row else {}
+
+
+def _save_pricelist_state(conn, created_at, etag, last_modified):
+    conn.execute(
+        'INSERT INTO ck_pricelist_meta (id, created_at, etag, last_modified, fetched_at) VALUES (1, ?, ?, ?, ?) '
+        'ON CONFLICT(id) DO UPDATE SET created_at = excluded.created_at, etag = excluded.etag, '
+        'last_modified = excluded.last_modified, fetched_at = excluded.fetched_at',
+        (created_at, etag, last_modified, _utc_now()),
+    )
+    conn.commit()
+
+
+def refresh_buylist_cache(conn, force=False):
     """Fetch the CardKingdom pricelist and replace the ck_buylist cache.
 
+    Unless `force`, the download is conditional on the last pricelist's ETag /
+    Last-Modified, and a pricelist with the same meta.created_at as the loaded
+    one is dropped once its meta has been read; the summary then has
+    `unchanged: True`.
+    Concurrent refreshes (and rollbacks) wait for each other.
     Returns (summary_dict, error).
     """
-    payload, err = fetch_pricelist()
+    with _serialized():
+        return _refresh_buylist_cache(conn, force)
+
+
+def _refresh_buylist_cache(conn, force):
+    state = {} if force else pricelist_state(conn)
+    result, err = download_pricelist(validators=state)
     if err:
         return None, err
-    meta = (payload or {}).get('meta') or {}
-    rows = normalize_rows((payload or {}).get('data') or [])
-    insert_rows = [
-        (
-            r['scryfall_id'], r['is_foil'], r['name'], r['edition'],
-            r['sku'], r['url'], r['price_buy'], r['qty_buying'],
-        )
-        for r in rows
-    ]
-    conn.execute('DELETE FROM ck_buylist')
-    if insert_rows:
-        conn.executemany(
-            'INSERT OR REPLACE INTO ck_buylist '
-            '(scryfall_id, is_foil, name, edition, sku, url, price_buy, qty_buying) '
-            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
-            insert_rows,
-        )
-    conn.commit()
+    path = result['path']
+    try:
+        if path is None:
+            _save_pricelist_state(
+                conn, state.get('created_at'),
+                result['etag'] or state.get('etag'), result['last_modified'] or state.get('last_modified'),
+            )
+            return {
+                'rows': conn.execute('SELECT COUNT(*) FROM ck_buylist').fetchone()[0],
+                'created_at': state.get('created_at'),
+                'fetched_at': _utc_now(),
+                'unchanged': True,
+            }, None
+        with open(path, encoding='utf-8') as fp:
+            count, meta = load_buylist(conn, fp)
+        _save_pricelist_state(conn, meta.get('created_at'), result['etag'], result['last_modified'])
+        history = pricehistory.record(conn, meta.get('created_at'))
+    except ValueError as exc:
+        conn.rollback()
+        conn.execute('DROP TABLE IF EXISTS ck_buylist_next')
+        conn.commit()
+        return None, f"CardKingdom response not JSON: {exc}"
+    finally:
+        if path is not None:
+            Path(path).unlink(missing_ok=True)
     return {
-        'rows': len(insert_rows),
+        'rows': count,
         'created_at': meta.get('created_at'),
         'fetched_at': _utc_now(),
+        'price_changes': history['changed'],
     }, None
@@ -0,0 +1,210 @@
+"""Resolve card names against the local card cache.
+
+A name is looked up first by its normalized form (the indexed
+card_cache.name_norm column). Names without an exact match go to an
+in-process index of the distinct cached names: a hash map (which also knows
+double-faced cards by their front face) and trigram postings, whose closest
+candidates are ranked by edit distance into a 0..1 confidence. Callers only
+ask Scryfall's fuzzy endpoint when the confidence is below MIN_CONFIDENCE.
+"""
+import os
+
+from .env import load_optional_dotenv
+
+load_optional_dotenv()
+import re
+import heapq
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+
+MIN_CONFIDENCE = float(os.getenv('FUZZY_MIN_CONFIDENCE', '0.85'))
+# Names (by trigram overlap) scored by edit distance per unmatched query.
+CANDIDATES = 20
+
+_index_lock = threading.Lock()
+# (database path, generation, NameIndex); see name_index().
+_index = None
+_generation = 0
+
+
+def normalize_name(name):
+    """Lowercase, accent- and punctuation-insensitive card name for lookups."""
+    text = unicodedata.normalize('NFKD', name or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).lower().replace('æ', 'ae')
+    text = re.sub(r"['’]", '', text)
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', text).split())
+
+
+def distance(a, b):
+    """Levenshtein edit distance."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def similarity(a, b):
+    if not a or not b:
+        return 0.0
+    return 1.0 - distance(a, b) / max(len(a), len(b))
+
+
+def _front_face(card_name):
+    # "Delver of Secrets // Insectile Aberration" is usually written by its front face.
+    return normalize_name((card_name or '').split(' // ')[0])
+
+
+def _printings(conn, norms):
+    """name_norm -> [(scryfall_id, set_code)], newest printing first."""
+    norms = list(dict.fromkeys(n for n in norms if n))
+    out = {}
+    for start in range(0, len(norms), 500):
+        chunk = norms[start:start + 500]
+        placeholders = ','.join(['?'] * len(chunk))
+        for row in conn.execute(
+            f'SELECT name_norm, scryfall_id, set_code FROM card_cache WHERE name_norm IN ({placeholders}) '
+            'ORDER BY released_at DESC',
+            tuple(chunk),
+        ).fetchall():
+            out.setdefault(row['name_norm'], []).append((row['scryfall_id'], row['set_code']))
+    return out
+
+
+def _pick(printings, set_code):
+    set_code = (set_code or '').strip().lower()
+    for sid, code in printings:
+        if code == set_code:
+            return sid
+    return printings[0][0]
+
+
+def _trigrams(text):
+    text = f' {text} '
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class NameIndex:
+    """Distinct cached names with a hash map and trigram postings.
+
+    Keys are normalized names plus the front face of double-faced cards;
+    each maps to the card_cache.name_norm it stands for.
+    """
+
+    def __init__(self, rows):
+        self.exact = {}
+        self.keys = []
+        self.postings = defaultdict(list)
+        self.add(rows)
+
+    def add(self, rows):
+        """Index more (name_norm, card_name) rows; names already known are skipped."""
+        for name_norm, card_name in rows:
+            for key in {name_norm, _front_face(card_name)}:
+                if key and key not in self.exact:
+                    self.exact[key] = name_norm
+                    for gram in _trigrams(key):
+                        self.postings[gram].append(len(self.keys))
+                    self.keys.append(key)
+
+    def closest(self, norm):
+        """(name_norm, score) of the most similar name, or (None, 0.0)."""
+        if norm in self.exact:
+            return self.exact[norm], 1.0
+        grams = _trigrams(norm)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        if not shared:
+            return None, 0.0
+        # Jaccard overlap on trigrams picks a handful of candidates; edit
+        # distance decides between them. Names sharing under half the best
+        # overlap can't be close, so they aren't ranked at all.
+        floor = max(shared.values()) // 2
+        ranked = heapq.nlargest(
+            CANDIDATES,
+            (i for i, n in shared.items() if n > floor),
+            key=lambda i: shared[i] / (len(grams) + len(self.keys[i]) + 2 - shared[i]),
+        )
+        best, best_score = None, 0.0
+        for i in ranked:
+            score = similarity(norm, self.keys[i])
+            if score > best_score:
+                best, best_score = self.exact[self.keys[i]], score
+        return best, best_score
+
+
+def _database(conn):
+    return conn.execute('PRAGMA database_list').fetchone()[2]
+
+
+def invalidate():
+    """Rebuild the index on its next use (after a bulk ingest rewrote card_cache)."""
+    global _generation
+    with _index_lock:
+        _generation += 1
+
+
+def add_cards(conn, cards):
+    """Patch the index with just-committed cards rather than rebuilding it.
+
+    A renamed card keeps its old name in the index until the next rebuild;
+    such a match finds no printing and resolves to nothing.
+    """
+    rows = [(normalize_name(card.get('name')), card.get('name')) for card in cards]
+    with _index_lock:
+        if _index is not None and _index[:2] == (_database(conn), _generation):
+            _index[2].add(rows)
+
+
+def name_index(conn):
+    """The NameIndex for conn's card_cache, built on first use.
+
+    Card saves patch it (add_cards) and bulk ingests invalidate() it, so a
+    lookup never scans card_cache to check for changes. An in-memory
+    database can't be told apart from the next one, so its index isn't kept.
+    """
+    global _index
+    database = _database(conn)
+    with _index_lock:
+        if not database or _index is None or _index[:2] != (database, _generation):
+            rows = conn.execute(
+                'SELECT DISTINCT name_norm, card_name FROM card_cache WHERE name_norm IS NOT NULL'
+            ).fetchall()
+            index = NameIndex((r[0], r[1]) for r in rows)
+            if not database:
+                return index
+            _index = (database, _generation, index)
+        return _index[2]
+
+
+def best_matches(conn, queries):
+    """[(name, set_code)] -> [(scryfall_id, confidence)], in order.
+
+    Exact name matches are resolved in one query; the rest go through
+    name_index(). A printing from `set_code` is preferred, otherwise the
+    newest. Unresolvable names give (None, 0.0).
+    """
+    queries = [(normalize_name(name), set_code) for name, set_code in queries]
+    printings = _printings(conn, [norm for norm, _ in queries])
+    unmatched = [norm for norm, _ in queries if norm and norm not in printings]
+    index = name_index(conn) if unmatched else None
+    closest = {norm: index.closest(norm) for norm in dict.fromkeys(unmatched)}
+    printings.update(_printings(conn, [name for name, _ in closest.values() if name]))
+    out = []
+    for norm, set_code in queries:
+        if norm in printings:
+            out.append((_pick(printings[norm], set_code), 1.0))
+            continue
+        name, score = closest.get(norm, (None, 0.0))
+        out.append((_pick(printings[name], set_code), round(score, 3)) if name in printings else (None, 0.0))
+    return out
+
+
+def best_match(conn, name, set_code=None):
+    return best_matches(conn, [(name, set_code)])[0]
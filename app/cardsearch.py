@@ -0,0 +1,136 @@
+"""Card search over the local card cache, with Scryfall as the fallback.
+
+Queries are a card name (any words, in any order, matched as substrings of
+cardnames.normalize_name) plus optional `set:` / `cn:` filters, e.g.
+`bolt set:m10` or `set:neo cn:42`. Names are matched with the trigram FTS5
+index in card_search (migration 021); words shorter than three characters
+can't use trigrams and are applied as a plain substring filter.
+"""
+import re
+
+from . import cardnames, scryfall
+
+FILTERS = {
+    'set': 'set', 's': 'set', 'e': 'set', 'edition': 'set',
+    'cn': 'cn', 'number': 'cn',
+}
+_FILTER_RE = re.compile(r'\b(\w+):("[^"]*"|\S+)')
+
+_RESULT_SQL = (
+    'SELECT c.scryfall_id, c.card_name, c.set_code, c.set_name, c.collector_number, '
+    'c.rarity, c.image_small FROM card_cache c'
+)
+
+
+def parse_query(query):
+    """'bolt set:M10' -> ('bolt', {'set': 'm10'}). Unknown `key:` terms stay in the name."""
+    filters = {}
+
+    def _take(match):
+        key = FILTERS.get(match.group(1).lower())
+        if not key:
+            return match.group(0)
+        filters[key] = match.group(2).strip('"').strip().lower()
+        return ' '
+    name = _FILTER_RE.sub(_take, query or '')
+    return ' '.join(name.split()), filters
+
+
+def _prefix_bounds(prefix):
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _row_card(row):
+    return {
+        'id': row['scryfall_id'],
+        'name': row['card_name'],
+        'set': row['set_code'],
+        'set_name': row['set_name'],
+        'collector_number': row['collector_number'],
+        'rarity': row['rarity'],
+        'image_small': row['image_small'],
+    }
+
+
+def _filter_clauses(filters):
+    where = []
+    args = []
+    if filters.get('set'):
+        where.append('c.set_code = ?')
+        args.append(filters['set'])
+    if filters.get('cn'):
+        where.append('c.collector_number = ?')
+        args.append(filters['cn'])
+    return where, args
+
+
+def _prefix_matches(conn, norm, filters, limit):
+    # Walks idx_card_cache_name_norm in order, so LIMIT stops the scan early.
+    where, args = _filter_clauses(filters)
+    sql = (
+        f"{_RESULT_SQL} WHERE c.name_norm >= ? AND c.name_norm < ?{''.join(' AND ' + w for w in where)} "
+        'ORDER BY c.name_norm, c.released_at DESC LIMIT ?'
+    )
+    return conn.execute(sql, (*_prefix_bounds(norm), *args, limit)).fetchall()
+
+
+def _substring_matches(conn, words, filters, exclude, limit):
+    long_words = [w for w in words if len(w) >= 3]
+    where, args = _filter_clauses(filters)
+    for w in words:
+        if len(w) < 3:
+            where.append('instr(c.name_norm, ?) > 0')
+            args.append(w)
+    if exclude:
+        where.append(f"c.scryfall_id NOT IN ({','.join(['?'] * len(exclude))})")
+        args.extend(exclude)
+    sql = (
+        f'{_RESULT_SQL} JOIN card_search f ON f.rowid = c.id WHERE card_search MATCH ?'
+        f"{''.join(' AND ' + w for w in where)} "
+        'ORDER BY length(c.name_norm), c.name_norm, c.released_at DESC LIMIT ?'
+    )
+    match = ' AND '.join(f'"{w}"' for w in long_words)
+    return conn.execute(sql, (match, *args, limit)).fetchall()
+
+
+def search_local(conn, query, limit=10):
+    """Matching cached cards, best first.
+
+    Names starting with the query come first (alphabetically, so an exact
+    match leads), then names containing every word, shortest first; newest
+    printing first within a name. The substring pass has to rank every match,
+    so it only runs when the prefix pass doesn't fill `limit`.
+    """
+    name, filters = parse_query(query)
+    norm = cardnames.normalize_name(name)
+    if not norm:
+        if not filters:
+            return []
+        where, args = _filter_clauses(filters)
+        rows = conn.execute(
+            f"{_RESULT_SQL} WHERE {' AND '.join(where)} "
+            'ORDER BY c.set_code, CAST(c.collector_number AS INTEGER), c.collector_number LIMIT ?',
+            (*args, limit),
+        ).fetchall()
+        return [_row_card(row) for row in rows]
+    rows = _prefix_matches(conn, norm, filters, limit)
+    words = norm.split()
+    if len(rows) < limit and any(len(w) >= 3 for w in words):
+        seen = [row['scryfall_id'] for row in rows]
+        rows += _substring_matches(conn, words, filters, seen, limit - len(rows))
+    return [_row_card(row) for row in rows]
+
+
+def search(conn, query, limit=10):
+    """Local results, or Scryfall's (cached for next time) when there are none.
+
+    Returns (cards, source) with source 'local', 'scryfall' or None.
+    """
+    cards = search_local(conn, query, limit)
+    if cards:
+        return cards, 'local'
+    remote = scryfall.search_cards(query, limit)
+    if not remote:
+        return [], None
+    scryfall.save_cards(conn, remote)
+    return remote, 'scryfall'
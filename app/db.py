@@ -4,6 +4,7 @@ from .env import load_optional_dotenv
 
 load_optional_dotenv()
 import sqlite3
+import importlib.util
 from pathlib import Path
 from datetime import datetime
 
@@ -23,14 +24,32 @@ def get_conn():
     return conn
 
 
+def _run_python_migration(conn, path):
+    """Run `migrate(conn)` from a .py migration (for data rewrites SQL can't do)."""
+    spec = importlib.util.spec_from_file_location(f'migration_{path.stem}', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.migrate(conn)
+
+
+def apply_migrations(conn, migrations_dir=MIGRATIONS_DIR):
+    conn.execute('CREATE TABLE IF NOT EXISTS migrations (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE, applied_at TEXT NOT NULL)')
+    applied = {row['name'] for row in conn.execute('SELECT name FROM migrations').fetchall()}
+    paths = [*Path(migrations_dir).glob('*.sql'), *Path(migrations_dir).glob('*.py')]
+    for path in sorted(paths, key=lambda p: p.name):
+        if path.name in applied:
+            continue
+        if path.suffix == '.py':
+            _run_python_migration(conn, path)
+        else:
+            conn.executescript(path.read_text(encoding='utf-8'))
+        conn.execute('INSERT INTO migrations (name, applied_at) VALUES (?, ?)', (path.name, _utc_now()))
+    conn.commit()
+
+
 def init_db():
     with get_conn() as conn:
-        conn.execute('CREATE TABLE IF NOT EXISTS migrations (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE, applied_at TEXT NOT NULL)')
-        applied = {row['name'] for row in conn.execute('SELECT name FROM migrations').fetchall()}
-        for path in sorted(MIGRATIONS_DIR.glob('*.sql')):
-            if path.name in applied:
-                continue
-            sql = path.read_text(encoding='utf-8')
-            conn.executescript(sql)
-            conn.execute('INSERT INTO migrations (name, applied_at) VALUES (?, ?)', (path.name, _utc_now()))
-        conn.commit()
+        # WAL lets pages keep reading while a refresh writes (the mode is
+        # stored in the database file, so this only has to happen once).
+        conn.execute('PRAGMA journal_mode=WAL')
+        apply_migrations(conn)
@@ -0,0 +1,290 @@
+import os
+
+from .env import load_optional_dotenv
+
+load_optional_dotenv()
+import json
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from . import manapool, ratelimit
+from .db import get_conn
+
+log = logging.getLogger('delist')
+
+# Concurrent ManaPool writes while draining the outbox, and the overall request
+# rate they share. Kept well below the order-fetch pool so a large CardKingdom
+# batch can't starve interactive ManaPool calls.
+WORKERS = int(os.getenv('MANAPOOL_DELIST_WORKERS', '4'))
+RATE_PER_SECOND = float(os.getenv('MANAPOOL_DELIST_RATE', '5'))
+MAX_ATTEMPTS = int(os.getenv('MANAPOOL_DELIST_MAX_ATTEMPTS', '5'))
+CLAIM_SIZE = int(os.getenv('MANAPOOL_DELIST_CLAIM_SIZE', '50'))
+
+# Statuses that still need a ManaPool call.
+OPEN_STATUSES = ('pending', 'retry', 'sending')
+
+_worker_lock = threading.Lock()
+_worker = None
+
+
+def _utc_now():
+    return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _retry_at(attempts):
+    delay = min(300, 5 * (2 ** max(0, attempts - 1)))
+    return (datetime.utcnow() + timedelta(seconds=delay)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+_gate = ratelimit.TokenBucket('manapool_delist', RATE_PER_SECOND)
+
+
+def _inventory_rows(conn, inventory_ids):
+    ids = [i for i in dict.fromkeys(inventory_ids) if i]
+    out = {}
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        placeholders = ','.join('?' for _ in chunk)
+        for row in conn.execute(
+            'SELECT inventory_id, quantity, price_cents, condition_id, finish_id, language_id '
+            f'FROM manapool_inventory WHERE inventory_id IN ({placeholders})',
+            chunk,
+        ).fetchall():
+            out[row['inventory_id']] = row
+    return out
+
+
+def enqueue(conn, batch_id, item_rows):
+    """Record delist intents for a new CardKingdom batch. Does NOT commit.
+
+    `item_rows` is a list of (batch_item_id, report_row) pairs. For each row the
+    target ManaPool quantity (current listing minus the copies sent to CK) is
+    computed once and stored, and the local inventory snapshot is decremented,
+    so the caller's commit makes the batch and its delist intents durable
+    together. Items that already have an intent are skipped, so calling this
+    again is a no-op. Returns a summary dict.
+    """
+    inventory = _inventory_rows(conn, [r.get('inventory_id') for _, r in item_rows])
+    now = _utc_now()
+    queued = 0
+    for batch_item_id, r in item_rows:
+        scryfall_id = r.get('scryfall_id')
+        sell_qty = int(r.get('sell_qty') or 0)
+        if not scryfall_id or sell_qty <= 0:
+            continue
+        inv = inventory.get(r.get('inventory_id'))
+        if inv is not None:
+            current_qty = int(inv['quantity'] or 0)
+            price_cents = inv['price_cents']
+            condition_id = inv['condition_id']
+            finish_id = inv['finish_id']
+            language_id = inv['language_id']
+        else:
+            current_qty = int(r.get('quantity') or 0)
+            price_cents = int(round((r.get('mp_price') or 0) * 100)) or None
+            condition_id = r.get('condition_id')
+            finish_id = 'FO' if r.get('is_foil') else 'NF'
+            language_id = r.get('language_id')
+        new_qty = max(0, current_qty - sell_qty)
+        cur = conn.execute(
+            'INSERT OR IGNORE INTO mp_delist_outbox '
+            '(batch_id, batch_item_id, inventory_id, scryfall_id, condition_id, finish_id, '
+            'language_id, new_quantity, price_cents, status, created_at, updated_at) '
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'pending', ?, ?)",
+            (
+                batch_id, batch_item_id, r.get('inventory_id'), scryfall_id,
+                condition_id, finish_id, language_id, new_qty, price_cents, now, now,
+            ),
+        )
+        # An item that already has an intent was decremented when it was queued.
+        if not cur.rowcount:
+            continue
+        queued += 1
+        conn.execute("UPDATE batch_items SET mp_delist_status = 'pending' WHERE id = ?", (batch_item_id,))
+        if r.get('inventory_id'):
+            conn.execute('UPDATE manapool_inventory SET quantity = ? WHERE inventory_id = ?', (new_qty, r['inventory_id']))
+    return {'queued': queued, 'dry_run': not manapool.INVENTORY_WRITE}
+
+
+def recover(conn):
+    """Requeue rows left in 'sending' by a crash; safe because writes are absolute."""
+    conn.execute(
+        "UPDATE mp_delist_outbox SET status = 'pending', updated_at = ? WHERE status = 'sending'",
+        (_utc_now(),),
+    )
+    conn.execute(
+        "UPDATE batch_items SET mp_delist_status = 'pending' WHERE mp_delist_status = 'sending'"
+    )
+    conn.commit()
+
+
+def retry_errors(conn, batch_id):
+    """Give failed rows of a batch a fresh set of attempts. Returns the count."""
+    cur = conn.execute(
+        "UPDATE mp_delist_outbox SET status = 'pending', attempts = 0, next_attempt_at = NULL, updated_at = ? "
+        "WHERE batch_id = ? AND status = 'error'",
+        (_utc_now(), batch_id),
+    )
+    conn.execute(
+        "UPDATE batch_items SET mp_delist_status = 'pending' WHERE batch_id = ? AND mp_delist_status = 'error'",
+        (batch_id,),
+    )
+    conn.commit()
+    return cur.rowcount
+
+
+def _claim(conn, limit):
+    rows = conn.execute(
+        "SELECT * FROM mp_delist_outbox WHERE status IN ('pending', 'retry') "
+        'AND (next_attempt_at IS NULL OR next_attempt_at <= ?) ORDER BY id LIMIT ?',
+        (_utc_now(), limit),
+    ).fetchall()
+    if rows:
+        ids = [(r['id'],) for r in rows]
+        now = _utc_now()
+        conn.executemany("UPDATE mp_delist_outbox SET status = 'sending', updated_at = ? WHERE id = ?", [(now, i) for (i,) in ids])
+        conn.executemany(
+            "UPDATE batch_items SET mp_delist_status = 'sending' WHERE id = (SELECT batch_item_id FROM mp_delist_outbox WHERE id = ?)",
+            ids,
+        )
+        conn.commit()
+    return [dict(r) for r in rows]
+
+
+def _send(row):
+    _gate.acquire()
+    try:
+        result, err = manapool.set_inventory_quantity(
+            row['scryfall_id'], row['condition_id'], row['finish_id'], row['language_id'],
+            row['new_quantity'], row['price_cents'],
+        )
+    except Exception as exc:
+        return row, None, str(exc)
+    # A DELETE that 404s was already applied by an earlier attempt.
+    if err and row['new_quantity'] <= 0 and 'ManaPool error: 404' in err:
+        return row, {'action': 'delete', 'already_applied': True}, None
+    return row, result, err
+
+
+def _record(conn, row, result, err, summary):
+    now = _utc_now()
+    if not err:
+        status = 'dry_run' if (result or {}).get('dry_run') else 'done'
+        conn.execute(
+            'UPDATE mp_delist_outbox SET status = ?, attempts = attempts + 1, last_error = NULL, updated_at = ? WHERE id = ?',
+            (status, now, row['id']),
+        )
+        conn.execute(
+            'UPDATE batch_items SET mp_delisted = 1, mp_delist_status = ? WHERE id = ?',
+            (status, row['batch_item_id']),
+        )
+        summary['ok'] += 1
+        return
+    attempts = int(row['attempts'] or 0) + 1
+    status = 'error' if attempts >= MAX_ATTEMPTS else 'retry'
+    conn.execute(
+        'UPDATE mp_delist_outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ? WHERE id = ?',
+        (status, attempts, _retry_at(attempts) if status == 'retry' else None, err, now, row['id']),
+    )
+    conn.execute('UPDATE batch_items SET mp_delist_status = ? WHERE id = ?', (status, row['batch_item_id']))
+    summary['errors' if status == 'error' else 'retried'] += 1
+
+
+def drain_once(conn, executor=None):
+    """Send every outbox row that is currently due. Returns a summary dict."""
+    summary = {'attempted': 0, 'ok': 0, 'retried': 0, 'errors': 0, 'dry_run': not manapool.INVENTORY_WRITE}
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=max(1, WORKERS))
+    try:
+        while True:
+            rows = _claim(conn, CLAIM_SIZE)
+            if not rows:
+                break
+            summary['attempted'] += len(rows)
+            for row, result, err in executor.map(_send, rows):
+                _record(conn, row, result, err, summary)
+            conn.commit()
+    finally:
+        if own_executor:
+            executor.shutdown(wait=True)
+    return summary
+
+
+def _next_due_seconds(conn):
+    row = conn.execute(
+        "SELECT MIN(COALESCE(next_attempt_at, '')) AS due FROM mp_delist_outbox WHERE status IN ('pending', 'retry')"
+    ).fetchone()
+    if not row or row['due'] is None:
+        return None
+    if not row['due']:
+        return 0.0
+    try:
+        due = datetime.strptime(row['due'], '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return 0.0
+    return max(0.0, (due - datetime.utcnow()).total_seconds())
+
+
+def _run():
+    global _worker
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, WORKERS)) as executor:
+            while True:
+                with get_conn() as conn:
+                    summary = drain_once(conn, executor=executor)
+                    if summary['attempted']:
+                        _log(conn, summary)
+                    # Decide to exit under the lock: a kick() that lands after
+                    # this check sees no worker and starts a new one.
+                    with _worker_lock:
+                        wait = _next_due_seconds(conn)
+                        if wait is None:
+                            _worker = None
+                            return
+                time.sleep(min(wait, 60.0) + 0.1)
+    except Exception:
+        log.exception('delist outbox worker crashed')
+    finally:
+        with _worker_lock:
+            if _worker is threading.current_thread():
+                _worker = None
+
+
+def _log(conn, summary):
+    status = 'ok' if not (summary['errors'] or summary['retried']) else 'partial'
+    conn.execute(
+        'INSERT INTO ck_sync_log (kind, started_at, finished_at, status, summary_json) VALUES (?, ?, ?, ?, ?)',
+        ('delist', _utc_now(), _utc_now(), status, json.dumps(summary)),
+    )
+    conn.commit()
+
+
+def kick():
+    """Start the background drain thread unless one is already running."""
+    global _worker
+    with _worker_lock:
+        if _worker is not None and _worker.is_alive():
+            return False
+        _worker = threading.Thread(target=_run, name='delist-outbox', daemon=True)
+        _worker.start()
+        return True
+
+
+def batch_status(conn, batch_id):
+    rows = conn.execute(
+        'SELECT status, COUNT(*) AS c FROM mp_delist_outbox WHERE batch_id = ? GROUP BY status',
+        (batch_id,),
+    ).fetchall()
+    counts = {r['status']: r['c'] for r in rows}
+    return {
+        'total': sum(counts.values()),
+        'pending': sum(counts.get(s, 0) for s in OPEN_STATUSES),
+        'done': counts.get('done', 0),
+        'dry_run': counts.get('dry_run', 0),
+        'errors': counts.get('error', 0),
+        'counts': counts,
+    }
@@ -0,0 +1,281 @@
+"""Disk cache for card images: sharded paths, a byte budget, LRU eviction.
+
+Files live at <ROOT>/<first two characters of the id>/<id>_<size>.<ext>, so no
+directory holds more than a small fraction of the cache. Which files exist,
+their sizes and their recency are kept in an in-process LRU (app/lru.py)
+seeded from one scan of ROOT ordered by mtime. Hits bump a file's mtime (at
+most every TOUCH_SECONDS) so recency survives restarts, and adding a file
+evicts least-recently-used files until the total fits IMAGE_CACHE_MB.
+
+Downloads are single-flight: claim() serializes work on one image across
+threads (a per-key lock) and worker processes (an fcntl lock on one of
+LOCK_STRIPES files), and write() streams into a temp file that is validated
+and then os.replace()d into place, so readers never see a partial image.
+
+Each file's content hash (hashed while it's written, or on first use for
+files found by the scan) is kept beside the index; image routes use it for
+strong ETags and for immutable /img/<hash>/... URLs.
+"""
+import os
+
+from .env import load_optional_dotenv
+
+load_optional_dotenv()
+import time
+import zlib
+import hashlib
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process single-flight only
+    fcntl = None
+
+from . import lru
+
+log = logging.getLogger('imagecache')
+
+ROOT = Path(os.getenv('IMAGE_CACHE_DIR', 'data/cache/images'))
+BUDGET_MB = float(os.getenv('IMAGE_CACHE_MB', '2048'))
+TOUCH_SECONDS = 3600
+LOCK_STRIPES = 64
+# Leftover temp files older than this are from crashed downloads.
+STALE_PART_SECONDS = 3600
+DIGEST_BYTES = 10
+
+
+def _evicted(key, entry):
+    _digests.pop(key, None)
+    # A file's sidecar (same name, SIDECAR suffix, e.g. a sprite sheet's
+    # coordinate map) is not indexed itself, so it goes with the file.
+    for path in (key, os.path.splitext(key)[0] + SIDECAR):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+# str(path) -> (mtime, bytes) as last recorded.
+_index = lru.LRUCache('images (disk)', max_entries=10_000_000, max_bytes=BUDGET_MB * 1024 * 1024, on_evict=_evicted)
+_scan_lock = threading.Lock()
+_scanned = False
+_flights_lock = threading.Lock()
+# str(path) -> [lock, number of threads holding or waiting for it]
+_flights = {}
+# str(path) -> (content hash, Last-Modified time) of files hashed this run.
+_digests = {}
+
+
+EXTENSIONS = ('.jpg', '.webp')
+SIDECAR = '.json'
+
+
+def path_for(scryfall_id, size, ext='jpg'):
+    return ROOT / scryfall_id[:2] / f'{scryfall_id}_{size}.{ext}'
+
+
+def _move_flat_files():
+    # Files from before sharding sit directly in ROOT.
+    for path in ROOT.glob('*_*.jpg'):
+        scryfall_id, _, size = path.stem.rpartition('_')
+        dest = path_for(scryfall_id, size)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(path, dest)
+
+
+def _scan():
+    global _scanned
+    if _scanned:
+        return
+    with _scan_lock:
+        if _scanned:
+            return
+        ROOT.mkdir(parents=True, exist_ok=True)
+        _move_flat_files()
+        files = []
+        sidecars = []
+        for shard in ROOT.iterdir():
+            if not shard.is_dir() or shard.name == '.locks':
+                continue
+            for entry in os.scandir(shard):
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+                if entry.name.endswith(EXTENSIONS):
+                    files.append((st.st_mtime, entry.path, st.st_size))
+                elif entry.name.endswith(SIDECAR):
+                    sidecars.append(entry.path)
+                elif entry.name.endswith('.part') and time.time() - st.st_mtime > STALE_PART_SECONDS:
+                    os.unlink(entry.path)
+        # Sidecars left behind by files deleted before this run.
+        stems = {os.path.splitext(path)[0] for _, path, _ in files}
+        for path in sidecars:
+            if os.path.splitext(path)[0] not in stems:
+                os.unlink(path)
+        files.sort()
+        for mtime, path, size in files:
+            _index.put(path, (mtime, size), size)
+        _scanned = True
+        log.info('image cache: %d files, %.1f MB', len(_index), _index.stats()['bytes'] / 1048576)
+
+
+def lookup(scryfall_id, size, ext='jpg'):
+    """Path of a cached image, or None (counted as a miss)."""
+    if not scryfall_id:
+        return None
+    return touch(path_for(scryfall_id, size, ext))
+
+
+def touch(path):
+    """`path` if it's in the cache (marking it recently used), else None."""
+    _scan()
+    key = str(path)
+    entry = _index.get(key)
+    if entry is None:
+        return None
+    now = time.time()
+    if now - entry[0] > TOUCH_SECONDS:
+        try:
+            os.utime(key, (now, now))
+        except FileNotFoundError:
+            # Evicted by another worker process.
+            _index.pop(key)
+            return None
+        _index.put(key, (now, entry[1]), entry[1])
+    return path
+
+
+def add(path):
+    """Record a file just written at path_for(...); may evict older files."""
+    _scan()
+    key = str(path)
+    st = os.stat(key)
+    _index.put(key, (st.st_mtime, st.st_size), st.st_size)
+
+
+@contextmanager
+def _file_lock(key):
+    if fcntl is None:
+        yield
+        return
+    lock_dir = ROOT / '.locks'
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    stripe = zlib.crc32(key.encode('utf-8')) % LOCK_STRIPES
+    with open(lock_dir / f'{stripe:02d}.lock', 'a') as fp:
+        fcntl.flock(fp, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fp, fcntl.LOCK_UN)
+
+
+@contextmanager
+def claim(scryfall_id, size, ext='jpg'):
+    """Hold the only download (or render) slot for an image; yields its path.
+
+    Callers should check the path again inside the block: whoever held the
+    slot before may have just written the file.
+    """
+    path = path_for(scryfall_id, size, ext)
+    key = str(path)
+    with _flights_lock:
+        flight = _flights.setdefault(key, [threading.Lock(), 0])
+        flight[1] += 1
+    try:
+        with flight[0], _file_lock(key):
+            yield path
+    finally:
+        with _flights_lock:
+            flight[1] -= 1
+            if not flight[1]:
+                del _flights[key]
+
+
+def adopt(path):
+    """Index a file another worker process wrote; returns it, or None if absent."""
+    _digests.pop(str(path), None)
+    try:
+        add(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def validators(path):
+    """(content hash, modified time) of a cached file, for ETag / Last-Modified.
+
+    Raises FileNotFoundError if the file has gone.
+    """
+    key = str(path)
+    found = _digests.get(key)
+    if found is None:
+        digest = hashlib.blake2b(digest_size=DIGEST_BYTES)
+        with open(key, 'rb') as fp:
+            st = os.fstat(fp.fileno())
+            for chunk in iter(lambda: fp.read(64 * 1024), b''):
+                digest.update(chunk)
+        found = _digests[key] = (digest.hexdigest(), st.st_mtime)
+    return found
+
+
+def _looks_complete(path, data_head, data_tail):
+    if path.suffix == '.jpg':
+        # JPEG start-of-image and end-of-image markers.
+        return data_head[:2] == b'\xff\xd8' and data_tail.rstrip(b'\x00\r\n')[-2:] == b'\xff\xd9'
+    if path.suffix == '.webp':
+        return data_head[:4] == b'RIFF' and data_head[8:12] == b'WEBP'
+    return True
+
+
+def write(path, chunks, expected_length=None):
+    """Stream `chunks` into `path` atomically and index it.
+
+    Raises ValueError (leaving nothing behind) when the byte count doesn't
+    match `expected_length` or a .jpg isn't a complete JPEG.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'{path.name}.', suffix='.part')
+    try:
+        total = 0
+        digest = hashlib.blake2b(digest_size=DIGEST_BYTES)
+        head = b''
+        tail = b''
+        with os.fdopen(fd, 'wb') as fp:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                fp.write(chunk)
+                digest.update(chunk)
+                total += len(chunk)
+                if len(head) < 12:
+                    head += chunk[:12 - len(head)]
+                tail = (tail + chunk)[-16:]
+        if expected_length is not None and total != int(expected_length):
+            raise ValueError(f'{path.name}: got {total} bytes, expected {expected_length}')
+        if not total or not _looks_complete(path, head, tail):
+            raise ValueError(f'{path.name}: incomplete or not an image')
+        os.replace(tmp, path)
+        _digests[str(path)] = (digest.hexdigest(), time.time())
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    add(path)
+    return path
+
+
+def stats():
+    _scan()
+    return _index.stats()
+
+
+def warm():
+    """Scan the cache directory in the background (called at startup)."""
+    threading.Thread(target=_scan, name='imagecache-scan', daemon=True).start()
@@ -0,0 +1,114 @@
+"""Incremental parsing of large JSON arrays.
+
+`json.load` on a Scryfall bulk file (~500 MB) needs several GB of RAM. This
+reads the text in fixed-size chunks and decodes one element at a time with
+`JSONDecoder.raw_decode`, so memory is bounded by the chunk size plus the
+largest single element. iter_array() reads a top-level array; iter_member()
+reads the array under one key of a top-level object (e.g. CardKingdom's
+`{"meta": {...}, "data": [...]}`), decoding the other members whole.
+"""
+import json
+
+CHUNK_SIZE = 1 << 16
+_WHITESPACE = ' \t\r\n'
+
+
+class _Reader:
+    def __init__(self, fp, chunk_size):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        data = self.fp.read(self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character ('' at end of input)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char, what):
+        if self.peek() != char:
+            raise ValueError(f'expected {what} at offset {self.pos}')
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A number can decode from a truncated buffer ("12" of "123");
+            # make sure the element is terminated before accepting it.
+            if end >= len(self.buf) and not self.eof and self.fill():
+                continue
+            break
+        self.pos = end
+        return value
+
+    def elements(self, close):
+        """Yield comma-separated items up to `close`; the opener is consumed."""
+        first = True
+        while True:
+            char = self.peek()
+            if not char:
+                raise ValueError('unterminated JSON ' + ('array' if close == ']' else 'object'))
+            if char == close:
+                self.pos += 1
+                return
+            if not first:
+                self.expect(',', '","')
+                self.peek()
+            first = False
+            yield
+
+
+def iter_array(fp, chunk_size=CHUNK_SIZE):
+    """Yield each element of the JSON array read from text stream `fp`."""
+    reader = _Reader(fp, chunk_size)
+    char = reader.peek()
+    if not char:
+        return
+    if char != '[':
+        raise ValueError('expected a JSON array')
+    reader.pos += 1
+    for _ in reader.elements(']'):
+        yield reader.value()
+
+
+def iter_member(fp, key, rest=None, chunk_size=CHUNK_SIZE):
+    """Yield each element of the array at `key` in the JSON object read from `fp`.
+
+    Other members are decoded whole into the `rest` dict, if given; members
+    after `key` are only there once iteration has finished.
+    """
+    reader = _Reader(fp, chunk_size)
+    reader.expect('{', 'a JSON object')
+    for _ in reader.elements('}'):
+        name = reader.value()
+        reader.expect(':', '":"')
+        if name == key and reader.peek() == '[':
+            reader.pos += 1
+            for _ in reader.elements(']'):
+                yield reader.value()
+        else:
+            value = reader.value()
+            if rest is not None:
+                rest[name] = value
@@ -10,7 +10,20 @@ def game_sort_key(game):
     return (1, game)
 
 
-def sort_items(items, sort_by='set', reverse_sets=False):
+def sort_items(items, sort_by='set', reverse_sets=False, set_rank=None):
+    """Sort batch items for picking.
+
+    sort_by 'value' puts the most expensive cards first; 'path' walks sets in
+    the order given by `set_rank` ({(game, set_code): position}, lowercased);
+    anything else sorts by game then set code.
+    """
+    if (sort_by or '').lower() == 'path' and set_rank is not None:
+        last = len(set_rank)
+
+        def _path_key(r):
+            key = ((r.get('game') or '').strip().lower(), (r.get('set_code') or '').strip().lower())
+            return (set_rank.get(key, last), game_sort_key(r.get('game')), r.get('set_code') or '', r.get('card_name') or '')
+        return sorted(items, key=_path_key)
     if (sort_by or '').lower() == 'value':
         def _value_key(r):
             price = r.get('purchase_price')
@@ -0,0 +1,94 @@
+"""Small thread-safe LRU caches with entry and byte caps, plus hit/miss counters."""
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+_caches = []
+
+
+class LRUCache:
+    """Evicts least-recently-used entries once either cap is exceeded.
+
+    `size` passed to put() is the caller's estimate of an entry's footprint
+    (e.g. the length of the JSON it was parsed from); max_bytes <= 0 means no
+    byte cap. `on_evict(key, value)` is called, outside the lock, for each
+    entry pushed out by a cap (not for pop() or clear()).
+    """
+
+    def __init__(self, name, max_entries=1000, max_bytes=0, on_evict=None):
+        self.name = name
+        self.on_evict = on_evict
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = int(max_bytes or 0)
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        _caches.append(self)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size=1):
+        size = max(0, int(size))
+        if self.max_bytes and size > self.max_bytes:
+            return
+        evicted = []
+        with self._lock:
+            old = self._data.pop(key, _MISSING)
+            if old is not _MISSING:
+                self._bytes -= old[1]
+            self._data[key] = (value, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or (self.max_bytes and self._bytes > self.max_bytes):
+                evicted_key, (evicted_value, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+                evicted.append((evicted_key, evicted_value))
+        if self.on_evict:
+            for evicted_key, evicted_value in evicted:
+                self.on_evict(evicted_key, evicted_value)
+
+    def pop(self, key):
+        with self._lock:
+            old = self._data.pop(key, _MISSING)
+            if old is _MISSING:
+                return None
+            self._bytes -= old[1]
+            return old[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'entries': len(self._data),
+                'max_entries': self.max_entries,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+            }
+
+
+def metrics():
+    return [cache.stats() for cache in _caches]
@@ -2,23 +2,24 @@
 import csv
 import json
 import uuid
+from email.utils import formatdate, parsedate_to_datetime
 from io import StringIO
 from datetime import datetime, timedelta
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from fastapi import FastAPI, Request, Form, Query, UploadFile, File, Depends, HTTPException, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse, JSONResponse, PlainTextResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse, JSONResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from starlette.middleware.sessions import SessionMiddleware
-from starlette.status import HTTP_302_FOUND, HTTP_204_NO_CONTENT
+from starlette.status import HTTP_302_FOUND, HTTP_204_NO_CONTENT, HTTP_304_NOT_MODIFIED, HTTP_307_TEMPORARY_REDIRECT
 
 from .env import load_optional_dotenv
 from .build_info import get_version, get_build_date
 from .db import init_db, get_conn
 from .logic import sort_items, remaining_qty
-from . import manapool, scryfall, cardkingdom, buylist
+from . import manapool, scryfall, cardkingdom, buylist, delist, putwall, binpath, waves, ratelimit, bulkdata, lru, cardsearch, imagecache, prefetch, renditions, sprites, pricehistory
 
 load_optional_dotenv()
 
@@ -33,9 +34,15 @@ MANAPOOL_RECENT_MINUTES = int(os.getenv('MANAPOOL_RECENT_MINUTES', '10'))
 MANAPOOL_MAX_WORKERS = int(os.getenv('MANAPOOL_MAX_WORKERS', '8'))
 CK_BUYLIST_MIN_RATIO = float(os.getenv('CK_BUYLIST_MIN_RATIO', '0.75'))
 
+IMAGE_CACHE_CONTROL = 'public, max-age=86400'
+# /img/<content hash>/... URLs never change content, so browsers never revalidate them.
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
 # In-memory map of session_id -> display name for scoreboard labels.
 # Populated when users register their name via POST /api/session/name.
 _session_names: dict[str, str] = {}
+# batch item id -> resolved scryfall id, so repeat image requests skip SQLite.
+_item_cards = lru.LRUCache('item_cards', max_entries=int(os.getenv('ITEM_CARD_LRU_ENTRIES', '20000')))
 
 app = FastAPI()
 app.add_middleware(SessionMiddleware, secret_key=SESSION_SECRET)
@@ -151,65 +158,6 @@ def _ck_last_logs():
     return latest
 
 
-def _delist_report_rows(conn, rows):
-    """Remove the chosen copies from ManaPool when a CardKingdom batch is created.
-
-    Runs once at batch-creation time (not at pick time). For each report row,
-    decrement the matching ManaPool listing by the quantity being sent to CK
-    (deleting it when the quantity reaches 0). Gated by MANAPOOL_INVENTORY_WRITE:
-    when disabled, the intended change is logged as a dry-run only. Returns a
-    summary dict; never raises.
-    """
-    summary = {'attempted': 0, 'ok': 0, 'errors': 0, 'dry_run': not manapool.INVENTORY_WRITE}
-    for r in rows:
-        scryfall_id = r.get('scryfall_id')
-        sell_qty = int(r.get('sell_qty') or 0)
-        if not scryfall_id or sell_qty <= 0:
-            continue
-        summary['attempted'] += 1
-        try:
-            inv = conn.execute(
-                'SELECT quantity, price_cents, condition_id, finish_id, language_id '
-                'FROM manapool_inventory WHERE inventory_id = ?',
-                (r.get('inventory_id'),),
-            ).fetchone() if r.get('inventory_id') else None
-            if inv is not None:
-                current_qty = int(inv['quantity'] or 0)
-                price_cents = inv['price_cents']
-                condition_id = inv['condition_id']
-                finish_id = inv['finish_id']
-                language_id = inv['language_id']
-            else:
-                current_qty = int(r.get('quantity') or 0)
-                price_cents = int(round((r.get('mp_price') or 0) * 100)) or None
-                condition_id = r.get('condition_id')
-                finish_id = 'FO' if r.get('is_foil') else 'NF'
-                language_id = r.get('language_id')
-            new_qty = max(0, current_qty - sell_qty)
-            result, err = manapool.set_inventory_quantity(
-                scryfall_id, condition_id, finish_id, language_id, new_qty, price_cents,
-            )
-            if r.get('inventory_id'):
-                conn.execute(
-                    'UPDATE manapool_inventory SET quantity = ? WHERE inventory_id = ?',
-                    (new_qty, r['inventory_id']),
-                )
-            if err:
-                summary['errors'] += 1
-                _ck_log('delist', 'error', summary={'scryfall_id': scryfall_id, 'sell_qty': sell_qty}, error=err)
-            else:
-                summary['ok'] += 1
-        except Exception as exc:
-            summary['errors'] += 1
-            try:
-                _ck_log('delist', 'error', summary={'scryfall_id': scryfall_id}, error=str(exc))
-            except Exception:
-                pass
-    conn.commit()
-    _ck_log('delist', 'ok' if not summary['errors'] else 'partial', summary=summary)
-    return summary
-
-
 def _latest_manapool_batch_warning():
     with get_conn() as conn:
         row = conn.execute("SELECT created_at FROM batches WHERE source = 'manapool' ORDER BY created_at DESC LIMIT 1").fetchone()
@@ -284,6 +232,12 @@ def on_startup():
     with get_conn() as conn:
         for row in conn.execute('SELECT session_id, display_name FROM session_names').fetchall():
             _session_names[row['session_id']] = row['display_name']
+        # Resume any delists interrupted by a restart.
+        delist.recover(conn)
+        prefetch.resume(conn)
+    delist.kick()
+    bulkdata.kick()
+    imagecache.warm()
 
 
 @app.websocket('/ws/batch/{batch_id}')
@@ -340,6 +294,7 @@ def generate_from_manapool(request: Request, auth=Depends(require_auth)):
     warnings = []
     raw_items = []
     cache_rows = []
+    line_rows = []
     total_cards = 0
 
     def _fetch(order_id):
@@ -358,12 +313,17 @@ def generate_from_manapool(request: Request, auth=Depends(require_auth)):
             ship_name = (order.get('shipping_address') or {}).get('name')
             cache_rows.append((order_id, json.dumps(data), _utc_now()))
             order_label = order.get('label')
-            for item in items:
+            for line_no, item in enumerate(items):
                 qty = int(item.get('quantity') or 1)
                 total_cards += qty
                 product = item.get('product') or {}
                 single = product.get('single') or {}
                 scryfall_id = single.get('scryfall_id')
+                line_rows.append((
+                    order_id, line_no, order_label, ship_name, scryfall_id,
+                    single.get('condition_id'), single.get('finish_id'), single.get('language_id'),
+                    qty, _extract_purchase_price(item, single),
+                ))
                 if not scryfall_id:
                     warnings.append(f"Order {order_id}: missing scryfall_id")
                     continue
@@ -385,6 +345,7 @@ def generate_from_manapool(request: Request, auth=Depends(require_auth)):
                 'INSERT OR REPLACE INTO manapool_orders_cache (order_id, raw_json, fetched_at) VALUES (?, ?, ?)',
                 cache_rows,
             )
+            manapool.save_order_lines(conn, [row[0] for row in cache_rows], line_rows)
             conn.commit()
 
     aggregated = {}
@@ -483,6 +444,7 @@ def generate_from_manapool(request: Request, auth=Depends(require_auth)):
                 ),
             )
         conn.commit()
+    prefetch.enqueue(batch_id)
 
     summary = {
         'batch_id': batch_id,
@@ -518,16 +480,40 @@ def cardkingdom_view(request: Request, auth=Depends(require_auth)):
 
 
 @app.post('/api/cardkingdom/refresh-buylist')
-def cardkingdom_refresh_buylist(request: Request, auth=Depends(require_auth)):
+def cardkingdom_refresh_buylist(request: Request, force: int = 0, auth=Depends(require_auth)):
     with get_conn() as conn:
-        summary, err = cardkingdom.refresh_buylist_cache(conn)
+        summary, err = cardkingdom.refresh_buylist_cache(conn, force=bool(force))
     if err:
         _ck_log('buylist', 'error', error=err)
         raise HTTPException(status_code=502, detail=err)
-    _ck_log('buylist', 'ok', summary=summary)
+    _ck_log('buylist', 'unchanged' if summary.get('unchanged') else 'ok', summary=summary)
     return JSONResponse(summary)
 
 
+@app.post('/api/cardkingdom/rollback-buylist')
+def cardkingdom_rollback_buylist(request: Request, auth=Depends(require_auth)):
+    with get_conn() as conn:
+        rows, err = cardkingdom.rollback_buylist(conn)
+    if err:
+        raise HTTPException(status_code=409, detail=err)
+    _ck_log('buylist', 'rollback', summary={'rows': rows})
+    return JSONResponse({'rows': rows})
+
+
+@app.get('/api/cardkingdom/price-history/{scryfall_id}')
+def cardkingdom_price_history(scryfall_id: str, foil: int = 0, auth=Depends(require_auth)):
+    with get_conn() as conn:
+        series = pricehistory.price_series(conn, scryfall_id, is_foil=1 if foil else 0)
+    return JSONResponse({'scryfall_id': scryfall_id, 'is_foil': 1 if foil else 0, 'series': series})
+
+
+@app.get('/api/cardkingdom/movers')
+def cardkingdom_movers(limit: int = 20, min_price: float = 0.0, auth=Depends(require_auth)):
+    with get_conn() as conn:
+        movers = pricehistory.biggest_movers(conn, limit=max(1, min(limit, 500)), min_price=min_price)
+    return JSONResponse({'movers': movers})
+
+
 @app.post('/api/cardkingdom/refresh-inventory')
 def cardkingdom_refresh_inventory(request: Request, auth=Depends(require_auth)):
     if not manapool.is_configured():
@@ -597,8 +583,9 @@ def cardkingdom_create_batch(request: Request, min_ratio: float = Form(None), so
             (batch_name, 'open', 'cardkingdom', _utc_now(), _utc_now(), json.dumps(source_payload)),
         )
         batch_id = conn.execute('SELECT last_insert_rowid() AS id').fetchone()['id']
+        item_rows = []
         for r in rows:
-            conn.execute(
+            cur = conn.execute(
                 'INSERT INTO batch_items '
                 '(batch_id, game, set_code, card_name, collector_number, scryfall_id, qty_required, qty_picked, '
                 'condition, language, printing, purchase_price, mp_price, ck_price, ck_qty_buying, ck_ratio, '
@@ -628,21 +615,37 @@ def cardkingdom_create_batch(request: Request, min_ratio: float = Form(None), so
                     _utc_now(),
                 ),
             )
+            item_rows.append((cur.lastrowid, r))
+        # Record the ManaPool delists in the same transaction as the batch; the
+        # outbox worker sends them in the background (gated by
+        # MANAPOOL_INVENTORY_WRITE; dry-run logs only).
+        delist_summary = delist.enqueue(conn, batch_id, item_rows)
         conn.commit()
-        # Remove the chosen copies from ManaPool inventory now that the batch
-        # exists (gated by MANAPOOL_INVENTORY_WRITE; dry-run logs only).
-        delist = _delist_report_rows(conn, rows)
-        conn.execute('UPDATE batch_items SET mp_delisted = 1 WHERE batch_id = ?', (batch_id,))
-        conn.commit()
+    delist.kick()
+    prefetch.enqueue(batch_id)
     return JSONResponse({
         'batch_id': batch_id,
         'batch_name': batch_name,
         'rows': len(rows),
         'total_value': source_payload['total_value'],
-        'delist': delist,
+        'delist': delist_summary,
     })
 
 
+@app.get('/api/batch/{batch_id}/delist-status')
+def batch_delist_status(batch_id: int, auth=Depends(require_auth)):
+    with get_conn() as conn:
+        return JSONResponse(delist.batch_status(conn, batch_id))
+
+
+@app.post('/api/batch/{batch_id}/delist-retry')
+def batch_delist_retry(batch_id: int, auth=Depends(require_auth)):
+    with get_conn() as conn:
+        requeued = delist.retry_errors(conn, batch_id)
+    delist.kick()
+    return JSONResponse({'requeued': requeued})
+
+
 @app.get('/batch/new', response_class=HTMLResponse)
 def batch_new_view(request: Request, auth=Depends(require_auth)):
     return TEMPLATES.TemplateResponse('batch_new.html', {'request': request})
@@ -677,6 +680,7 @@ def picklist(request: Request, batch_id: int, auth=Depends(require_auth)):
             'SELECT DISTINCT set_code FROM batch_items WHERE batch_id = ? AND set_code IS NOT NULL ORDER BY set_code',
             (batch_id,),
         ).fetchall()
+        delist_status = delist.batch_status(conn, batch_id) if batch['source'] == 'cardkingdom' else None
     batch_data = dict(batch)
     source_orders = []
     if batch_data.get('source_payload'):
@@ -686,7 +690,7 @@ def picklist(request: Request, batch_id: int, auth=Depends(require_auth)):
         except Exception:
             source_orders = []
     available_sets = [r['set_code'] for r in set_rows]
-    return TEMPLATES.TemplateResponse('picklist.html', {'request': request, 'batch': batch, 'source_orders': source_orders, 'available_sets': available_sets, 'write_enabled': manapool.INVENTORY_WRITE})
+    return TEMPLATES.TemplateResponse('picklist.html', {'request': request, 'batch': batch, 'source_orders': source_orders, 'available_sets': available_sets, 'write_enabled': manapool.INVENTORY_WRITE, 'delist_status': delist_status})
 
 
 @app.get('/batch/{batch_id}/assisted-pick', response_class=HTMLResponse)
@@ -699,8 +703,19 @@ def assisted_pick_view(request: Request, batch_id: int, auth=Depends(require_aut
 
 
 def _reservation_map(conn, batch_id):
-    rows = conn.execute('SELECT set_code, reserved_by FROM set_reservations WHERE batch_id = ?', (batch_id,)).fetchall()
-    return {r['set_code']: r['reserved_by'] for r in rows}
+    rows = conn.execute('SELECT game, set_code, reserved_by FROM set_reservations WHERE batch_id = ?', (batch_id,)).fetchall()
+    return {(r['game'], r['set_code']): r['reserved_by'] for r in rows}
+
+
+def _chunked_in(conn, sql, values, args=(), size=500):
+    """Run `sql` (with a single {placeholders} slot) over `values` in chunks."""
+    values = list(values)
+    out = []
+    for start in range(0, len(values), size):
+        chunk = values[start:start + size]
+        placeholders = ','.join('?' for _ in chunk)
+        out.extend(conn.execute(sql.format(placeholders=placeholders), (*args, *chunk)).fetchall())
+    return out
 
 
 def _backfill_order_names(conn, batch_id, order_ids):
@@ -710,35 +725,25 @@ def _backfill_order_names(conn, batch_id, order_ids):
     ).fetchall()
     if not rows:
         return
-    if not order_ids:
-        order_ids = [r['order_id'] for r in conn.execute('SELECT order_id FROM manapool_orders_cache').fetchall()]
-    if not order_ids:
+    scryfall_ids = list({r['scryfall_id'] for r in rows if r['scryfall_id']})
+    if not scryfall_ids:
         return
+    lines = _chunked_in(
+        conn,
+        'SELECT order_id, scryfall_id, ship_name, label FROM manapool_order_lines '
+        'WHERE ship_name IS NOT NULL AND scryfall_id IN ({placeholders})',
+        scryfall_ids,
+    )
+    if order_ids:
+        wanted = set(order_ids)
+        lines = [ln for ln in lines if ln['order_id'] in wanted]
     name_map = {}
     ref_map = {}
-    for oid in order_ids:
-        cache = conn.execute('SELECT raw_json FROM manapool_orders_cache WHERE order_id = ?', (oid,)).fetchone()
-        if not cache:
-            continue
-        try:
-            data = json.loads(cache['raw_json'])
-        except Exception:
-            continue
-        order = (data or {}).get('order') or {}
-        ship_name = (order.get('shipping_address') or {}).get('name')
-        order_label = order.get('label')
-        items = order.get('items') or []
-        if not ship_name:
-            continue
-        order_ref = f"{ship_name}, #{order_label}" if order_label else ship_name
-        for item in items:
-            product = item.get('product') or {}
-            single = product.get('single') or {}
-            scryfall_id = single.get('scryfall_id')
-            if not scryfall_id:
-                continue
-            name_map.setdefault(scryfall_id, set()).add(ship_name)
-            ref_map.setdefault(scryfall_id, set()).add(order_ref)
+    for ln in lines:
+        ship_name = ln['ship_name']
+        order_ref = f"{ship_name}, #{ln['label']}" if ln['label'] else ship_name
+        name_map.setdefault(ln['scryfall_id'], set()).add(ship_name)
+        ref_map.setdefault(ln['scryfall_id'], set()).add(order_ref)
     for r in rows:
         names = name_map.get(r['scryfall_id'])
         refs = ref_map.get(r['scryfall_id'])
@@ -749,25 +754,22 @@ def _backfill_order_names(conn, batch_id, order_ids):
             )
     conn.commit()
 
-def _set_name_map(conn, scryfall_ids):
-    if not scryfall_ids:
+
+def _order_labels(conn, order_ids):
+    rows = _chunked_in(
+        conn,
+        'SELECT order_id, MAX(label) AS label FROM manapool_order_lines WHERE order_id IN ({placeholders}) GROUP BY order_id',
+        [oid for oid in dict.fromkeys(order_ids) if oid],
+    )
+    return {r['order_id']: r['label'] for r in rows if r['label']}
+
+
+def _set_name_map(conn, set_codes):
+    codes = [c for c in dict.fromkeys((c or '').lower() for c in set_codes) if c]
+    if not codes:
         return {}
-    placeholders = ','.join('?' for _ in scryfall_ids)
-    rows = conn.execute(
-        f"SELECT data_json FROM card_cache WHERE scryfall_id IN ({placeholders})",
-        scryfall_ids,
-    ).fetchall()
-    set_names = {}
-    for r in rows:
-        try:
-            data = json.loads(r['data_json'])
-        except Exception:
-            continue
-        code = (data.get('set') or '').lower()
-        name = data.get('set_name')
-        if code and name and code not in set_names:
-            set_names[code] = name
-    return set_names
+    rows = _chunked_in(conn, 'SELECT code, name FROM sets WHERE code IN ({placeholders})', codes)
+    return {r['code']: r['name'] for r in rows if r['name']}
 
 
 def _middle_out_set_order(set_codes):
@@ -788,13 +790,20 @@ def _middle_out_set_order(set_codes):
     return order
 
 
-def _assisted_pending_items(conn, batch_id, excluded_ids=None):
+ASSISTED_MODES = ('top_down', 'bottom_up', 'middle_out', 'bin_path')
+
+
+def _assisted_pending_items(conn, batch_id, excluded_ids=None, set_rank=None):
     excluded_ids = {int(v) for v in (excluded_ids or []) if str(v).isdigit()}
     rows = conn.execute(
         'SELECT * FROM batch_items WHERE batch_id = ? AND is_missing = 0 AND qty_picked < qty_required',
         (batch_id,),
     ).fetchall()
-    items = sort_items([dict(r) for r in rows if int(r['id']) not in excluded_ids])
+    items = sort_items(
+        [dict(r) for r in rows if int(r['id']) not in excluded_ids],
+        sort_by='path' if set_rank is not None else 'set',
+        set_rank=set_rank,
+    )
     for item in items:
         item['qty_remaining'] = remaining_qty(item)
     return items
@@ -836,9 +845,10 @@ def _assisted_select_next_item(items, mode, stable_set_order=None):
     return items[1]
 
 
-def _assisted_snapshot(conn, batch_id, mode, excluded_ids=None):
-    all_items = _assisted_pending_items(conn, batch_id)
-    items = _assisted_pending_items(conn, batch_id, excluded_ids=excluded_ids)
+def _assisted_snapshot(conn, batch_id, mode, excluded_ids=None, ext='jpg'):
+    set_rank = binpath.batch_path_rank(conn, batch_id) if mode == 'bin_path' else None
+    all_items = _assisted_pending_items(conn, batch_id, set_rank=set_rank)
+    items = _assisted_pending_items(conn, batch_id, excluded_ids=excluded_ids, set_rank=set_rank)
     if not items and all_items:
         items = all_items
     remaining_cards = len(all_items)
@@ -860,6 +870,7 @@ def _assisted_snapshot(conn, batch_id, mode, excluded_ids=None):
         stable_set_order = _middle_out_set_order([r[0] for r in all_set_codes])
     current = _assisted_select_item(items, mode, stable_set_order=stable_set_order)
     next_item = _assisted_select_next_item(items, mode, stable_set_order=stable_set_order)
+    lqips = scryfall.placeholders(conn, [current.get('scryfall_id'), (next_item or {}).get('scryfall_id')])
     result = {
         'done': False,
         'mode': mode,
@@ -879,7 +890,8 @@ def _assisted_snapshot(conn, batch_id, mode, excluded_ids=None):
             'qty_picked': current.get('qty_picked', 0),
             'qty_remaining': current.get('qty_remaining', 0),
             'scryfall_id': current.get('scryfall_id'),
-            'image_url': f"/api/items/{current['id']}/image?size=large",
+            'image_url': _image_url(current.get('scryfall_id'), 'large', ext, f"/api/items/{current['id']}/image?size=large"),
+            'placeholder': lqips.get(current.get('scryfall_id')),
         },
     }
     if next_item:
@@ -888,22 +900,23 @@ def _assisted_snapshot(conn, batch_id, mode, excluded_ids=None):
             'card_name': next_item.get('card_name') or '',
             'set_code': (next_item.get('set_code') or '').upper(),
             'collector_number': next_item.get('collector_number'),
-            'image_url': f"/api/items/{next_item['id']}/image?size=normal",
+            'image_url': _image_url(next_item.get('scryfall_id'), 'normal', ext, f"/api/items/{next_item['id']}/image?size=normal"),
+            'placeholder': lqips.get(next_item.get('scryfall_id')),
         }
     return result
 
 
 @app.get('/api/batch/{batch_id}/assisted-next')
-def assisted_next(batch_id: int, mode: str = 'top_down', exclude_item_ids: str = '', auth=Depends(require_auth)):
+def assisted_next(request: Request, batch_id: int, mode: str = 'top_down', exclude_item_ids: str = '', auth=Depends(require_auth)):
     mode = (mode or 'top_down').strip().lower()
-    if mode not in ('top_down', 'bottom_up', 'middle_out'):
+    if mode not in ASSISTED_MODES:
         mode = 'top_down'
     with get_conn() as conn:
         batch = conn.execute('SELECT id FROM batches WHERE id = ?', (batch_id,)).fetchone()
         if not batch:
             raise HTTPException(status_code=404)
         excluded_ids = [p for p in (exclude_item_ids or '').split(',') if p]
-        return JSONResponse(_assisted_snapshot(conn, batch_id, mode, excluded_ids=excluded_ids))
+        return JSONResponse(_assisted_snapshot(conn, batch_id, mode, excluded_ids=excluded_ids, ext=_image_ext(request)))
 
 
 @app.post('/api/batch/{batch_id}/assisted-action')
@@ -919,7 +932,7 @@ async def assisted_action(
     auth=Depends(require_auth),
 ):
     mode = (mode or 'top_down').strip().lower()
-    if mode not in ('top_down', 'bottom_up', 'middle_out'):
+    if mode not in ASSISTED_MODES:
         mode = 'top_down'
     picker_name = (picker_name or 'anonymous').strip() or 'anonymous'
     session_id = request.session.get('sid') or str(uuid.uuid4())
@@ -965,7 +978,7 @@ async def assisted_action(
                 excluded_ids.append(str(item_id))
         else:
             excluded_ids = [p for p in excluded_ids if p != str(item_id)]
-        snapshot = _assisted_snapshot(conn, batch_id, mode, excluded_ids=excluded_ids)
+        snapshot = _assisted_snapshot(conn, batch_id, mode, excluded_ids=excluded_ids, ext=_image_ext(request))
 
     await manager.broadcast(updated['batch_id'], {'type': 'item_update', 'item_id': item_id})
     return JSONResponse(snapshot)
@@ -983,6 +996,16 @@ def batch_counts(request: Request, batch_id: int, auth=Depends(require_auth)):
     return TEMPLATES.TemplateResponse('partials/counts.html', {'request': request, 'total': total, 'remaining': remaining, 'missing': missing})
 
 
+@app.get('/batch/{batch_id}/prefetch', response_class=HTMLResponse)
+def batch_prefetch(request: Request, batch_id: int, auth=Depends(require_auth)):
+    return TEMPLATES.TemplateResponse('partials/prefetch_status.html', {'request': request, 'job': prefetch.status(batch_id)})
+
+
+@app.get('/api/batch/{batch_id}/prefetch-status')
+def batch_prefetch_status(batch_id: int, auth=Depends(require_auth)):
+    return JSONResponse(prefetch.status(batch_id))
+
+
 @app.get('/api/batch/{batch_id}/scoreboard')
 def batch_scoreboard(batch_id: int, auth=Depends(require_auth)):
     with get_conn() as conn:
@@ -1037,15 +1060,19 @@ def batch_items(request: Request, batch_id: int, game: str = '', q: str = '', sh
             allowed = {s.upper() for s in set_filter}
             rows = [r for r in rows if (r.get('set_code') or '').upper() in allowed]
         reservations = _reservation_map(conn, batch_id)
-        set_names = _set_name_map(conn, [r['scryfall_id'] for r in rows if r.get('scryfall_id')])
-    sort_key = (sort_by or '').lower()
-    sort_mode = 'value' if sort_key == 'value' else 'set'
+        set_names = _set_name_map(conn, [r['set_code'] for r in rows])
+        sort_key = (sort_by or '').lower()
+        set_rank = binpath.batch_path_rank(conn, batch_id) if sort_key == 'path' else None
+        sheets = sprites.sheets(conn, batch_id)
+        lqips = scryfall.placeholders(conn, [r['scryfall_id'] for r in rows])
+    sort_mode = sort_key if sort_key in ('value', 'path') else 'set'
     reverse_sets = sort_key == 'set_desc'
-    rows = sort_items(rows, sort_by=sort_mode, reverse_sets=reverse_sets)
+    rows = sort_items(rows, sort_by=sort_mode, reverse_sets=reverse_sets, set_rank=set_rank)
     for r in rows:
         r['qty_remaining'] = remaining_qty(r)
-        r['reserved_by'] = reservations.get(r['set_code'])
+        r['reserved_by'] = reservations.get((r['game'], r['set_code']))
         r['set_name'] = set_names.get(r['set_code'])
+        r['thumb'] = sprites.thumb(sheets.get(r['set_code']), r.get('scryfall_id'), lqips.get(r.get('scryfall_id')))
     return TEMPLATES.TemplateResponse('partials/items.html', {'request': request, 'items': rows, 'show_picked': bool(show_picked), 'show_missing': bool(show_missing), 'sort_by': sort_mode})
 
 
@@ -1064,30 +1091,60 @@ def item_row(request: Request, item_id: int, show_picked: int = 0, show_missing:
             if show_missing and not item['is_missing']:
                 return HTMLResponse('', status_code=HTTP_204_NO_CONTENT)
         reservations = _reservation_map(conn, item['batch_id'])
-        item['reserved_by'] = reservations.get(item['set_code'])
+        item['reserved_by'] = reservations.get((item['game'], item['set_code']))
+        sheet = sprites.sheets(conn, item['batch_id'], item['set_code'], build=False).get(item['set_code'])
+        lqip = scryfall.placeholders(conn, [item.get('scryfall_id')]).get(item.get('scryfall_id'))
+    item['thumb'] = sprites.thumb(sheet, item.get('scryfall_id'), lqip)
     item['qty_remaining'] = remaining_qty(item)
     return TEMPLATES.TemplateResponse('partials/item_row.html', {'request': request, 'item': item, 'qty_remaining': item['qty_remaining'], 'show_reserve': True, 'show_missing': bool(show_missing), 'show_picked': bool(show_picked)})
 
 
 @app.post('/batch/{batch_id}/reserve-set')
-async def reserve_set(request: Request, batch_id: int, set_code: str = Form(...), reserved_by: str = Form('anonymous'), auth=Depends(require_auth)):
+async def reserve_set(request: Request, batch_id: int, set_code: str = Form(...), game: str = Form(''), reserved_by: str = Form('anonymous'), auth=Depends(require_auth)):
     set_code = (set_code or '').lower()
     reserved_by = (reserved_by or 'anonymous').strip() or 'anonymous'
     with get_conn() as conn:
-        existing = conn.execute('SELECT reserved_by FROM set_reservations WHERE batch_id = ? AND set_code = ?', (batch_id, set_code)).fetchone()
+        existing = conn.execute('SELECT reserved_by FROM set_reservations WHERE batch_id = ? AND game = ? AND set_code = ?', (batch_id, game, set_code)).fetchone()
         if existing and existing['reserved_by'] == reserved_by:
-            conn.execute('DELETE FROM set_reservations WHERE batch_id = ? AND set_code = ?', (batch_id, set_code))
+            conn.execute('DELETE FROM set_reservations WHERE batch_id = ? AND game = ? AND set_code = ?', (batch_id, game, set_code))
             conn.commit()
-            await manager.broadcast(batch_id, {'type': 'set_reserved', 'set_code': set_code, 'reserved_by': None})
+            await manager.broadcast(batch_id, {'type': 'set_reserved', 'game': game, 'set_code': set_code, 'reserved_by': None})
             return JSONResponse({'ok': True, 'reserved_by': None})
         if existing:
-            conn.execute('UPDATE set_reservations SET reserved_by = ?, reserved_at = ? WHERE batch_id = ? AND set_code = ?', (reserved_by, _utc_now(), batch_id, set_code))
+            conn.execute('UPDATE set_reservations SET reserved_by = ?, reserved_at = ? WHERE batch_id = ? AND game = ? AND set_code = ?', (reserved_by, _utc_now(), batch_id, game, set_code))
         else:
-            conn.execute('INSERT INTO set_reservations (batch_id, set_code, reserved_by, reserved_at) VALUES (?, ?, ?, ?)', (batch_id, set_code, reserved_by, _utc_now()))
+            conn.execute('INSERT INTO set_reservations (batch_id, game, set_code, reserved_by, reserved_at) VALUES (?, ?, ?, ?, ?)', (batch_id, game, set_code, reserved_by, _utc_now()))
         conn.commit()
-    await manager.broadcast(batch_id, {'type': 'set_reserved', 'set_code': set_code, 'reserved_by': reserved_by})
+    await manager.broadcast(batch_id, {'type': 'set_reserved', 'game': game, 'set_code': set_code, 'reserved_by': reserved_by})
     return JSONResponse({'ok': True, 'reserved_by': reserved_by})
 
+
+def _picker_list(value):
+    return [p.strip() for p in (value or '').split(',') if p.strip()]
+
+
+@app.post('/batch/{batch_id}/waves')
+async def split_waves(batch_id: int, pickers: str = Form(''), auth=Depends(require_auth)):
+    with get_conn() as conn:
+        try:
+            result = waves.plan(conn, batch_id, _picker_list(pickers))
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+    await manager.broadcast(batch_id, {'type': 'waves_assigned', 'assignments': result['assignments']})
+    return JSONResponse(result)
+
+
+@app.post('/batch/{batch_id}/waves/rebalance')
+async def rebalance_waves(batch_id: int, pickers: str = Form(''), auth=Depends(require_auth)):
+    with get_conn() as conn:
+        try:
+            result = waves.rebalance(conn, batch_id, _picker_list(pickers))
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+    await manager.broadcast(batch_id, {'type': 'waves_assigned', 'assignments': result['assignments']})
+    return JSONResponse(result)
+
+
 @app.post('/items/{item_id}/pick', response_class=HTMLResponse)
 async def pick_item(request: Request, item_id: int, show_picked: int = 0, show_missing: int = 0, show_all: int = 0, picker_name: str = Form('anonymous'), auth=Depends(require_auth)):
     session_id = request.session.get('sid') or str(uuid.uuid4())
@@ -1262,9 +1319,88 @@ def cardkingdom_sell_csv(batch_id: int, scope: str = 'picked', auth=Depends(requ
     )
 
 
+def _payload_order_ids(source_payload):
+    if not source_payload:
+        return []
+    try:
+        return json.loads(source_payload).get('order_ids', []) or []
+    except Exception:
+        return []
+
+
+def _order_line_key(line):
+    return (
+        line['scryfall_id'],
+        _map_condition(line['condition_id']),
+        line['language_id'],
+        _map_finish(line['finish_id']),
+    )
+
+
+def _put_wall_batch(conn, batch_id, build=False, rebuild=False):
+    """The batch row; with `build`, computes its put-wall first if never built (POST only)."""
+    batch = conn.execute('SELECT * FROM batches WHERE id = ?', (batch_id,)).fetchone()
+    if not batch:
+        raise HTTPException(status_code=404)
+    if rebuild or (build and not putwall.is_built(conn, batch_id)):
+        putwall.build(conn, batch_id, _payload_order_ids(batch['source_payload']), _order_line_key)
+        batch = conn.execute('SELECT * FROM batches WHERE id = ?', (batch_id,)).fetchone()
+    return batch
+
+
+@app.get('/batch/{batch_id}/put-wall', response_class=HTMLResponse)
+def put_wall_view(request: Request, batch_id: int, auth=Depends(require_auth)):
+    with get_conn() as conn:
+        batch = _put_wall_batch(conn, batch_id)
+        slips = putwall.packing_slips(conn, batch_id, _order_line_key)
+    lines = {}
+    for slip in slips:
+        for ln in slip['lines']:
+            if not ln['item_id'] or not ln['qty_picked']:
+                continue
+            entry = lines.setdefault(ln['item_id'], {**ln, 'qty': 0, 'qty_put': 0})
+            entry['qty'] += ln['qty_picked']
+            entry['qty_put'] += ln['qty_put']
+    lines = sort_items(list(lines.values()))
+    return TEMPLATES.TemplateResponse('put_wall.html', {'request': request, 'batch': batch, 'slips': slips, 'lines': lines})
+
+
+@app.post('/api/batch/{batch_id}/put-wall/rebuild')
+def put_wall_rebuild(batch_id: int, auth=Depends(require_auth)):
+    with get_conn() as conn:
+        _put_wall_batch(conn, batch_id, rebuild=True)
+        slots = conn.execute('SELECT COUNT(*) AS c FROM put_wall_slots WHERE batch_id = ?', (batch_id,)).fetchone()['c']
+    return JSONResponse({'ok': True, 'slots': slots})
+
+
+@app.get('/api/batch/{batch_id}/put-wall/lookup')
+def put_wall_lookup(batch_id: int, item_id: int = 0, scryfall_id: str = '', auth=Depends(require_auth)):
+    with get_conn() as conn:
+        _put_wall_batch(conn, batch_id)
+        if not putwall.is_built(conn, batch_id):
+            raise HTTPException(status_code=409, detail='Slots have not been assigned for this batch yet')
+        info = putwall.lookup(conn, batch_id, item_id=item_id or None, scryfall_id=scryfall_id.strip() or None)
+    if not info:
+        raise HTTPException(status_code=404, detail='No open slot for this card')
+    return JSONResponse(info)
+
+
+@app.post('/api/batch/{batch_id}/put-wall/put')
+def put_wall_put(batch_id: int, item_id: int = Form(0), scryfall_id: str = Form(''), auth=Depends(require_auth)):
+    with get_conn() as conn:
+        _put_wall_batch(conn, batch_id, build=True)
+        info = putwall.put(conn, batch_id, item_id=item_id or None, scryfall_id=scryfall_id.strip() or None)
+    if not info:
+        raise HTTPException(status_code=404, detail='No open slot for this card')
+    return JSONResponse(info)
+
+
 @app.get('/batch/{batch_id}/packing-slip', response_class=HTMLResponse)
 def packing_slip(request: Request, batch_id: int, auth=Depends(require_auth)):
-    raise HTTPException(status_code=404)
+    with get_conn() as conn:
+        batch = _put_wall_batch(conn, batch_id)
+        slips = putwall.packing_slips(conn, batch_id, _order_line_key)
+    return TEMPLATES.TemplateResponse('packing_slip.html', {'request': request, 'batch': batch, 'slips': slips})
 
 
 @app.get('/batch/{batch_id}/events', response_class=HTMLResponse)
@@ -1291,51 +1427,144 @@ def close_batch(request: Request, batch_id: int, auth=Depends(require_auth)):
     with get_conn() as conn:
         conn.execute('UPDATE batches SET status = ?, updated_at = ? WHERE id = ?', ('closed', _utc_now(), batch_id))
         conn.commit()
+    prefetch.cancel(batch_id)
     return RedirectResponse(url=f'/batch/{batch_id}/summary', status_code=HTTP_302_FOUND)
 
 
 @app.get('/card/modal', response_class=HTMLResponse)
 def card_modal(request: Request, item_id: int, auth=Depends(require_auth)):
+    ext = _image_ext(request)
     with get_conn() as conn:
         item = conn.execute('SELECT * FROM batch_items WHERE id = ?', (item_id,)).fetchone()
         if not item:
             raise HTTPException(status_code=404)
         item = dict(item)
-        card, strategy = scryfall.resolve_card(conn, item)
-        image_path = scryfall.ensure_image_cached(card) if card else None
-        if card:
-            scryfall.ensure_image_cached(card, size='large')
-    return TEMPLATES.TemplateResponse('partials/card_modal.html', {'request': request, 'item': item, 'card': card, 'strategy': strategy, 'image_path': image_path})
+        with ratelimit.priority(ratelimit.INTERACTIVE):
+            card, strategy = scryfall.resolve_card(conn, item)
+            image_path = scryfall.ensure_image_cached(card, ext=ext) if card else None
+            if card:
+                scryfall.ensure_image_cached(card, size='large', ext=ext)
+    image_urls = {
+        size: _image_url(card['id'], size, ext, f"/card/image/{card['id']}?size={size}")
+        for size in ('normal', 'large')
+    } if card else {}
+    return TEMPLATES.TemplateResponse('partials/card_modal.html', {'request': request, 'item': item, 'card': card, 'strategy': strategy, 'image_path': image_path, 'image_urls': image_urls})
 
 
-@app.get('/card/image/{card_id}')
-def card_image(card_id: str, size: str = 'normal', auth=Depends(require_auth)):
-    _img_headers = {'Cache-Control': 'public, max-age=86400'}
-    path = Path('data/cache/images') / f"{card_id}_{size}.jpg"
-    if path.exists():
-        return FileResponse(str(path), headers=_img_headers)
+def _image_ext(request):
+    return 'webp' if renditions.wants_webp(request.headers.get('accept')) else 'jpg'
+
+
+def _image_url(scryfall_id, size, ext, fallback):
+    """Immutable /img/<hash>/ URL for a cached image, else `fallback`."""
+    path = imagecache.lookup(scryfall_id, size, ext) or imagecache.lookup(scryfall_id, size)
+    if not path:
+        return fallback
+    try:
+        digest, _ = imagecache.validators(path)
+    except FileNotFoundError:
+        return fallback
+    return f'/img/{digest}/{path.name}'
+
+
+def _not_modified(request, etag, modified):
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        tags = [t.strip().removeprefix('W/') for t in if_none_match.split(',')]
+        return etag in tags or '*' in tags
+    try:
+        since = parsedate_to_datetime(request.headers.get('if-modified-since'))
+    except (TypeError, ValueError):
+        return False
+    return since is not None and int(modified) <= since.timestamp()
+
+
+def _image_response(request, path, immutable=False):
+    """Serve a cached image with a strong ETag, honouring conditional requests."""
+    try:
+        digest, modified = imagecache.validators(path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404)
+    headers = {
+        'ETag': f'"{digest}"',
+        'Last-Modified': formatdate(modified, usegmt=True),
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL if immutable else IMAGE_CACHE_CONTROL,
+    }
+    if not immutable:
+        headers['Vary'] = 'Accept'
+    if _not_modified(request, headers['ETag'], modified):
+        return Response(status_code=HTTP_304_NOT_MODIFIED, headers=headers)
+    return FileResponse(str(path), headers=headers)
+
+
+@app.get('/img/{digest}/{filename}')
+def versioned_image(request: Request, digest: str, filename: str, auth=Depends(require_auth)):
+    # Served from the in-memory cache index only; a URL whose image has since
+    # been evicted (or re-downloaded) falls back to the by-id route.
+    stem, _, ext = filename.rpartition('.')
+    card_id, _, size = stem.rpartition('_')
+    path = imagecache.lookup(card_id, size, ext) if card_id and f'.{ext}' in imagecache.EXTENSIONS else None
+    if path:
+        try:
+            current, _ = imagecache.validators(path)
+        except FileNotFoundError:
+            current = None
+        if current == digest:
+            return _image_response(request, path, immutable=True)
+    if not card_id:
+        raise HTTPException(status_code=404)
+    return RedirectResponse(url=f'/card/image/{card_id}?size={size}', status_code=HTTP_307_TEMPORARY_REDIRECT)
+
+
+@app.get('/api/batch/{batch_id}/sprites')
+def batch_sprites(batch_id: int, auth=Depends(require_auth)):
+    # Ready sheets per set group; missing ones are queued and come back null.
     with get_conn() as conn:
-        card = scryfall.fetch_card_by_id(conn, card_id)
-        if card:
-            scryfall.ensure_image_cached(card, size=size)
-    if path.exists():
-        return FileResponse(str(path), headers=_img_headers)
+        batch = conn.execute('SELECT id FROM batches WHERE id = ?', (batch_id,)).fetchone()
+        if not batch:
+            raise HTTPException(status_code=404)
+        return JSONResponse(sprites.sheets(conn, batch_id))
+
+
+@app.get('/sprites/{version}.jpg')
+def sprite_sheet(request: Request, version: str, auth=Depends(require_auth)):
+    path = imagecache.touch(sprites.sheet_path(version)) if version.isalnum() else None
+    if not path:
+        raise HTTPException(status_code=404)
+    return _image_response(request, path, immutable=True)
+
+
+@app.get('/card/image/{card_id}')
+def card_image(request: Request, card_id: str, size: str = 'normal', auth=Depends(require_auth)):
+    ext = _image_ext(request)
+    path = imagecache.lookup(card_id, size, ext)
+    if path:
+        return _image_response(request, path)
+    with get_conn() as conn, ratelimit.priority(ratelimit.INTERACTIVE):
+        path = scryfall.image_path_for_id(conn, card_id, size, ext)
+    if path:
+        return _image_response(request, path)
     raise HTTPException(status_code=404)
 
 
 @app.get('/api/items/{item_id}/image')
-def item_image(item_id: int, size: str = 'large', auth=Depends(require_auth)):
-    _img_headers = {'Cache-Control': 'public, max-age=86400'}
+def item_image(request: Request, item_id: int, size: str = 'large', auth=Depends(require_auth)):
+    ext = _image_ext(request)
+    path = imagecache.lookup(_item_cards.get(item_id), size, ext)
+    if path:
+        return _image_response(request, path)
     with get_conn() as conn:
         item = conn.execute('SELECT * FROM batch_items WHERE id = ?', (item_id,)).fetchone()
         if not item:
             raise HTTPException(status_code=404)
         item = dict(item)
-        card, _ = scryfall.resolve_card(conn, item)
+        with ratelimit.priority(ratelimit.INTERACTIVE):
+            card, _ = scryfall.resolve_card(conn, item)
+            path = scryfall.ensure_image_cached(card, size=size, ext=ext) if card else None
         if card:
-            path = scryfall.ensure_image_cached(card, size=size)
-            if path and path.exists():
-                return FileResponse(str(path), headers=_img_headers)
+            _item_cards.put(item_id, card['id'])
+    if path and path.exists():
+        return _image_response(request, path)
     raise HTTPException(status_code=404)
 
 
@@ -1388,7 +1617,8 @@ def batch_scoreboard(request: Request, batch_id: int, auth=Depends(require_auth)
 
 @app.get('/cards/search', response_class=HTMLResponse)
 def card_search(request: Request, name: str, item_id: int = 0, auth=Depends(require_auth)):
-    cards = scryfall.search_cards(name)
+    with ratelimit.priority(ratelimit.INTERACTIVE), get_conn() as conn:
+        cards, _ = cardsearch.search(conn, name)
     return TEMPLATES.TemplateResponse('partials/card_search.html', {'request': request, 'cards': cards, 'name': name, 'item_id': item_id})
 
 @app.post('/items/{item_id}/link_scryfall')
@@ -1396,6 +1626,7 @@ def link_scryfall(item_id: int, scryfall_id: str = Form(...), auth=Depends(requi
     with get_conn() as conn:
         conn.execute('UPDATE batch_items SET scryfall_id = ?, updated_at = ? WHERE id = ?', (scryfall_id, _utc_now(), item_id))
         conn.commit()
+    _item_cards.pop(item_id)
     return JSONResponse({'ok': True})
 
 
@@ -1410,6 +1641,7 @@ def import_csv(request: Request, file: UploadFile = File(...), auth=Depends(requ
     reader = csv.DictReader(StringIO(content))
     with get_conn() as conn:
         batch_map = {}
+        imported = []
         for row in reader:
             batch_name = row.get('batch_name') or 'Unnamed Batch'
             if batch_name not in batch_map:
@@ -1417,7 +1649,7 @@ def import_csv(request: Request, file: UploadFile = File(...), auth=Depends(requ
                 batch_id = conn.execute('SELECT last_insert_rowid() AS id').fetchone()['id']
                 batch_map[batch_name] = batch_id
             batch_id = batch_map[batch_name]
-            conn.execute(
+            cur = conn.execute(
                 'INSERT INTO batch_items (batch_id, game, set_code, card_name, collector_number, qty_required, qty_picked, condition, language, printing, purchase_price, updated_at) VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?, ?, ?, ?)',
                 (
                     batch_id,
@@ -1433,7 +1665,23 @@ def import_csv(request: Request, file: UploadFile = File(...), auth=Depends(requ
                     _utc_now(),
                 ),
             )
+            imported.append({
+                'id': cur.lastrowid,
+                'set_code': row.get('set_code'),
+                'collector_number': row.get('collector_number'),
+                'card_name': row.get('card_name'),
+            })
+        # Link printings in bulk (set + collector number, then names matched
+        # against the card cache); rows still unresolved are left for the card
+        # modal to look up on Scryfall on demand.
+        resolved = scryfall.resolve_cards(conn, imported, remote=False)
+        conn.executemany(
+            'UPDATE batch_items SET scryfall_id = ? WHERE id = ?',
+            [(card['id'], it['id']) for it, (card, _) in zip(imported, resolved) if card],
+        )
         conn.commit()
+    for batch_id in batch_map.values():
+        prefetch.enqueue(batch_id)
     return RedirectResponse(url='/', status_code=HTTP_302_FOUND)
 
 
@@ -1447,15 +1695,75 @@ def settings_login(request: Request, pin: str = Form(...), auth=Depends(require_
     raise HTTPException(status_code=404)
 
 
+def _opt_int(value):
+    try:
+        return int(value) if str(value).strip() != '' else None
+    except (TypeError, ValueError):
+        return None
+
+
 @app.post('/bins')
-def add_bin(request: Request, game: str = Form(...), set_code: str = Form(...), location: str = Form(...), note: str = Form(''), auth=Depends(require_auth)):
-    raise HTTPException(status_code=404)
+def add_bin(request: Request, game: str = Form(...), set_code: str = Form(...), location: str = Form(...), note: str = Form(''), aisle: str = Form(''), shelf: str = Form(''), position: str = Form(''), auth=Depends(require_auth)):
+    game = (game or '').strip()
+    set_code = (set_code or '').strip().lower()
+    location = (location or '').strip()
+    if not game or not set_code or not location:
+        raise HTTPException(status_code=400, detail='game, set_code and location are required')
+    coords = (_opt_int(aisle), _opt_int(shelf), _opt_int(position))
+    if coords == (None, None, None):
+        coords = binpath.parse_location(location)
+    with get_conn() as conn:
+        existing = conn.execute('SELECT id FROM set_bins WHERE game = ? COLLATE NOCASE AND set_code = ?', (game, set_code)).fetchone()
+        if existing:
+            conn.execute(
+                'UPDATE set_bins SET location = ?, note = ?, aisle = ?, shelf = ?, position = ?, updated_at = ? WHERE id = ?',
+                (location, note or None, *coords, _utc_now(), existing['id']),
+            )
+        else:
+            conn.execute(
+                'INSERT INTO set_bins (game, set_code, location, note, aisle, shelf, position, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (game, set_code, location, note or None, *coords, _utc_now()),
+            )
+        conn.commit()
+    if 'application/json' in (request.headers.get('accept') or ''):
+        return JSONResponse({'ok': True, 'aisle': coords[0], 'shelf': coords[1], 'position': coords[2]})
+    return RedirectResponse(url='/bins/manage', status_code=HTTP_302_FOUND)
+
+
+@app.post('/bins/{bin_id}/delete')
+def delete_bin(bin_id: int, auth=Depends(require_auth)):
+    with get_conn() as conn:
+        conn.execute('DELETE FROM set_bins WHERE id = ?', (bin_id,))
+        conn.commit()
+    return RedirectResponse(url='/bins/manage', status_code=HTTP_302_FOUND)
 
 
 @app.get('/bins', response_class=HTMLResponse)
 def get_bins(request: Request, game: str, set_code: str, auth=Depends(require_auth)):
-    raise HTTPException(status_code=404)
+    with get_conn() as conn:
+        bins = conn.execute(
+            'SELECT * FROM set_bins WHERE game = ? COLLATE NOCASE AND set_code = ? ORDER BY id',
+            (game, (set_code or '').lower()),
+        ).fetchall()
+    return TEMPLATES.TemplateResponse('partials/bin_list.html', {'request': request, 'bins': bins})
+
+
+@app.get('/bins/manage', response_class=HTMLResponse)
+def manage_bins(request: Request, auth=Depends(require_auth)):
+    with get_conn() as conn:
+        bins = [dict(r) for r in conn.execute('SELECT * FROM set_bins').fetchall()]
+    bin_map = {binpath.set_key(b['game'], b['set_code']): b for b in bins}
+    walk = binpath.set_order(bin_map.keys(), binpath.load_bins_from_rows(bins))
+    ordered = [bin_map[k] for k in walk]
+    for i, b in enumerate(ordered, start=1):
+        b['walk_order'] = i if binpath.bin_coords(b) is not None else None
+    return TEMPLATES.TemplateResponse('bins.html', {'request': request, 'bins': ordered})
+
+
 
+@app.get('/api/health/rate-limits')
+def rate_limit_metrics(auth=Depends(require_auth)):
+    return JSONResponse({'buckets': ratelimit.metrics()})
 
 
 @app.get('/health', response_class=HTMLResponse)
@@ -1465,37 +1773,37 @@ def health_view(request: Request, auth=Depends(require_auth)):
         cache_count = conn.execute('SELECT COUNT(*) AS c FROM manapool_orders_cache').fetchone()['c']
         last = conn.execute('SELECT started_at, status FROM manapool_sync_log ORDER BY started_at DESC LIMIT 1').fetchone()
         batches = conn.execute("SELECT id, name, source_payload FROM batches WHERE source = 'manapool' ORDER BY created_at DESC").fetchall()
-        cache_rows = conn.execute('SELECT order_id, raw_json FROM manapool_orders_cache').fetchall()
-    label_by_id = {}
-    for r in cache_rows:
-        try:
-            data = json.loads(r['raw_json'])
-            label = ((data or {}).get('order') or {}).get('label')
-            if label:
-                label_by_id[r['order_id']] = label
-        except Exception:
-            continue
+        batch_order_ids = {}
+        for b in batches:
+            order_ids = []
+            if b['source_payload']:
+                try:
+                    payload = json.loads(b['source_payload'])
+                    order_ids = payload.get('order_ids', []) or []
+                except Exception:
+                    order_ids = []
+            batch_order_ids[b['id']] = order_ids
+        label_by_id = _order_labels(conn, [oid for ids in batch_order_ids.values() for oid in ids])
+        bulk = bulkdata.last_run(conn)
     for b in batches:
-        order_ids = []
-        if b['source_payload']:
-            try:
-                payload = json.loads(b['source_payload'])
-                order_ids = payload.get('order_ids', []) or []
-            except Exception:
-                order_ids = []
+        order_ids = batch_order_ids[b['id']]
         order_numbers = []
         for oid in order_ids:
             label = label_by_id.get(oid)
             order_numbers.append(f"#{label}" if label else oid)
         batch_orders.append({'id': b['id'], 'name': b['name'], 'order_numbers': ', '.join(order_numbers) if order_numbers else 'None'})
     last_sync = f"{last['started_at']} ({last['status']})" if last else 'None'
+    last_bulk = f"{bulk['finished_at']} ({bulk['status']})" if bulk else 'Never'
     return TEMPLATES.TemplateResponse('health.html', {
         'request': request,
         'db_path': os.getenv('DB_PATH', 'data/app.db'),
         'manapool_configured': manapool.is_configured(),
         'cache_count': cache_count,
         'last_sync': last_sync,
+        'last_bulk': last_bulk,
         'batch_orders': batch_orders,
+        'rate_limits': ratelimit.metrics(),
+        'caches': lru.metrics(),
         'app_version': get_version(),
         'build_date': get_build_date(),
     })
@@ -99,6 +99,26 @@ def _utc_now():
     return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
 
 
+def save_order_lines(conn, order_ids, rows):
+    """Replace the normalized manapool_order_lines rows for the given orders.
+
+    `rows` are (order_id, line_no, label, ship_name, scryfall_id, condition_id,
+    finish_id, language_id, quantity, price) tuples. Does not commit.
+    """
+    ids = [oid for oid in dict.fromkeys(order_ids or []) if oid]
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        placeholders = ','.join('?' for _ in chunk)
+        conn.execute(f'DELETE FROM manapool_order_lines WHERE order_id IN ({placeholders})', chunk)
+    if rows:
+        conn.executemany(
+            'INSERT OR REPLACE INTO manapool_order_lines '
+            '(order_id, line_no, label, ship_name, scryfall_id, condition_id, finish_id, language_id, quantity, price) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            rows,
+        )
+
+
 def _fetch_inventory_page(limit, offset):
     """Fetch one inventory page. Returns (items, total, error)."""
     resp, err = _request('GET', '/seller/inventory', params={'limit': limit, 'offset': offset})
@@ -0,0 +1,164 @@
+"""Background image prefetch for batches.
+
+When a batch is created, every line's card images (PREFETCH_IMAGE_SIZES) are
+downloaded in bin-path pick order (app/binpath.py) at bulk priority, so pickers find them already on
+disk (with their low-quality placeholders, see scryfall.ensure_placeholder).
+Batches are prefetched one at a time by a single worker thread with a few
+download threads; progress is kept in memory per process and shown on the
+batch page. Closing a batch cancels its job; finishing one queues the
+batch's thumbnail sprite sheets (app/sprites.py).
+"""
+import os
+
+from .env import load_optional_dotenv
+
+load_optional_dotenv()
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from . import binpath, ratelimit, scryfall, sprites
+from .db import get_conn
+from .logic import sort_items
+
+log = logging.getLogger('prefetch')
+
+ENABLED = os.getenv('PREFETCH_IMAGES', '1') != '0'
+SIZES = tuple(s.strip() for s in os.getenv('PREFETCH_IMAGE_SIZES', 'normal,large').split(',') if s.strip())
+WORKERS = int(os.getenv('PREFETCH_WORKERS', '4'))
+
+ACTIVE = ('queued', 'running')
+
+_lock = threading.Lock()
+_jobs = {}
+_queue = deque()
+_worker = None
+
+
+def _new_job(batch_id):
+    return {'batch_id': batch_id, 'status': 'queued', 'total': 0, 'done': 0, 'failed': 0, 'cancelled': False}
+
+
+def enqueue(batch_id):
+    """Queue a batch for prefetching (no-op if it's already queued or running)."""
+    if not ENABLED or not SIZES:
+        return False
+    with _lock:
+        job = _jobs.get(batch_id)
+        if job and job['status'] in ACTIVE:
+            return False
+        _jobs[batch_id] = _new_job(batch_id)
+        _queue.append(batch_id)
+    kick()
+    return True
+
+
+def cancel(batch_id):
+    with _lock:
+        job = _jobs.get(batch_id)
+        if not job or job['status'] not in ACTIVE:
+            return False
+        job['cancelled'] = True
+        if job['status'] == 'queued':
+            job['status'] = 'cancelled'
+        return True
+
+
+def status(batch_id):
+    with _lock:
+        job = _jobs.get(batch_id)
+        if not job:
+            return {'batch_id': batch_id, 'status': 'idle', 'total': 0, 'done': 0, 'failed': 0}
+        return {k: v for k, v in job.items() if k != 'cancelled'}
+
+
+def resume(conn):
+    """Re-queue prefetch for every open batch (after a restart)."""
+    for row in conn.execute("SELECT id FROM batches WHERE status = 'open' ORDER BY id").fetchall():
+        enqueue(row['id'])
+
+
+def _cards(conn, batch_id):
+    """Resolved cards for a batch's unpicked lines, in bin-path pick order, once each."""
+    rows = [dict(r) for r in conn.execute(
+        'SELECT * FROM batch_items WHERE batch_id = ? AND qty_picked < qty_required', (batch_id,),
+    ).fetchall()]
+    rows = sort_items(rows, sort_by='path', set_rank=binpath.batch_path_rank(conn, batch_id))
+    out = {}
+    for card, _ in scryfall.resolve_cards(conn, rows):
+        if card and card.get('id') not in out:
+            out[card['id']] = card
+    return list(out.values())
+
+
+def _fetch(job, card):
+    if job['cancelled']:
+        return
+    ok = True
+    with ratelimit.priority(ratelimit.BULK):
+        for size in SIZES:
+            ok = scryfall.ensure_image_cached(card, size=size) is not None and ok
+        if ok:
+            with get_conn() as conn:
+                scryfall.ensure_placeholder(conn, card['id'])
+    with _lock:
+        job['done' if ok else 'failed'] += 1
+
+
+def _run_job(job, executor):
+    with get_conn() as conn:
+        batch = conn.execute('SELECT status FROM batches WHERE id = ?', (job['batch_id'],)).fetchone()
+        if not batch or batch['status'] != 'open':
+            with _lock:
+                job['status'] = 'cancelled'
+            return
+        with ratelimit.priority(ratelimit.BULK):
+            cards = _cards(conn, job['batch_id'])
+    with _lock:
+        job['total'] = len(cards)
+    # map() submits everything up front but runs in order; cancelled jobs skip
+    # the remaining cards as soon as they're reached.
+    list(executor.map(lambda card: _fetch(job, card), cards))
+    if not job['cancelled']:
+        # Every thumbnail is local now, so the picklist's sprite sheets are cheap.
+        with get_conn() as conn:
+            sprites.schedule_batch(conn, job['batch_id'])
+    with _lock:
+        job['status'] = 'cancelled' if job['cancelled'] else 'done'
+
+
+def _run():
+    global _worker
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, WORKERS), thread_name_prefix='prefetch') as executor:
+            while True:
+                with _lock:
+                    if not _queue:
+                        _worker = None
+                        return
+                    job = _jobs[_queue.popleft()]
+                    if job['status'] != 'queued':
+                        continue
+                    job['status'] = 'running'
+                try:
+                    _run_job(job, executor)
+                except Exception:
+                    log.exception('image prefetch failed for batch %s', job['batch_id'])
+                    with _lock:
+                        job['status'] = 'error'
+    finally:
+        with _lock:
+            if _worker is threading.current_thread():
+                _worker = None
+
+
+def kick():
+    """Start the prefetch thread unless one is already running."""
+    global _worker
+    with _lock:
+        if _worker is not None and _worker.is_alive():
+            return False
+        _worker = threading.Thread(target=_run, name='image-prefetch', daemon=True)
+        _worker.start()
+        return True
@@ -0,0 +1,167 @@
+"""CardKingdom buy price history, delta-encoded.
+
+record() runs after each buylist refresh that loaded a new pricelist. It
+stores a ck_price_snapshots row plus, in ck_price_history, only the
+(scryfall_id, is_foil) rows whose price_buy or qty_buying differ from the
+previous snapshot. Every KEYFRAME_EVERY snapshots, the whole buylist is
+stored instead, so a card's value at any snapshot is found from the nearest
+keyframe and the deltas after it. Cards that left the buylist get a NULL
+price in either kind of snapshot. Storage therefore grows with price
+changes, not with refreshes.
+"""
+import os
+
+from .env import load_optional_dotenv
+
+load_optional_dotenv()
+from datetime import datetime
+
+KEYFRAME_EVERY = int(os.getenv('CK_HISTORY_KEYFRAME_EVERY', '30'))
+
+
+def _utc_now():
+    return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _last_keyframe(conn):
+    row = conn.execute('SELECT MAX(id) FROM ck_price_snapshots WHERE is_keyframe = 1').fetchone()
+    return row[0]
+
+
+def _load_previous_state(conn, keyframe_id):
+    # Latest value per card from the last keyframe on, into a temp table the
+    # diff can join against.
+    conn.execute('DROP TABLE IF EXISTS temp.ck_price_state')
+    conn.execute(
+        'CREATE TEMP TABLE ck_price_state (scryfall_id TEXT NOT NULL, is_foil INTEGER NOT NULL, '
+        'price_buy REAL, qty_buying INTEGER, PRIMARY KEY (scryfall_id, is_foil)) WITHOUT ROWID'
+    )
+    conn.execute(
+        'INSERT INTO temp.ck_price_state '
+        'SELECT scryfall_id, is_foil, price_buy, qty_buying FROM ('
+        '  SELECT scryfall_id, is_foil, price_buy, qty_buying, ROW_NUMBER() OVER ('
+        '    PARTITION BY scryfall_id, is_foil ORDER BY snapshot_id DESC) AS rn '
+        '  FROM ck_price_history WHERE snapshot_id >= ?'
+        ') WHERE rn = 1 AND price_buy IS NOT NULL',
+        (keyframe_id,),
+    )
+
+
+def record(conn, created_at=None):
+    """Append the current ck_buylist as a snapshot. Commits.
+
+    Returns {'snapshot_id', 'keyframe', 'changed', 'rows'}.
+    """
+    keyframe_id = _last_keyframe(conn)
+    since_keyframe = conn.execute(
+        'SELECT COUNT(*) FROM ck_price_snapshots WHERE id > ?', (keyframe_id or 0,),
+    ).fetchone()[0]
+    keyframe = keyframe_id is None or (KEYFRAME_EVERY > 0 and since_keyframe + 1 >= KEYFRAME_EVERY)
+    rows = conn.execute('SELECT COUNT(*) FROM ck_buylist').fetchone()[0]
+    if keyframe_id is not None:
+        _load_previous_state(conn, keyframe_id)
+    cur = conn.execute(
+        'INSERT INTO ck_price_snapshots (created_at, recorded_at, is_keyframe, row_count) VALUES (?, ?, ?, ?)',
+        (created_at, _utc_now(), int(keyframe), rows),
+    )
+    snapshot_id = cur.lastrowid
+    if keyframe:
+        changed = conn.execute(
+            'INSERT INTO ck_price_history (scryfall_id, is_foil, snapshot_id, price_buy, qty_buying) '
+            'SELECT scryfall_id, is_foil, ?, price_buy, qty_buying FROM ck_buylist',
+            (snapshot_id,),
+        ).rowcount
+    else:
+        changed = conn.execute(
+            'INSERT INTO ck_price_history (scryfall_id, is_foil, snapshot_id, price_buy, qty_buying) '
+            'SELECT c.scryfall_id, c.is_foil, ?, c.price_buy, c.qty_buying FROM ck_buylist c '
+            'LEFT JOIN temp.ck_price_state p ON p.scryfall_id = c.scryfall_id AND p.is_foil = c.is_foil '
+            'WHERE p.scryfall_id IS NULL OR p.price_buy IS NOT c.price_buy OR p.qty_buying IS NOT c.qty_buying',
+            (snapshot_id,),
+        ).rowcount
+    if keyframe_id is not None:
+        # Removals are recorded on keyframes too: the next deltas are diffed
+        # from this keyframe, which no longer has the card.
+        changed += conn.execute(
+            'INSERT INTO ck_price_history (scryfall_id, is_foil, snapshot_id, price_buy, qty_buying) '
+            'SELECT p.scryfall_id, p.is_foil, ?, NULL, NULL FROM temp.ck_price_state p '
+            'WHERE NOT EXISTS (SELECT 1 FROM ck_buylist c WHERE c.scryfall_id = p.scryfall_id AND c.is_foil = p.is_foil)',
+            (snapshot_id,),
+        ).rowcount
+        conn.execute('DROP TABLE temp.ck_price_state')
+    conn.execute('UPDATE ck_price_snapshots SET changed = ? WHERE id = ?', (changed, snapshot_id))
+    conn.commit()
+    return {'snapshot_id': snapshot_id, 'keyframe': keyframe, 'changed': changed, 'rows': rows}
+
+
+def price_series(conn, scryfall_id, is_foil=0):
+    """A card's buy price over time, one point per change, oldest first.
+
+    Points are dicts with created_at (the pricelist's), recorded_at,
+    price_buy and qty_buying; price_buy is None while the card was off the
+    buylist.
+    """
+    out = []
+    for row in conn.execute(
+        'SELECT s.created_at, s.recorded_at, h.price_buy, h.qty_buying FROM ck_price_history h '
+        'JOIN ck_price_snapshots s ON s.id = h.snapshot_id '
+        'WHERE h.scryfall_id = ? AND h.is_foil = ? ORDER BY h.snapshot_id',
+        (scryfall_id, int(is_foil)),
+    ).fetchall():
+        point = dict(row)
+        # Keyframes repeat unchanged values; they aren't changes.
+        if out and (out[-1]['price_buy'], out[-1]['qty_buying']) == (point['price_buy'], point['qty_buying']):
+            continue
+        out.append(point)
+    return out
+
+
+def biggest_movers(conn, limit=20, min_price=0.0, snapshot_id=None):
+    """Cards whose buy price changed most (by percent) in a snapshot.
+
+    Defaults to the latest snapshot, i.e. since the last refresh. Only cards
+    on the buylist both before and after are included. Rows have
+    scryfall_id, is_foil, name, edition, old_price, new_price, change and
+    change_pct, biggest absolute change_pct first.
+    """
+    if snapshot_id is None:
+        snapshot_id = conn.execute('SELECT MAX(id) FROM ck_price_snapshots').fetchone()[0]
+        if snapshot_id is None:
+            return []
+    rows = conn.execute(
+        'SELECT * FROM ('
+        '  SELECT h.scryfall_id, h.is_foil, h.price_buy AS new_price, ('
+        '    SELECT p.price_buy FROM ck_price_history p '
+        '    WHERE p.scryfall_id = h.scryfall_id AND p.is_foil = h.is_foil AND p.snapshot_id < h.snapshot_id '
+        '    ORDER BY p.snapshot_id DESC LIMIT 1'
+        '  ) AS old_price '
+        '  FROM ck_price_history h WHERE h.snapshot_id = ? AND h.price_buy IS NOT NULL'
+        ') m WHERE m.old_price IS NOT NULL AND m.old_price != m.new_price '
+        'AND MAX(m.old_price, m.new_price) >= ? '
+        'ORDER BY ABS(m.new_price - m.old_price) / m.old_price DESC LIMIT ?',
+        (snapshot_id, float(min_price or 0.0), int(limit)),
+    ).fetchall()
+    names = {}
+    if rows:
+        keys = [(r['scryfall_id'], r['is_foil']) for r in rows]
+        where = ' OR '.join(['(scryfall_id = ? AND is_foil = ?)'] * len(keys))
+        for r in conn.execute(
+            f'SELECT scryfall_id, is_foil, name, edition FROM ck_buylist WHERE {where}',
+            [v for key in keys for v in key],
+        ).fetchall():
+            names[(r['scryfall_id'], r['is_foil'])] = (r['name'], r['edition'])
+    out = []
+    for r in rows:
+        name, edition = names.get((r['scryfall_id'], r['is_foil']), (None, None))
+        change = r['new_price'] - r['old_price']
+        out.append({
+            'scryfall_id': r['scryfall_id'],
+            'is_foil': r['is_foil'],
+            'name': name,
+            'edition': edition,
+            'old_price': r['old_price'],
+            'new_price': r['new_price'],
+            'change': round(change, 2),
+            'change_pct': round(change / r['old_price'] * 100, 1),
+        })
+    return out
@@ -0,0 +1,248 @@
+"""Put-wall (sort-to-order): split picked batch lines back into customer orders."""
+from datetime import datetime
+
+
+def _utc_now():
+    return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _label_key(order):
+    label = order.get('label') or ''
+    try:
+        return (0, int(label), order['order_id'])
+    except (TypeError, ValueError):
+        return (1, label, order['order_id'])
+
+
+def assign_slots(orders):
+    """Number orders 1..N by label (numeric labels first) -> {order_id: slot}."""
+    return {o['order_id']: slot for slot, o in enumerate(sorted(orders, key=_label_key), start=1)}
+
+
+def allocate(items, lines, slots):
+    """Split each batch item's quantity across the order lines that share its key.
+
+    `items` are dicts with id, key, qty; `lines` are dicts with order_id, key,
+    qty; `slots` maps order_id -> slot. Lines are consumed in slot order, so the
+    lowest slot fills first. Returns a list of (batch_item_id, slot, qty).
+    """
+    by_key = {}
+    for ln in sorted(lines, key=lambda ln: slots.get(ln['order_id'], 0)):
+        if ln['order_id'] in slots and int(ln.get('qty') or 0) > 0:
+            by_key.setdefault(ln['key'], []).append([slots[ln['order_id']], int(ln['qty'])])
+    out = []
+    for item in items:
+        need = int(item.get('qty') or 0)
+        for entry in by_key.get(item['key'], []):
+            if need <= 0:
+                break
+            take = min(need, entry[1])
+            if take <= 0:
+                continue
+            entry[1] -= take
+            need -= take
+            out.append((item['id'], entry[0], take))
+    return out
+
+
+def _item_key(row):
+    return (row['scryfall_id'], row['condition'], row['language'], row['printing'])
+
+
+def _order_lines(conn, order_ids):
+    """manapool_order_lines rows for `order_ids`, in order then line order."""
+    ids = [oid for oid in dict.fromkeys(order_ids or []) if oid]
+    lines = []
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        placeholders = ','.join('?' for _ in chunk)
+        lines.extend(dict(ln) for ln in conn.execute(
+            f'SELECT * FROM manapool_order_lines WHERE order_id IN ({placeholders}) ORDER BY order_id, line_no',
+            chunk,
+        ).fetchall())
+    return lines
+
+
+def build(conn, batch_id, order_ids, line_key):
+    """(Re)compute and store the put-wall for a batch. Returns the slot count.
+
+    Only copies actually picked (qty_picked) are allocated to slots.
+    `line_key` maps a manapool_order_lines row to the same key shape as
+    (scryfall_id, condition, language, printing) on batch_items.
+    """
+    lines = []
+    orders = {}
+    for ln in _order_lines(conn, order_ids):
+        orders.setdefault(ln['order_id'], {'order_id': ln['order_id'], 'label': ln['label'], 'ship_name': ln['ship_name']})
+        lines.append({'order_id': ln['order_id'], 'key': line_key(ln), 'qty': ln['quantity']})
+    slots = assign_slots(orders.values())
+    items = [
+        {'id': r['id'], 'key': _item_key(r), 'qty': r['qty_picked']}
+        for r in conn.execute(
+            'SELECT id, scryfall_id, condition, language, printing, qty_picked FROM batch_items WHERE batch_id = ? ORDER BY id',
+            (batch_id,),
+        ).fetchall()
+    ]
+    allocations = allocate(items, lines, slots)
+
+    conn.execute('DELETE FROM put_wall_allocations WHERE batch_id = ?', (batch_id,))
+    conn.execute('DELETE FROM put_wall_slots WHERE batch_id = ?', (batch_id,))
+    conn.executemany(
+        'INSERT INTO put_wall_slots (batch_id, slot, order_id, label, ship_name) VALUES (?, ?, ?, ?, ?)',
+        [(batch_id, slot, oid, orders[oid]['label'], orders[oid]['ship_name']) for oid, slot in slots.items()],
+    )
+    conn.executemany(
+        'INSERT INTO put_wall_allocations (batch_id, batch_item_id, slot, qty) VALUES (?, ?, ?, ?)',
+        [(batch_id, item_id, slot, qty) for item_id, slot, qty in allocations],
+    )
+    conn.execute('UPDATE batches SET put_wall_built_at = ? WHERE id = ?', (_utc_now(), batch_id))
+    conn.commit()
+    return len(slots)
+
+
+def is_built(conn, batch_id):
+    row = conn.execute('SELECT put_wall_built_at FROM batches WHERE id = ?', (batch_id,)).fetchone()
+    return bool(row and row['put_wall_built_at'])
+
+
+def _slot_info(conn, batch_id, slot):
+    row = conn.execute(
+        'SELECT s.slot, s.order_id, s.label, s.ship_name, '
+        '       COALESCE(SUM(a.qty), 0) AS qty, COALESCE(SUM(a.qty_put), 0) AS qty_put '
+        'FROM put_wall_slots s LEFT JOIN put_wall_allocations a ON a.batch_id = s.batch_id AND a.slot = s.slot '
+        'WHERE s.batch_id = ? AND s.slot = ? GROUP BY s.slot',
+        (batch_id, slot),
+    ).fetchone()
+    if not row:
+        return None
+    info = dict(row)
+    info['order_complete'] = info['qty_put'] >= info['qty']
+    return info
+
+
+def _open_allocation(conn, batch_id, batch_item_id):
+    return conn.execute(
+        'SELECT * FROM put_wall_allocations WHERE batch_id = ? AND batch_item_id = ? AND qty_put < qty ORDER BY slot LIMIT 1',
+        (batch_id, batch_item_id),
+    ).fetchone()
+
+
+def _resolve_item(conn, batch_id, item_id=None, scryfall_id=None):
+    if item_id:
+        return int(item_id)
+    if not scryfall_id:
+        return None
+    row = conn.execute(
+        'SELECT a.batch_item_id FROM put_wall_allocations a JOIN batch_items bi ON bi.id = a.batch_item_id '
+        'WHERE a.batch_id = ? AND bi.scryfall_id = ? AND a.qty_put < a.qty ORDER BY a.slot LIMIT 1',
+        (batch_id, scryfall_id),
+    ).fetchone()
+    return row['batch_item_id'] if row else None
+
+
+def lookup(conn, batch_id, item_id=None, scryfall_id=None):
+    """Return the slot the next copy of an item belongs in, or None."""
+    batch_item_id = _resolve_item(conn, batch_id, item_id, scryfall_id)
+    if batch_item_id is None:
+        return None
+    alloc = _open_allocation(conn, batch_id, batch_item_id)
+    if not alloc:
+        return None
+    info = _slot_info(conn, batch_id, alloc['slot'])
+    info['batch_item_id'] = batch_item_id
+    info['item_qty'] = alloc['qty']
+    info['item_qty_put'] = alloc['qty_put']
+    return info
+
+
+def put(conn, batch_id, item_id=None, scryfall_id=None):
+    """Record one copy placed into its slot. Returns the updated slot info or None.
+
+    The increment only applies while the allocation has room, so two scans
+    racing for its last copy can't both count it; the loser takes the next
+    open allocation instead.
+    """
+    while True:
+        batch_item_id = _resolve_item(conn, batch_id, item_id, scryfall_id)
+        if batch_item_id is None:
+            return None
+        alloc = _open_allocation(conn, batch_id, batch_item_id)
+        if not alloc:
+            return None
+        cur = conn.execute(
+            'UPDATE put_wall_allocations SET qty_put = qty_put + 1 WHERE id = ? AND qty_put < qty',
+            (alloc['id'],),
+        )
+        conn.commit()
+        if cur.rowcount:
+            break
+    alloc = conn.execute('SELECT slot, qty, qty_put FROM put_wall_allocations WHERE id = ?', (alloc['id'],)).fetchone()
+    info = _slot_info(conn, batch_id, alloc['slot'])
+    info['batch_item_id'] = batch_item_id
+    info['item_qty'] = alloc['qty']
+    info['item_qty_put'] = alloc['qty_put']
+    return info
+
+
+def packing_slips(conn, batch_id, line_key):
+    """Per-slot packing slips listing every line of each order.
+
+    Each line carries qty (ordered), qty_picked (copies allocated to its slot),
+    qty_put and short, so an order that was short-picked ships with a slip that
+    shows what is missing. Slot totals count the copies to sort (qty, qty_put)
+    and the copies short. `line_key` is the same mapping `build` was given.
+    """
+    slots = [dict(r) for r in conn.execute(
+        'SELECT slot, order_id, label, ship_name FROM put_wall_slots WHERE batch_id = ? ORDER BY slot',
+        (batch_id,),
+    ).fetchall()]
+    items = {}
+    for r in conn.execute(
+        'SELECT id, card_name, set_code, collector_number, scryfall_id, condition, language, printing, is_missing '
+        'FROM batch_items WHERE batch_id = ? ORDER BY id',
+        (batch_id,),
+    ).fetchall():
+        items.setdefault(_item_key(r), dict(r))
+    allocated = {}
+    for a in conn.execute(
+        'SELECT a.slot, a.qty, a.qty_put, bi.scryfall_id, bi.condition, bi.language, bi.printing '
+        'FROM put_wall_allocations a JOIN batch_items bi ON bi.id = a.batch_item_id WHERE a.batch_id = ?',
+        (batch_id,),
+    ).fetchall():
+        entry = allocated.setdefault((a['slot'], _item_key(a)), [0, 0])
+        entry[0] += a['qty']
+        entry[1] += a['qty_put']
+
+    by_order = {}
+    for ln in _order_lines(conn, [s['order_id'] for s in slots]):
+        by_order.setdefault(ln['order_id'], []).append(ln)
+    for s in slots:
+        s['lines'] = []
+        s['qty'] = s['qty_put'] = s['short'] = 0
+        for ln in by_order.get(s['order_id'], []):
+            key = line_key(ln)
+            qty = int(ln['quantity'] or 0)
+            left = allocated.get((s['slot'], key), [0, 0])
+            picked = min(qty, left[0])
+            put = min(picked, left[1])
+            left[0] -= picked
+            left[1] -= put
+            item = items.get(key) or {}
+            s['lines'].append({
+                'item_id': item.get('id'),
+                'card_name': item.get('card_name') or ln['scryfall_id'] or 'Unknown card',
+                'set_code': item.get('set_code') or '',
+                'collector_number': item.get('collector_number'),
+                'condition': key[1],
+                'language': key[2],
+                'printing': key[3],
+                'is_missing': item.get('is_missing') or 0,
+                'qty': qty,
+                'qty_picked': picked,
+                'qty_put': put,
+                'short': qty - picked,
+            })
+            s['qty'] += picked
+            s['qty_put'] += put
+            s['short'] += qty - picked
+    return slots
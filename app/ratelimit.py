@@ -0,0 +1,107 @@
+"""Process-wide token buckets with priority, shared by every thread.
+
+Callers block in `acquire()` until a token is free. Waiters are served by
+priority (INTERACTIVE before BULK), then in arrival order, so a card modal
+opened during a large enrichment run doesn't queue behind hundreds of
+background lookups.
+"""
+import heapq
+import itertools
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+INTERACTIVE = 0
+BULK = 1
+_PRIORITY_NAMES = {INTERACTIVE: 'interactive', BULK: 'bulk'}
+
+_local = threading.local()
+# Every live bucket, for metrics(); buckets dropped by their owner go away.
+_buckets = weakref.WeakSet()
+
+
+def current_priority():
+    return getattr(_local, 'priority', BULK)
+
+
+@contextmanager
+def priority(level):
+    """Run the block (in this thread) at `level`; worker threads must set their own."""
+    previous = current_priority()
+    _local.priority = level
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+class TokenBucket:
+    """`rate` tokens/second, holding at most `burst`. A rate <= 0 disables limiting.
+
+    `clock` (time.monotonic by default) can be replaced in tests.
+    """
+
+    def __init__(self, name, rate, burst=1, clock=time.monotonic):
+        self.name = name
+        self.rate = float(rate or 0)
+        self.burst = max(1.0, float(burst or 1))
+        self._clock = clock
+        self._tokens = self.burst
+        self._updated = clock()
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+        self._stats = {level: {'count': 0, 'wait_total': 0.0, 'wait_max': 0.0} for level in _PRIORITY_NAMES}
+        _buckets.add(self)
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, level=None):
+        """Take one token, waiting if needed. Returns seconds spent waiting."""
+        level = current_priority() if level is None else level
+        start = self._clock()
+        with self._cond:
+            if self.rate > 0:
+                ticket = (level, next(self._seq))
+                heapq.heappush(self._waiting, ticket)
+                while True:
+                    now = self._clock()
+                    self._refill(now)
+                    if self._waiting[0] == ticket and self._tokens >= 1:
+                        heapq.heappop(self._waiting)
+                        self._tokens -= 1
+                        break
+                    # Sleep until the next token is due; anyone ahead of us
+                    # wakes the queue again when they take it.
+                    self._cond.wait(max(0.001, (1 - self._tokens) / self.rate))
+                self._cond.notify_all()
+            waited = self._clock() - start
+            stats = self._stats.setdefault(level, {'count': 0, 'wait_total': 0.0, 'wait_max': 0.0})
+            stats['count'] += 1
+            stats['wait_total'] += waited
+            stats['wait_max'] = max(stats['wait_max'], waited)
+        return waited
+
+    def metrics(self):
+        with self._cond:
+            by_priority = {}
+            for level, stats in self._stats.items():
+                by_priority[_PRIORITY_NAMES.get(level, str(level))] = {
+                    'requests': stats['count'],
+                    'avg_wait_ms': round(1000 * stats['wait_total'] / stats['count'], 1) if stats['count'] else 0.0,
+                    'max_wait_ms': round(1000 * stats['wait_max'], 1),
+                }
+            return {
+                'name': self.name,
+                'rate': self.rate,
+                'burst': self.burst,
+                'queue_depth': len(self._waiting),
+                'priorities': by_priority,
+            }
+
+
+def metrics():
+    return [bucket.metrics() for bucket in sorted(_buckets, key=lambda b: b.name)]
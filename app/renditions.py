@@ -0,0 +1,93 @@
+"""Card image renditions made locally from one downloaded master.
+
+Only Scryfall's `large` JPEG is downloaded for a card; `normal` and `small`,
+and WebP versions of all three for clients that accept them, are resized
+from it with Pillow the first time they're asked for. Resizing runs on a
+small thread pool so a burst of new cards can't take every core from the
+request handlers. Without Pillow installed every size is downloaded
+individually, as before.
+
+placeholder() makes the low-quality preview (a ~20px JPEG as a data: URI)
+that pages show while a full image loads.
+"""
+import os
+
+from .env import load_optional_dotenv
+
+load_optional_dotenv()
+import io
+import base64
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:  # optional dependency
+    Image = None
+
+from . import imagecache
+
+MASTER = 'large'
+# Scryfall's widths for the sizes we can derive.
+WIDTHS = {'large': 672, 'normal': 488, 'small': 146}
+JPEG_QUALITY = int(os.getenv('RENDITION_JPEG_QUALITY', '85'))
+WEBP_QUALITY = int(os.getenv('RENDITION_WEBP_QUALITY', '80'))
+WORKERS = int(os.getenv('RENDITION_WORKERS', '2'))
+PLACEHOLDER_WIDTH = 20
+PLACEHOLDER_QUALITY = 40
+
+_pool = ThreadPoolExecutor(max_workers=max(1, WORKERS), thread_name_prefix='rendition')
+
+
+def available():
+    return Image is not None
+
+
+def derivable(size, ext='jpg'):
+    """True if (size, ext) is made from the master rather than downloaded."""
+    return available() and size in WIDTHS and (size != MASTER or ext != 'jpg')
+
+
+def wants_webp(accept_header):
+    return available() and 'image/webp' in (accept_header or '')
+
+
+def _render(master, size, ext):
+    with Image.open(master) as img:
+        img = img.convert('RGB')
+        width = WIDTHS[size]
+        if img.width > width:
+            img = img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+        buf = io.BytesIO()
+        if ext == 'webp':
+            img.save(buf, 'WEBP', quality=WEBP_QUALITY, method=4)
+        else:
+            img.save(buf, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buf.getvalue()
+
+
+def derive(scryfall_id, size, ext, master):
+    """Path of a rendition, rendering it from the `master` file if needed.
+
+    Raises OSError / ValueError if the master can't be decoded.
+    """
+    path = imagecache.lookup(scryfall_id, size, ext)
+    if path:
+        return path
+    with imagecache.claim(scryfall_id, size, ext) as path:
+        if path.exists():
+            return imagecache.adopt(path)
+        data = _pool.submit(_render, master, size, ext).result()
+        return imagecache.write(path, [data], len(data))
+
+
+def placeholder(path):
+    """A PLACEHOLDER_WIDTH-wide JPEG of an image, as a data: URI."""
+    with Image.open(path) as img:
+        # JPEG decoders can scale down by 1/2..1/8 while decoding, which makes
+        # this far cheaper than a full decode.
+        img.draft('RGB', (PLACEHOLDER_WIDTH * 2, PLACEHOLDER_WIDTH * 3))
+        img = img.convert('RGB')
+        img.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH * 2), Image.LANCZOS)
+        buf = io.BytesIO()
+        img.save(buf, 'JPEG', quality=PLACEHOLDER_QUALITY, optimize=True)
+    return 'data:image/jpeg;base64,' + base64.b64encode(buf.getvalue()).decode('ascii')
@@ -4,17 +4,46 @@ from .env import load_optional_dotenv
 
 load_optional_dotenv()
 import json
-from pathlib import Path
+import time
+import sqlite3
+import logging
+from types import MappingProxyType
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
 import requests
 from requests.adapters import HTTPAdapter
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from . import cardcodec, cardnames, imagecache, lru, ratelimit, renditions
+# Re-exported; migrations/020_backfill_name_norm.py imports it from here.
+from .cardnames import normalize_name
+from .db import get_conn
+
+log = logging.getLogger('scryfall')
 
 BASE_URL = os.getenv('SCRYFALL_BASE_URL', 'https://api.scryfall.com')
 IMAGE_SIZE = os.getenv('SCRYFALL_IMAGE_SIZE', 'normal')
 MAX_WORKERS = int(os.getenv('SCRYFALL_MAX_WORKERS', '8'))
-CACHE_DIR = Path('data/cache/images')
+# Scryfall asks for no more than ~10 requests/second per client.
+RATE_PER_SECOND = float(os.getenv('SCRYFALL_RATE', '10'))
+RATE_BURST = float(os.getenv('SCRYFALL_RATE_BURST', '2'))
+IMAGE_RATE_PER_SECOND = float(os.getenv('SCRYFALL_IMAGE_RATE', '50'))
+IMAGE_RATE_BURST = float(os.getenv('SCRYFALL_IMAGE_RATE_BURST', '10'))
+# /cards/collection accepts at most 75 identifiers per request.
+COLLECTION_CHUNK = 75
+# Parsed cards kept in memory, keyed by scryfall id; sized by their JSON length.
+CARD_LRU_ENTRIES = int(os.getenv('CARD_LRU_ENTRIES', '5000'))
+CARD_LRU_MB = float(os.getenv('CARD_LRU_MB', '64'))
+# Cached cards older than this are still served, but refreshed in the
+# background (stale-while-revalidate). 0 = never refresh.
+CARD_TTL_HOURS = float(os.getenv('SCRYFALL_CARD_TTL_HOURS', '168'))
+# How long a 404 for an id / printing / name is remembered. 0 = don't.
+NEGATIVE_TTL_HOURS = float(os.getenv('SCRYFALL_NEGATIVE_TTL_HOURS', '24'))
+REFRESH_WORKERS = int(os.getenv('SCRYFALL_REFRESH_WORKERS', '2'))
+# A stale card whose background refresh fails (or 404s) isn't retried for
+# this long, doubling per failure up to REFRESH_BACKOFF_MAX_SECONDS.
+REFRESH_BACKOFF_SECONDS = 300
+REFRESH_BACKOFF_MAX_SECONDS = 24 * 3600
 _THREAD_LOCAL = threading.local()
 
 # Scryfall rejects requests that use a default HTTP-library User-Agent
@@ -39,6 +68,49 @@ def _http():
     return session
 
 
+def http_session():
+    """This thread's Scryfall session (identifying User-Agent and Accept set).
+
+    For other modules fetching from Scryfall hosts; acquire API_LIMIT or
+    IMAGE_LIMIT before each request.
+    """
+    return _http()
+
+
+# One limiter per host for the whole process: the API asks for ~10 req/s, the
+# image CDN is far more lenient but still shouldn't be hammered.
+API_LIMIT = ratelimit.TokenBucket('scryfall_api', RATE_PER_SECOND, burst=RATE_BURST)
+IMAGE_LIMIT = ratelimit.TokenBucket('scryfall_images', IMAGE_RATE_PER_SECOND, burst=IMAGE_RATE_BURST)
+
+
+# scryfall_id -> (card, updated_at)
+_cards = lru.LRUCache('cards', max_entries=CARD_LRU_ENTRIES, max_bytes=CARD_LRU_MB * 1024 * 1024)
+_refresh_pool = ThreadPoolExecutor(max_workers=max(1, REFRESH_WORKERS), thread_name_prefix='card-refresh')
+_refresh_lock = threading.Lock()
+_refreshing = set()
+# scryfall_id -> (consecutive failed refreshes, monotonic time of next attempt)
+_refresh_backoff = lru.LRUCache('card refresh backoff', max_entries=20000)
+
+
+def forget_cards(scryfall_ids):
+    """Drop parsed copies once card_cache row changes are committed.
+
+    Call it after the commit: a reader that misses the LRU before then reads
+    the old row and caches it again.
+    """
+    for sid in scryfall_ids:
+        _cards.pop(sid)
+
+
+def _freeze(value):
+    """Read-only view of parsed JSON (mappings and tuples), shared through the LRU."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
 def _utc_now():
     return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
 
@@ -48,144 +120,465 @@ def _get(conn, sql, args=()):
     return cur.fetchone()
 
 
-def _save_card_cache(conn, card, commit=True):
-    if not card or 'id' not in card:
-        return
-    conn.execute(
-        'INSERT OR REPLACE INTO card_cache (scryfall_id, card_name, set_code, collector_number, data_json, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
-        (
-            card.get('id'),
-            card.get('name'),
-            card.get('set'),
-            card.get('collector_number'),
-            json.dumps(card),
-            _utc_now(),
-        ),
+def _older_than(timestamp, hours):
+    try:
+        ts = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
+    except (TypeError, ValueError):
+        return True
+    return datetime.utcnow() - ts > timedelta(hours=hours)
+
+
+def _is_stale(updated_at):
+    return CARD_TTL_HOURS > 0 and _older_than(updated_at, CARD_TTL_HOURS)
+
+
+def _set_number_key(set_code, collector_number):
+    return f'set:{(set_code or "").strip().lower()}/{str(collector_number or "").strip()}'
+
+
+# Sizes with their own card_cache column (see migrations/017_card_cache_columns.sql).
+IMAGE_COLUMNS = {'small': 'image_small', 'normal': 'image_normal', 'large': 'image_large', 'png': 'image_png'}
+CARD_COLUMNS = (
+    'scryfall_id', 'card_name', 'set_code', 'collector_number', 'data_json',
+    'set_name', 'rarity', 'image_small', 'image_normal', 'image_large', 'image_png',
+    'face_count', 'oracle_id', 'released_at', 'name_norm', 'updated_at',
+)
+
+
+def card_row(card, now=None):
+    """Values for CARD_COLUMNS, with the hot fields extracted from `card`."""
+    faces = card.get('card_faces') or []
+    return (
+        card.get('id'),
+        card.get('name'),
+        card.get('set'),
+        card.get('collector_number'),
+        cardcodec.encode(card),
+        card.get('set_name'),
+        card.get('rarity'),
+        _image_url(card, 'small'),
+        _image_url(card, 'normal'),
+        _image_url(card, 'large'),
+        _image_url(card, 'png'),
+        max(1, len(faces)),
+        card.get('oracle_id') or (faces[0].get('oracle_id') if faces else None),
+        card.get('released_at'),
+        normalize_name(card.get('name')) or None,
+        now or _utc_now(),
     )
-    if commit:
-        conn.commit()
 
 
-def _save_cards_cache_bulk(conn, cards):
-    rows = []
+def save_sets(conn, cards):
+    """Add the sets of `cards` to the sets catalog (earliest release date wins)."""
+    sets = {}
     for card in cards:
-        if not card or 'id' not in card:
+        code = (card.get('set') or '').lower()
+        if not code or not card.get('set_name'):
             continue
-        rows.append(
-            (
-                card.get('id'),
-                card.get('name'),
-                card.get('set'),
-                card.get('collector_number'),
-                json.dumps(card),
-                _utc_now(),
-            )
-        )
-    if not rows:
+        released = card.get('released_at')
+        prev = sets.get(code)
+        if prev is None or (released and (prev[2] is None or released < prev[2])):
+            sets[code] = (code, card['set_name'], released)
+    if not sets:
         return
     conn.executemany(
-        'INSERT OR REPLACE INTO card_cache (scryfall_id, card_name, set_code, collector_number, data_json, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
-        rows,
+        'INSERT INTO sets (code, name, released_at) VALUES (?, ?, ?) '
+        'ON CONFLICT(code) DO UPDATE SET name = excluded.name, '
+        'released_at = COALESCE(MIN(sets.released_at, excluded.released_at), sets.released_at, excluded.released_at)',
+        list(sets.values()),
     )
+
+
+# An upsert rather than INSERT OR REPLACE: REPLACE deletes the row, which gives
+# it a new id and skips the delete trigger that keeps card_search in sync.
+# content_hash is cleared so the next bulk ingest rewrites the row.
+_INSERT_CARD_SQL = (
+    f"INSERT INTO card_cache ({', '.join(CARD_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in CARD_COLUMNS)}) "
+    'ON CONFLICT(scryfall_id) DO UPDATE SET '
+    + ', '.join(f'{c} = excluded.{c}' for c in CARD_COLUMNS if c != 'scryfall_id')
+    + ', content_hash = NULL'
+)
+
+
+def clear_misses(conn, cards):
+    """Drop negative-cache entries for `cards` (by id and set/number); no commit."""
+    keys = []
+    for card in cards:
+        keys.append((f"id:{card['id']}",))
+        keys.append((_set_number_key(card.get('set'), card.get('collector_number')),))
+    conn.executemany('DELETE FROM card_lookup_misses WHERE lookup_key = ?', keys)
+
+
+def _save_card_cache(conn, card):
+    if not card or 'id' not in card:
+        return
+    conn.execute(_INSERT_CARD_SQL, card_row(card))
+    save_sets(conn, [card])
+    clear_misses(conn, [card])
     conn.commit()
+    forget_cards([card['id']])
+    cardnames.add_cards(conn, [card])
+
+
+def save_cards(conn, cards):
+    """Upsert Scryfall card objects into card_cache and commit."""
+    cards = [card for card in cards if card and 'id' in card]
+    if not cards:
+        return
+    now = _utc_now()
+    conn.executemany(_INSERT_CARD_SQL, [card_row(card, now) for card in cards])
+    save_sets(conn, cards)
+    clear_misses(conn, cards)
+    conn.commit()
+    forget_cards([card['id'] for card in cards])
+    cardnames.add_cards(conn, cards)
+
+
+def _missing_keys(conn, keys):
+    """The subset of lookup keys that 404'd within NEGATIVE_TTL_HOURS."""
+    keys = [k for k in dict.fromkeys(keys) if k]
+    if NEGATIVE_TTL_HOURS <= 0 or not keys:
+        return set()
+    out = set()
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        placeholders = ','.join(['?'] * len(chunk))
+        for row in conn.execute(
+            f'SELECT lookup_key, checked_at FROM card_lookup_misses WHERE lookup_key IN ({placeholders})',
+            tuple(chunk),
+        ).fetchall():
+            if not _older_than(row['checked_at'], NEGATIVE_TTL_HOURS):
+                out.add(row['lookup_key'])
+    return out
+
+
+def _remember_missing(conn, keys):
+    if NEGATIVE_TTL_HOURS <= 0 or not keys:
+        return
+    now = _utc_now()
+    conn.executemany(
+        'INSERT OR REPLACE INTO card_lookup_misses (lookup_key, checked_at) VALUES (?, ?)',
+        [(k, now) for k in dict.fromkeys(keys)],
+    )
+    conn.commit()
+
+
+def _record_refresh(scryfall_ids, refreshed):
+    now = time.monotonic()
+    for sid in scryfall_ids:
+        if sid in refreshed:
+            _refresh_backoff.pop(sid)
+            continue
+        failures = _refresh_backoff.get(sid, (0, 0))[0] + 1
+        delay = min(REFRESH_BACKOFF_MAX_SECONDS, REFRESH_BACKOFF_SECONDS * 2 ** (failures - 1))
+        _refresh_backoff.put(sid, (failures, now + delay))
+
+
+def _refresh(scryfall_ids):
+    refreshed = set()
+    try:
+        with ratelimit.priority(ratelimit.BULK):
+            cards, _ = _fetch_collection([{'id': sid} for sid in scryfall_ids])
+        if cards:
+            with get_conn() as conn:
+                save_cards(conn, cards)
+            refreshed = {card.get('id') for card in cards}
+    except Exception:
+        log.exception('background card refresh failed')
+    finally:
+        _record_refresh(scryfall_ids, refreshed)
+        with _refresh_lock:
+            _refreshing.difference_update(scryfall_ids)
+
+
+def _schedule_refresh(scryfall_ids):
+    """Re-fetch stale cards in the background; callers keep the cached copy.
+
+    Cards whose last refresh failed or 404'd wait out their backoff first.
+    """
+    now = time.monotonic()
+    with _refresh_lock:
+        new = [
+            sid for sid in dict.fromkeys(scryfall_ids)
+            if sid not in _refreshing and _refresh_backoff.get(sid, (0, 0))[1] <= now
+        ]
+        _refreshing.update(new)
+    if new:
+        _refresh_pool.submit(_refresh, new)
+
+
+def _decode_row(row):
+    text = cardcodec.to_json(row['data_json'])
+    card = _freeze(json.loads(text))
+    _cards.put(row['scryfall_id'], (card, row['updated_at']), len(text))
+    return card, row['updated_at']
 
 
 def _load_card_cache(conn, scryfall_id):
-    row = _get(conn, 'SELECT data_json FROM card_cache WHERE scryfall_id = ?', (scryfall_id,))
-    if not row:
-        return None
-    return json.loads(row['data_json'])
+    entry = _cards.get(scryfall_id)
+    if entry is None:
+        row = _get(conn, 'SELECT scryfall_id, data_json, updated_at FROM card_cache WHERE scryfall_id = ?', (scryfall_id,))
+        if not row:
+            return None
+        entry = _decode_row(row)
+    card, updated_at = entry
+    if _is_stale(updated_at):
+        _schedule_refresh([scryfall_id])
+    return card
 
 
 def _load_cards_cache(conn, scryfall_ids):
     ids = [sid for sid in dict.fromkeys(scryfall_ids or []) if sid]
     if not ids:
         return {}
-    placeholders = ','.join(['?'] * len(ids))
-    rows = conn.execute(
-        f'SELECT scryfall_id, data_json FROM card_cache WHERE scryfall_id IN ({placeholders})',
-        tuple(ids),
-    ).fetchall()
     out = {}
-    for row in rows:
-        try:
-            out[row['scryfall_id']] = json.loads(row['data_json'])
-        except Exception:
+    stale = []
+    misses = []
+    for sid in ids:
+        entry = _cards.get(sid)
+        if entry is None:
+            misses.append(sid)
             continue
+        out[sid] = entry[0]
+        if _is_stale(entry[1]):
+            stale.append(sid)
+    for start in range(0, len(misses), 500):
+        chunk = misses[start:start + 500]
+        placeholders = ','.join(['?'] * len(chunk))
+        for row in conn.execute(
+            f'SELECT scryfall_id, data_json, updated_at FROM card_cache WHERE scryfall_id IN ({placeholders})',
+            tuple(chunk),
+        ).fetchall():
+            try:
+                card, updated_at = _decode_row(row)
+            except Exception:
+                continue
+            out[row['scryfall_id']] = card
+            if _is_stale(updated_at):
+                stale.append(row['scryfall_id'])
+    if stale:
+        _schedule_refresh(stale)
     return out
 
 
+def _cached_id(conn, where, args):
+    """scryfall_id of the newest cached printing matching `where`, or None."""
+    row = _get(conn, f'SELECT scryfall_id FROM card_cache WHERE {where} ORDER BY released_at DESC LIMIT 1', args)
+    return row['scryfall_id'] if row else None
+
+
+def _post_collection(identifiers):
+    """POST one chunk to /cards/collection -> (cards, not_found), or (None, None) on failure."""
+    API_LIMIT.acquire()
+    try:
+        resp = _http().post(f"{BASE_URL}/cards/collection", json={'identifiers': identifiers}, timeout=30)
+        if resp.status_code == 200:
+            data = resp.json()
+            return data.get('data') or [], data.get('not_found') or []
+    except (requests.RequestException, ValueError):
+        return None, None
+    return None, None
+
+
+def _fetch_collection(identifiers):
+    """Look up identifiers in concurrent chunks of COLLECTION_CHUNK.
+
+    Returns (cards, not_found). Identifiers in a chunk that failed outright are
+    in neither list; they stay uncached and are retried on the next call.
+    """
+    chunks = [identifiers[i:i + COLLECTION_CHUNK] for i in range(0, len(identifiers), COLLECTION_CHUNK)]
+    cards = []
+    not_found = []
+    if not chunks:
+        return cards, not_found
+    level = ratelimit.current_priority()
+
+    def _post(chunk):
+        with ratelimit.priority(level):
+            return _post_collection(chunk)
+
+    workers = max(1, min(MAX_WORKERS, len(chunks)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for found, missing in executor.map(_post, chunks):
+            if found is None:
+                continue
+            cards.extend(found)
+            not_found.extend(missing)
+    return cards, not_found
+
+
+def _fetch_each(paths):
+    """GET each `/cards/...` path concurrently -> ({path: card}, [paths that 404'd])."""
+    level = ratelimit.current_priority()
+
+    def _fetch_one(path):
+        API_LIMIT.acquire(level)
+        try:
+            resp = _http().get(f"{BASE_URL}{path}", timeout=15)
+            if resp.status_code == 200:
+                return path, resp.json(), 200
+            return path, None, resp.status_code
+        except requests.RequestException:
+            return path, None, None
+
+    found = {}
+    gone = []
+    if not paths:
+        return found, gone
+    workers = max(1, min(MAX_WORKERS, len(paths)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_fetch_one, path) for path in paths]
+        for fut in as_completed(futures):
+            path, card, status = fut.result()
+            if card:
+                found[path] = card
+            elif status == 404:
+                gone.append(path)
+    return found, gone
+
+
+def _get_card(path, params=None):
+    """GET one card -> (card, status); status is None on a network error."""
+    API_LIMIT.acquire()
+    try:
+        resp = _http().get(f"{BASE_URL}{path}", params=params, timeout=15)
+        if resp.status_code == 200:
+            return resp.json(), 200
+        return None, resp.status_code
+    except (requests.RequestException, ValueError):
+        return None, None
+
+
 def fetch_cards_by_ids(conn, scryfall_ids):
     ids = [sid for sid in dict.fromkeys(scryfall_ids or []) if sid]
     if not ids:
         return {}
     cached = _load_cards_cache(conn, ids)
-    missing = [sid for sid in ids if sid not in cached]
+    gone = _missing_keys(conn, [f'id:{sid}' for sid in ids if sid not in cached])
+    missing = [sid for sid in ids if sid not in cached and f'id:{sid}' not in gone]
     fetched = {}
 
-    def _fetch_one(scryfall_id):
-        try:
-            resp = _http().get(f"{BASE_URL}/cards/{scryfall_id}", timeout=15)
-            if resp.status_code == 200:
-                return scryfall_id, resp.json()
-        except requests.RequestException:
-            return scryfall_id, None
-        return scryfall_id, None
-
     if missing:
-        workers = max(1, min(MAX_WORKERS, len(missing)))
-        with ThreadPoolExecutor(max_workers=workers) as executor:
-            futures = [executor.submit(_fetch_one, sid) for sid in missing]
-            for fut in as_completed(futures):
-                sid, card = fut.result()
-                if card:
-                    fetched[sid] = card
+        cards, not_found = _fetch_collection([{'id': sid} for sid in missing])
+        for card in cards:
+            if card.get('id'):
+                fetched[card['id']] = card
+        # Only ids the collection endpoint didn't recognise get a single lookup.
+        retry = [i.get('id') for i in not_found if i.get('id') and i.get('id') not in fetched]
+        found, gone_paths = _fetch_each([f"/cards/{sid}" for sid in retry])
+        for card in found.values():
+            fetched[card['id']] = card
         if fetched:
-            _save_cards_cache_bulk(conn, fetched.values())
+            save_cards(conn, fetched.values())
+        _remember_missing(conn, [f"id:{path.rsplit('/', 1)[1]}" for path in gone_paths])
 
     return {**cached, **fetched}
 
 
+def _set_key(set_code, collector_number):
+    return ((set_code or '').strip().lower(), str(collector_number or '').strip())
+
+
+def fetch_cards_by_set(conn, pairs):
+    """Bulk lookup by (set_code, collector_number) -> {(set, number): card}.
+
+    Keys are normalized with a lowercase set code. Cached cards are used first;
+    the rest go through /cards/collection with a per-card fallback for
+    not-found entries.
+    """
+    keys = [k for k in dict.fromkeys(_set_key(s, n) for s, n in (pairs or [])) if k[0] and k[1]]
+    if not keys:
+        return {}
+    wanted = set(keys)
+    ids = {}
+    # Join the exact pairs so each one is a seek on idx_card_cache_set_number.
+    for start in range(0, len(keys), 250):
+        chunk = keys[start:start + 250]
+        values = ','.join(['(?, ?)'] * len(chunk))
+        for row in conn.execute(
+            f'SELECT c.scryfall_id, c.set_code, c.collector_number FROM (VALUES {values}) k '
+            'JOIN card_cache c ON c.set_code = k.column1 AND c.collector_number = k.column2',
+            tuple(v for key in chunk for v in key),
+        ).fetchall():
+            key = _set_key(row['set_code'], row['collector_number'])
+            if key in wanted and key not in ids:
+                ids[key] = row['scryfall_id']
+    cached = _load_cards_cache(conn, ids.values())
+    found = {key: cached[sid] for key, sid in ids.items() if sid in cached}
+    gone = _missing_keys(conn, [_set_number_key(s, n) for s, n in keys if (s, n) not in found])
+    missing = [k for k in keys if k not in found and _set_number_key(*k) not in gone]
+    fetched = []
+    if missing:
+        cards, not_found = _fetch_collection([{'set': s, 'collector_number': n} for s, n in missing])
+        for card in cards:
+            key = _set_key(card.get('set'), card.get('collector_number'))
+            if key in wanted:
+                found[key] = card
+                fetched.append(card)
+        retry = [
+            _set_key(i.get('set'), i.get('collector_number'))
+            for i in not_found
+            if _set_key(i.get('set'), i.get('collector_number')) not in found
+        ]
+        by_path, gone_paths = _fetch_each([f"/cards/{s}/{n}" for s, n in retry])
+        for (s, n) in retry:
+            card = by_path.get(f"/cards/{s}/{n}")
+            if card:
+                found[(s, n)] = card
+                fetched.append(card)
+        if fetched:
+            save_cards(conn, fetched)
+        gone_paths = set(gone_paths)
+        _remember_missing(conn, [_set_number_key(s, n) for s, n in retry if f"/cards/{s}/{n}" in gone_paths])
+    return found
+
+
+def _fetch_and_cache(conn, miss_key, path, params=None):
+    if miss_key in _missing_keys(conn, [miss_key]):
+        return None
+    card, status = _get_card(path, params)
+    if card:
+        _save_card_cache(conn, card)
+        return card
+    if status == 404:
+        _remember_missing(conn, [miss_key])
+    return None
+
+
 def fetch_card_by_id(conn, scryfall_id):
     cached = _load_card_cache(conn, scryfall_id)
     if cached:
         return cached
-    try:
-        resp = _http().get(f"{BASE_URL}/cards/{scryfall_id}", timeout=15)
-        if resp.status_code == 200:
-            card = resp.json()
-            _save_card_cache(conn, card)
-            return card
-    except requests.RequestException:
-        return None
-    return None
+    return _fetch_and_cache(conn, f'id:{scryfall_id}', f'/cards/{scryfall_id}')
 
 
 def fetch_card_by_set(conn, set_code, collector_number):
-    try:
-        resp = _http().get(f"{BASE_URL}/cards/{set_code}/{collector_number}", timeout=15)
-        if resp.status_code == 200:
-            card = resp.json()
-            _save_card_cache(conn, card)
-            return card
-    except requests.RequestException:
-        return None
-    return None
+    set_code = (set_code or '').strip().lower()
+    collector_number = str(collector_number or '').strip()
+    sid = _cached_id(conn, 'set_code = ? AND collector_number = ?', (set_code, collector_number))
+    cached = _load_card_cache(conn, sid) if sid else None
+    if cached:
+        return cached
+    return _fetch_and_cache(conn, _set_number_key(set_code, collector_number), f'/cards/{set_code}/{collector_number}')
 
 
-def fetch_card_fuzzy(conn, name):
-    try:
-        resp = _http().get(f"{BASE_URL}/cards/named", params={'fuzzy': name}, timeout=15)
-        if resp.status_code == 200:
-            card = resp.json()
-            _save_card_cache(conn, card)
-            return card
-    except requests.RequestException:
-        return None
-    return None
+def _fetch_named(conn, name):
+    return _fetch_and_cache(conn, f'name:{normalize_name(name)}', '/cards/named', {'fuzzy': name})
+
+
+def fetch_card_fuzzy(conn, name, set_code=None):
+    """Best cached match for `name` (preferring a printing from `set_code`);
+    Scryfall's fuzzy search only when no cached name is close enough."""
+    sid, confidence = cardnames.best_match(conn, name, set_code)
+    cached = _load_card_cache(conn, sid) if sid and confidence >= cardnames.MIN_CONFIDENCE else None
+    if cached:
+        return cached
+    return _fetch_named(conn, name)
 
 
 def search_cards(name, limit=10):
+    API_LIMIT.acquire()
     try:
         resp = _http().get(f"{BASE_URL}/cards/search", params={'q': name, 'order': 'released'}, timeout=15)
         if resp.status_code == 200:
@@ -204,12 +597,58 @@ def resolve_card(conn, item):
         if card:
             return card, 'set'
     if item.get('card_name'):
-        card = fetch_card_fuzzy(conn, item['card_name'])
+        card = fetch_card_fuzzy(conn, item['card_name'], item.get('set_code'))
         if card:
             return card, 'fuzzy'
     return None, None
 
 
+def resolve_cards(conn, items, fuzzy=True, remote=True):
+    """Bulk resolve_card: one (card, strategy) per item, in order.
+
+    Scryfall ids and set + collector number pairs are looked up in bulk, then
+    remaining names are matched against the local cache (cardnames). Only
+    names without a confident local match go to Scryfall, and only when
+    `remote` is set.
+    """
+    items = list(items or [])
+    by_id = fetch_cards_by_ids(conn, [it.get('scryfall_id') for it in items])
+    by_set = fetch_cards_by_set(conn, [
+        (it.get('set_code'), it.get('collector_number'))
+        for it in items
+        if not it.get('scryfall_id') and it.get('set_code') and it.get('collector_number')
+    ])
+    out = []
+    by_name = []
+    for it in items:
+        if it.get('scryfall_id'):
+            card = by_id.get(it['scryfall_id'])
+            out.append((card, 'id') if card else (None, None))
+            continue
+        card = by_set.get(_set_key(it.get('set_code'), it.get('collector_number')))
+        if card:
+            out.append((card, 'set'))
+            continue
+        if fuzzy and it.get('card_name'):
+            by_name.append(len(out))
+        out.append((None, None))
+
+    if by_name:
+        matches = cardnames.best_matches(conn, [(items[i]['card_name'], items[i].get('set_code')) for i in by_name])
+        cards = _load_cards_cache(conn, [sid for sid, score in matches if sid and score >= cardnames.MIN_CONFIDENCE])
+        remote_cards = {}
+        for i, (sid, score) in zip(by_name, matches):
+            card = cards.get(sid) if score >= cardnames.MIN_CONFIDENCE else None
+            if card is None and remote:
+                name = items[i]['card_name']
+                if name not in remote_cards:
+                    remote_cards[name] = _fetch_named(conn, name)
+                card = remote_cards[name]
+            if card:
+                out[i] = (card, 'fuzzy')
+    return out
+
+
 def _image_url(card, size):
     if not card:
         return None
@@ -221,19 +660,128 @@ def _image_url(card, size):
     return None
 
 
-def ensure_image_cached(card, size=IMAGE_SIZE):
-    url = _image_url(card, size)
-    if not url:
+def card_image_url(conn, scryfall_id, size=IMAGE_SIZE):
+    """Image URL for a cached card from its extracted column, without parsing JSON."""
+    column = IMAGE_COLUMNS.get(size)
+    if not column:
+        card = _load_card_cache(conn, scryfall_id)
+        return _image_url(card, size)
+    row = _get(conn, f'SELECT {column} AS url FROM card_cache WHERE scryfall_id = ?', (scryfall_id,))
+    return row['url'] if row else None
+
+
+def ensure_image_cached(card, size=IMAGE_SIZE, ext='jpg'):
+    if not card:
         return None
-    CACHE_DIR.mkdir(parents=True, exist_ok=True)
-    path = CACHE_DIR / f"{card['id']}_{size}.jpg"
-    if path.exists():
+    return image_path(card.get('id'), lambda s: _image_url(card, s), size, ext)
+
+
+def image_path_for_id(conn, scryfall_id, size=IMAGE_SIZE, ext='jpg'):
+    def url_for(s):
+        return card_image_url(conn, scryfall_id, s) or _image_url(fetch_card_by_id(conn, scryfall_id), s)
+    return image_path(scryfall_id, url_for, size, ext)
+
+
+def image_path(scryfall_id, url_for, size=IMAGE_SIZE, ext='jpg'):
+    """Local path of a card image, downloading or rendering it on first use.
+
+    `url_for(size)` gives Scryfall's URL for a size. Sizes renditions can
+    derive are made from the downloaded master; otherwise (or if that fails)
+    the size itself is downloaded as JPEG, so the result may not be `ext`.
+    """
+    if not scryfall_id:
+        return None
+    path = imagecache.lookup(scryfall_id, size, ext)
+    if path:
         return path
-    try:
-        resp = _http().get(url, timeout=20)
-        if resp.status_code == 200:
-            path.write_bytes(resp.content)
-            return path
-    except requests.RequestException:
+    if renditions.derivable(size, ext):
+        master = cache_image(scryfall_id, url_for(renditions.MASTER), renditions.MASTER)
+        if master:
+            try:
+                return renditions.derive(scryfall_id, size, ext, master)
+            except (OSError, ValueError) as exc:
+                log.warning('could not render %s %s.%s: %s', scryfall_id, size, ext, exc)
+    if ext == 'jpg':
+        return _download(scryfall_id, url_for(size), size)
+    return cache_image(scryfall_id, url_for(size), size)
+
+
+def placeholders(conn, scryfall_ids):
+    """scryfall_id -> low-quality preview data: URI, for cards that have one."""
+    ids = list(dict.fromkeys(sid for sid in scryfall_ids if sid))
+    out = {}
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        marks = ','.join(['?'] * len(chunk))
+        for row in conn.execute(
+            f'SELECT scryfall_id, image_lqip FROM card_cache WHERE scryfall_id IN ({marks}) '
+            'AND image_lqip IS NOT NULL',
+            tuple(chunk),
+        ).fetchall():
+            out[row['scryfall_id']] = row['image_lqip']
+    return out
+
+
+def ensure_placeholder(conn, scryfall_id):
+    """Compute and store a card's preview from any cached size of its image.
+
+    Returns the data: URI, or None without Pillow or a cached image.
+    """
+    if not scryfall_id or not renditions.available():
         return None
+    row = _get(conn, 'SELECT image_lqip FROM card_cache WHERE scryfall_id = ?', (scryfall_id,))
+    if row is None or row['image_lqip']:
+        return row['image_lqip'] if row else None
+    for size in ('small', 'normal', renditions.MASTER):
+        path = imagecache.lookup(scryfall_id, size)
+        if not path:
+            continue
+        try:
+            uri = renditions.placeholder(path)
+        except (OSError, ValueError) as exc:
+            log.warning('could not make a placeholder for %s: %s', scryfall_id, exc)
+            continue
+        conn.execute('UPDATE card_cache SET image_lqip = ? WHERE scryfall_id = ?', (uri, scryfall_id))
+        conn.commit()
+        return uri
     return None
+
+
+def cache_image(scryfall_id, url, size=IMAGE_SIZE):
+    if not scryfall_id or not url:
+        return None
+    return imagecache.lookup(scryfall_id, size) or _download(scryfall_id, url, size)
+
+
+def _download(scryfall_id, url, size):
+    if not scryfall_id or not url:
+        return None
+    with imagecache.claim(scryfall_id, size) as path:
+        # Another thread or worker may have fetched it while we waited.
+        if path.exists():
+            return imagecache.adopt(path)
+        IMAGE_LIMIT.acquire()
+        try:
+            with _http().get(url, stream=True, timeout=20) as resp:
+                if resp.status_code != 200:
+                    return None
+                written = imagecache.write(
+                    path, resp.iter_content(chunk_size=64 * 1024), resp.headers.get('Content-Length'),
+                )
+        except (requests.RequestException, ValueError) as exc:
+            log.warning('image download failed for %s (%s): %s', scryfall_id, size, exc)
+            return None
+    if written:
+        _placeholder_for_new_image(scryfall_id)
+    return written
+
+
+def _placeholder_for_new_image(scryfall_id):
+    """Make a card's placeholder as soon as its first image is on disk."""
+    if not renditions.available():
+        return
+    try:
+        with get_conn() as conn:
+            ensure_placeholder(conn, scryfall_id)
+    except sqlite3.Error as exc:
+        log.warning('could not store a placeholder for %s: %s', scryfall_id, exc)
@@ -0,0 +1,220 @@
+"""Thumbnail sprite sheets for picklist rows.
+
+Each set group of a batch gets one JPEG holding a small thumbnail of every
+card in it, plus a coordinate map, so a set group costs the tablet one image
+request instead of one per row. A sheet is named by a hash of the cards it
+holds (its version): picking doesn't change it, and editing the batch's lines
+makes a new one. Sheets are built in the background from the cached `small`
+images and stored in the image cache, so they share its byte budget and LRU
+eviction (the map is the sheet's sidecar and is deleted with it). Cards whose
+image couldn't be fetched are left out and retried every MISSING_RETRY_SECONDS.
+Needs Pillow; without it rows simply have no thumbnails.
+"""
+import os
+
+from .env import load_optional_dotenv
+
+load_optional_dotenv()
+import io
+import json
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import imagecache, lru, ratelimit, renditions, scryfall
+from .db import get_conn
+
+log = logging.getLogger('sprites')
+
+ENABLED = os.getenv('PICKLIST_THUMBNAILS', '1') != '0'
+THUMB_WIDTH = int(os.getenv('SPRITE_THUMB_WIDTH', '60'))
+# Card images are 5:7 (Scryfall's small is 146x204).
+THUMB_HEIGHT = round(THUMB_WIDTH * 204 / 146)
+COLUMNS = 16
+JPEG_QUALITY = int(os.getenv('SPRITE_JPEG_QUALITY', '80'))
+MISSING_RETRY_SECONDS = 600
+
+_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sprites')
+_pending_lock = threading.Lock()
+_pending = set()
+# version -> coordinate map, for sheets already read from disk.
+_maps = lru.LRUCache('sprite maps', max_entries=2000)
+
+
+def _dir():
+    return imagecache.ROOT / 'sprites'
+
+
+def sheet_path(version):
+    return _dir() / f'{version}.jpg'
+
+
+def _map_path(version):
+    return sheet_path(version).with_suffix(imagecache.SIDECAR)
+
+
+def version(scryfall_ids):
+    """Name of the sheet for a set of cards (order and duplicates don't matter)."""
+    digest = hashlib.blake2b(digest_size=10)
+    digest.update(f'{THUMB_WIDTH}x{THUMB_HEIGHT}/{COLUMNS}/{JPEG_QUALITY}'.encode())
+    for sid in sorted(set(scryfall_ids)):
+        digest.update(b'\0' + sid.encode())
+    return digest.hexdigest()
+
+
+def _groups(conn, batch_id, set_code=None):
+    """set_code -> scryfall ids of every line in the batch, picked or not."""
+    sql = 'SELECT set_code, scryfall_id FROM batch_items WHERE batch_id = ? AND scryfall_id IS NOT NULL'
+    args = [batch_id]
+    if set_code is not None:
+        sql += ' AND set_code IS ?'
+        args.append(set_code)
+    groups = {}
+    for row in conn.execute(sql, args).fetchall():
+        groups.setdefault(row['set_code'], []).append(row['scryfall_id'])
+    return groups
+
+
+def _load(version):
+    if not imagecache.touch(sheet_path(version)):
+        return None
+    coords = _maps.get(version)
+    if coords is None:
+        try:
+            coords = json.loads(_map_path(version).read_text())
+        except (OSError, ValueError):
+            return None
+        _maps.put(version, coords)
+    return coords
+
+
+def _sheet(version, coords):
+    # Sheets are served as immutable, and one rebuilt with cards that were
+    # missing before keeps its name, so its URL changes with its contents.
+    revision = hashlib.blake2b(json.dumps(sorted(coords)).encode(), digest_size=4).hexdigest()
+    return {
+        'version': version,
+        'url': f'/sprites/{version}.jpg?r={revision}',
+        'width': THUMB_WIDTH,
+        'height': THUMB_HEIGHT,
+        'coords': coords,
+    }
+
+
+def thumb(sheet, scryfall_id, placeholder=None):
+    """A row's thumbnail: its tile in the set group's sheet and/or its placeholder.
+
+    Returns size, sheet url (None until the sheet is ready) and x/y offsets,
+    plus the placeholder data: URI shown underneath; None if there's neither.
+    """
+    xy = sheet['coords'].get(scryfall_id) if sheet and scryfall_id else None
+    if not ENABLED or not (xy or placeholder):
+        return None
+    return {
+        'url': sheet['url'] if xy else None,
+        'placeholder': placeholder,
+        'width': THUMB_WIDTH,
+        'height': THUMB_HEIGHT,
+        'x': xy[0] if xy else 0,
+        'y': xy[1] if xy else 0,
+    }
+
+
+def sheets(conn, batch_id, set_code=None, build=True):
+    """set_code -> ready sheet (url, thumb size, coords by scryfall id) or None.
+
+    Covers one set group when `set_code` is given. Missing sheets are queued
+    for building unless `build` is False.
+    """
+    if not ENABLED or not renditions.available():
+        return {}
+    out = {}
+    for code, ids in _groups(conn, batch_id, set_code).items():
+        v = version(ids)
+        coords = _load(v)
+        if build and (coords is None or _retry_missing(v, ids, coords)):
+            schedule(v, ids)
+        out[code] = _sheet(v, coords) if coords is not None else None
+    return out
+
+
+def _retry_missing(version, scryfall_ids, coords):
+    """True if the sheet lacks some cards and hasn't been rebuilt for a while."""
+    if not set(scryfall_ids) - coords.keys():
+        return False
+    try:
+        return time.time() - _map_path(version).stat().st_mtime > MISSING_RETRY_SECONDS
+    except FileNotFoundError:
+        return False
+
+
+def schedule(version, scryfall_ids):
+    with _pending_lock:
+        if version in _pending:
+            return False
+        _pending.add(version)
+    _pool.submit(_build_logged, version, sorted(set(scryfall_ids)))
+    return True
+
+
+def schedule_batch(conn, batch_id):
+    """Queue every missing sheet for a batch (e.g. once its images are prefetched)."""
+    sheets(conn, batch_id)
+
+
+def _build_logged(version, scryfall_ids):
+    try:
+        _build(version, scryfall_ids)
+    except Exception:
+        log.exception('sprite sheet %s failed', version)
+    finally:
+        with _pending_lock:
+            _pending.discard(version)
+
+
+def _thumbnails(scryfall_ids):
+    with get_conn() as conn, ratelimit.priority(ratelimit.BULK):
+        for sid in scryfall_ids:
+            path = imagecache.lookup(sid, 'small') or scryfall.image_path_for_id(conn, sid, 'small')
+            if path:
+                yield sid, path
+
+
+def _build(version, scryfall_ids):
+    coords = _load(version)
+    if coords is not None and not set(scryfall_ids) - coords.keys():
+        return
+    Image = renditions.Image
+    tiles = []
+    for sid, path in _thumbnails(scryfall_ids):
+        try:
+            with Image.open(path) as img:
+                tiles.append((sid, img.convert('RGB').resize((THUMB_WIDTH, THUMB_HEIGHT), Image.LANCZOS)))
+        except (OSError, ValueError) as exc:
+            log.warning('skipping %s in sprite sheet: %s', sid, exc)
+    if not tiles:
+        return
+    if coords is not None and {sid for sid, _ in tiles} <= coords.keys():
+        # Still nothing new to draw: just restart the retry timer.
+        os.utime(_map_path(version))
+        return
+    rows = -(-len(tiles) // COLUMNS)
+    sheet = Image.new('RGB', (min(len(tiles), COLUMNS) * THUMB_WIDTH, rows * THUMB_HEIGHT), 'white')
+    coords = {}
+    for i, (sid, tile) in enumerate(tiles):
+        x, y = (i % COLUMNS) * THUMB_WIDTH, (i // COLUMNS) * THUMB_HEIGHT
+        sheet.paste(tile, (x, y))
+        coords[sid] = [x, y]
+    buf = io.BytesIO()
+    sheet.save(buf, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    # The map goes first: a sheet is only "ready" once both exist.
+    _dir().mkdir(parents=True, exist_ok=True)
+    tmp = _map_path(version).with_suffix('.json.part')
+    tmp.write_text(json.dumps(coords))
+    os.replace(tmp, _map_path(version))
+    data = buf.getvalue()
+    imagecache.write(sheet_path(version), [data], len(data))
+    _maps.put(version, coords)
+    log.info('sprite sheet %s: %d cards, %d bytes', version, len(tiles), len(data))
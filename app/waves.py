@@ -0,0 +1,156 @@
+"""Split a batch's remaining sets into balanced waves, one per picker.
+
+Sets are never split between pickers (reservations are per set, keyed by
+(game, set_code) since games can share set codes). Sets are
+taken in walk order (see app/binpath.py), so each wave is a contiguous stretch
+of the warehouse and pickers don't cross each other's paths.
+"""
+import os
+from datetime import datetime
+
+from . import binpath
+
+# Fixed cost per set, in "copies": walking to the bin and finding the set.
+SET_COST = float(os.getenv('WAVE_SET_COST', '3'))
+
+
+def _utc_now():
+    return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _assign(weights, base, capacity):
+    """Greedy contiguous fill; returns picker index per weight, or None if infeasible."""
+    if any(b > capacity for b in base):
+        return None
+    groups = []
+    picker = 0
+    load = base[0]
+    for w in weights:
+        while load + w > capacity:
+            picker += 1
+            if picker >= len(base):
+                return None
+            load = base[picker]
+        groups.append(picker)
+        load += w
+    return groups
+
+
+def partition(weights, pickers, base=None):
+    """Assign contiguous runs of `weights` to `pickers` minimizing the heaviest load.
+
+    `base` is each picker's existing load (work they keep regardless). Returns
+    a list with the picker index for each weight. Optimal for contiguous runs:
+    binary search on the capacity, greedy feasibility check.
+    """
+    if pickers <= 0:
+        raise ValueError('pickers must be positive')
+    base = list(base) if base is not None else [0.0] * pickers
+    if not weights:
+        return []
+    lo = max(max(weights), max(base))
+    hi = max(base) + sum(weights)
+    best = _assign(weights, base, hi)
+    # Weights are copy counts plus a fixed per-set cost; a 0.5 tolerance is
+    # well below one card.
+    while hi - lo > 0.5:
+        mid = (lo + hi) / 2
+        groups = _assign(weights, base, mid)
+        if groups is None:
+            lo = mid
+        else:
+            hi = mid
+            best = groups
+    return best
+
+
+def _remaining_sets(conn, batch_id):
+    rows = conn.execute(
+        'SELECT game, set_code, '
+        '  SUM(CASE WHEN qty_required > qty_picked THEN qty_required - qty_picked ELSE 0 END) AS remaining, '
+        '  SUM(qty_picked) AS picked '
+        'FROM batch_items WHERE batch_id = ? AND is_missing = 0 GROUP BY game, set_code',
+        (batch_id,),
+    ).fetchall()
+    return [dict(r) for r in rows if (r['remaining'] or 0) > 0]
+
+
+def _walk(conn, sets):
+    rank = binpath.path_rank(conn, sets)
+    return sorted(sets, key=lambda s: rank.get(binpath.set_key(s['game'], s['set_code']), len(rank)))
+
+
+def _key(s):
+    return (s['game'], s['set_code'])
+
+
+def _save(conn, batch_id, assignments):
+    """Replace the batch's reservations with {(game, set_code): picker}."""
+    conn.execute('DELETE FROM set_reservations WHERE batch_id = ?', (batch_id,))
+    conn.executemany(
+        'INSERT OR REPLACE INTO set_reservations (batch_id, game, set_code, reserved_by, reserved_at) VALUES (?, ?, ?, ?, ?)',
+        [(batch_id, game, code, picker, _utc_now()) for (game, code), picker in assignments.items()],
+    )
+    conn.commit()
+
+
+def _result(sets, assignments, pickers):
+    """JSON-ready plan: assignments in walk order plus per-picker totals."""
+    loads = {p: {'picker': p, 'sets': [], 'copies': 0} for p in pickers}
+    for s in sets:
+        picker = assignments.get(_key(s))
+        if picker in loads:
+            loads[picker]['sets'].append(s['set_code'])
+            loads[picker]['copies'] += int(s['remaining'] or 0)
+    return {
+        'assignments': [
+            {'game': s['game'], 'set_code': s['set_code'], 'picker': assignments[_key(s)]}
+            for s in sets if _key(s) in assignments
+        ],
+        'waves': list(loads.values()),
+    }
+
+
+def plan(conn, batch_id, pickers):
+    """Split all remaining sets across `pickers` and store them as reservations."""
+    pickers = [p for p in dict.fromkeys(pickers) if p]
+    if not pickers:
+        raise ValueError('at least one picker is required')
+    sets = _walk(conn, _remaining_sets(conn, batch_id))
+    groups = partition([int(s['remaining']) + SET_COST for s in sets], len(pickers))
+    assignments = {_key(s): pickers[g] for s, g in zip(sets, groups)}
+    _save(conn, batch_id, assignments)
+    return _result(sets, assignments, pickers)
+
+
+def rebalance(conn, batch_id, pickers=None):
+    """Re-split untouched sets so pickers who finished early take over work.
+
+    Sets a picker has already started stay with them and count toward their
+    load; every set nobody has started is redistributed in walk order.
+    """
+    current = {_key(r): r['reserved_by'] for r in conn.execute(
+        'SELECT game, set_code, reserved_by FROM set_reservations WHERE batch_id = ?', (batch_id,),
+    ).fetchall()}
+    if not pickers:
+        pickers = sorted(set(current.values()))
+    pickers = [p for p in dict.fromkeys(pickers) if p]
+    if not pickers:
+        raise ValueError('at least one picker is required')
+    sets = _walk(conn, _remaining_sets(conn, batch_id))
+    base = {p: 0.0 for p in pickers}
+    kept = {}
+    open_sets = []
+    for s in sets:
+        holder = current.get(_key(s))
+        if holder in base and int(s['picked'] or 0) > 0:
+            kept[_key(s)] = holder
+            base[holder] += int(s['remaining']) + SET_COST
+        else:
+            open_sets.append(s)
+    groups = partition([int(s['remaining']) + SET_COST for s in open_sets], len(pickers), [base[p] for p in pickers])
+    assignments = dict(kept)
+    for s, g in zip(open_sets, groups):
+        assignments[_key(s)] = pickers[g]
+    _save(conn, batch_id, assignments)
+    return _result(sets, assignments, pickers)
@@ -0,0 +1,29 @@
+-- Durable outbox of ManaPool delist intents. Rows are written in the same
+-- transaction as the CardKingdom batch and drained by a background worker
+-- (app/delist.py). new_quantity is absolute, so re-sending a row is idempotent.
+CREATE TABLE IF NOT EXISTS mp_delist_outbox (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  batch_id INTEGER NOT NULL,
+  batch_item_id INTEGER NOT NULL UNIQUE,
+  inventory_id TEXT,
+  scryfall_id TEXT NOT NULL,
+  condition_id TEXT,
+  finish_id TEXT,
+  language_id TEXT,
+  new_quantity INTEGER NOT NULL,
+  price_cents INTEGER,
+  status TEXT NOT NULL DEFAULT 'pending',
+  attempts INTEGER NOT NULL DEFAULT 0,
+  next_attempt_at TEXT,
+  last_error TEXT,
+  created_at TEXT NOT NULL,
+  updated_at TEXT NOT NULL,
+  FOREIGN KEY(batch_id) REFERENCES batches(id),
+  FOREIGN KEY(batch_item_id) REFERENCES batch_items(id)
+);
+CREATE INDEX IF NOT EXISTS idx_mp_delist_outbox_status ON mp_delist_outbox(status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS idx_mp_delist_outbox_batch ON mp_delist_outbox(batch_id);
+
+-- Per-item delist state: pending / retry / sending / done / dry_run / error.
+-- mp_delisted flips to 1 only once the outbox row is confirmed.
+ALTER TABLE batch_items ADD COLUMN mp_delist_status TEXT;
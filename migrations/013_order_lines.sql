@@ -0,0 +1,44 @@
+-- One row per ManaPool order item, written alongside manapool_orders_cache so
+-- order names/labels/quantities are indexed lookups instead of raw_json scans.
+CREATE TABLE IF NOT EXISTS manapool_order_lines (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  order_id TEXT NOT NULL,
+  line_no INTEGER NOT NULL,
+  label TEXT,
+  ship_name TEXT,
+  scryfall_id TEXT,
+  condition_id TEXT,
+  finish_id TEXT,
+  language_id TEXT,
+  quantity INTEGER NOT NULL,
+  price REAL,
+  UNIQUE(order_id, line_no)
+);
+CREATE INDEX IF NOT EXISTS idx_mp_order_lines_order ON manapool_order_lines(order_id);
+CREATE INDEX IF NOT EXISTS idx_mp_order_lines_sid ON manapool_order_lines(scryfall_id);
+
+-- Backfill from orders already cached.
+INSERT OR IGNORE INTO manapool_order_lines
+  (order_id, line_no, label, ship_name, scryfall_id, condition_id, finish_id, language_id, quantity, price)
+SELECT
+  c.order_id,
+  CAST(i.key AS INTEGER),
+  json_extract(c.raw_json, '$.order.label'),
+  json_extract(c.raw_json, '$.order.shipping_address.name'),
+  json_extract(i.value, '$.product.single.scryfall_id'),
+  json_extract(i.value, '$.product.single.condition_id'),
+  json_extract(i.value, '$.product.single.finish_id'),
+  json_extract(i.value, '$.product.single.language_id'),
+  COALESCE(NULLIF(CAST(json_extract(i.value, '$.quantity') AS INTEGER), 0), 1),
+  COALESCE(
+    json_extract(i.value, '$.purchase_price'),
+    json_extract(i.value, '$.unit_price'),
+    json_extract(i.value, '$.price'),
+    json_extract(i.value, '$.value'),
+    json_extract(i.value, '$.purchase_price_cents') / 100.0,
+    json_extract(i.value, '$.unit_price_cents') / 100.0,
+    json_extract(i.value, '$.price_cents') / 100.0,
+    json_extract(i.value, '$.value_cents') / 100.0
+  )
+FROM manapool_orders_cache c, json_each(c.raw_json, '$.order.items') i
+WHERE json_valid(c.raw_json);
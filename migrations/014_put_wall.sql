@@ -0,0 +1,25 @@
+-- Put-wall (sort-to-order): one slot per customer order in a batch, and a
+-- precomputed split of each aggregated batch item across those slots.
+CREATE TABLE IF NOT EXISTS put_wall_slots (
+  batch_id INTEGER NOT NULL,
+  slot INTEGER NOT NULL,
+  order_id TEXT NOT NULL,
+  label TEXT,
+  ship_name TEXT,
+  PRIMARY KEY (batch_id, slot),
+  UNIQUE (batch_id, order_id),
+  FOREIGN KEY(batch_id) REFERENCES batches(id)
+);
+
+CREATE TABLE IF NOT EXISTS put_wall_allocations (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  batch_id INTEGER NOT NULL,
+  batch_item_id INTEGER NOT NULL,
+  slot INTEGER NOT NULL,
+  qty INTEGER NOT NULL,
+  qty_put INTEGER NOT NULL DEFAULT 0,
+  FOREIGN KEY(batch_id) REFERENCES batches(id),
+  FOREIGN KEY(batch_item_id) REFERENCES batch_items(id)
+);
+CREATE INDEX IF NOT EXISTS idx_put_wall_alloc_item ON put_wall_allocations(batch_item_id, slot);
+CREATE INDEX IF NOT EXISTS idx_put_wall_alloc_batch ON put_wall_allocations(batch_id, slot);
@@ -0,0 +1,5 @@
+-- Walkable coordinates for set bins (see app/binpath.py). When all three are
+-- NULL the free-text location is parsed instead.
+ALTER TABLE set_bins ADD COLUMN aisle INTEGER;
+ALTER TABLE set_bins ADD COLUMN shelf INTEGER;
+ALTER TABLE set_bins ADD COLUMN position INTEGER;
@@ -0,0 +1,3 @@
+-- Hash of each cached card's JSON so bulk-data ingests can skip cards that
+-- haven't changed since the previous file.
+ALTER TABLE card_cache ADD COLUMN content_hash TEXT;
@@ -0,0 +1,37 @@
+-- Hot fields pulled out of card_cache.data_json so listings and image lookups
+-- don't have to parse the full Scryfall object. Double-faced cards keep their
+-- images (and oracle id) on the first face.
+ALTER TABLE card_cache ADD COLUMN set_name TEXT;
+ALTER TABLE card_cache ADD COLUMN rarity TEXT;
+ALTER TABLE card_cache ADD COLUMN image_small TEXT;
+ALTER TABLE card_cache ADD COLUMN image_normal TEXT;
+ALTER TABLE card_cache ADD COLUMN image_large TEXT;
+ALTER TABLE card_cache ADD COLUMN image_png TEXT;
+ALTER TABLE card_cache ADD COLUMN face_count INTEGER;
+ALTER TABLE card_cache ADD COLUMN oracle_id TEXT;
+ALTER TABLE card_cache ADD COLUMN released_at TEXT;
+
+UPDATE card_cache SET
+  set_name = json_extract(data_json, '$.set_name'),
+  rarity = json_extract(data_json, '$.rarity'),
+  image_small = COALESCE(json_extract(data_json, '$.image_uris.small'), json_extract(data_json, '$.card_faces[0].image_uris.small')),
+  image_normal = COALESCE(json_extract(data_json, '$.image_uris.normal'), json_extract(data_json, '$.card_faces[0].image_uris.normal')),
+  image_large = COALESCE(json_extract(data_json, '$.image_uris.large'), json_extract(data_json, '$.card_faces[0].image_uris.large')),
+  image_png = COALESCE(json_extract(data_json, '$.image_uris.png'), json_extract(data_json, '$.card_faces[0].image_uris.png')),
+  face_count = MAX(1, COALESCE(json_array_length(data_json, '$.card_faces'), 1)),
+  oracle_id = COALESCE(json_extract(data_json, '$.oracle_id'), json_extract(data_json, '$.card_faces[0].oracle_id')),
+  released_at = json_extract(data_json, '$.released_at')
+WHERE json_valid(data_json);
+
+-- Set catalog (code -> name), filled from every card written to the cache.
+CREATE TABLE IF NOT EXISTS sets (
+  code TEXT PRIMARY KEY,
+  name TEXT,
+  released_at TEXT
+);
+
+INSERT OR IGNORE INTO sets (code, name, released_at)
+SELECT LOWER(set_code), MAX(set_name), MIN(released_at)
+FROM card_cache
+WHERE set_code IS NOT NULL AND set_name IS NOT NULL
+GROUP BY LOWER(set_code);
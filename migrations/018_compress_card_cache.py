@@ -0,0 +1,29 @@
+"""Rewrite plain-JSON card_cache.data_json rows in the compressed format (app/cardcodec.py)."""
+from app import cardcodec
+
+BATCH = 1000
+
+
+def migrate(conn):
+    converted = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, data_json FROM card_cache WHERE id > ? AND typeof(data_json) = 'text' ORDER BY id LIMIT ?",
+            (last_id, BATCH),
+        ).fetchall()
+        if not rows:
+            break
+        updates = []
+        for row in rows:
+            try:
+                updates.append((cardcodec.encode(cardcodec.decode(row['data_json'])), row['id']))
+            except ValueError:
+                continue
+        conn.executemany('UPDATE card_cache SET data_json = ? WHERE id = ?', updates)
+        conn.commit()
+        converted += len(updates)
+        last_id = rows[-1]['id']
+    if converted:
+        # Hand the freed pages back to the filesystem.
+        conn.execute('VACUUM')
@@ -0,0 +1,10 @@
+-- Cached-card lookups by printing and by name, plus a negative cache so
+-- unknown ids/printings/names aren't re-requested from Scryfall every time.
+ALTER TABLE card_cache ADD COLUMN name_norm TEXT;
+CREATE INDEX IF NOT EXISTS idx_card_cache_set_number ON card_cache(set_code, collector_number);
+CREATE INDEX IF NOT EXISTS idx_card_cache_name_norm ON card_cache(name_norm, released_at);
+
+CREATE TABLE IF NOT EXISTS card_lookup_misses (
+  lookup_key TEXT PRIMARY KEY,
+  checked_at TEXT NOT NULL
+);
@@ -0,0 +1,21 @@
+"""Fill card_cache.name_norm (see scryfall.normalize_name) for existing rows."""
+from app.scryfall import normalize_name
+
+BATCH = 1000
+
+
+def migrate(conn):
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            'SELECT id, card_name FROM card_cache WHERE id > ? ORDER BY id LIMIT ?',
+            (last_id, BATCH),
+        ).fetchall()
+        if not rows:
+            break
+        conn.executemany(
+            'UPDATE card_cache SET name_norm = ? WHERE id = ?',
+            [(normalize_name(r['card_name']) or None, r['id']) for r in rows],
+        )
+        conn.commit()
+        last_id = rows[-1]['id']
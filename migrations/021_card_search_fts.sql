@@ -0,0 +1,24 @@
+-- Local card-name search: a trigram FTS5 index over card_cache.name_norm,
+-- kept in sync by triggers (external content, so names aren't stored twice).
+CREATE VIRTUAL TABLE IF NOT EXISTS card_search USING fts5(
+  name_norm,
+  content='card_cache',
+  content_rowid='id',
+  tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS card_cache_search_ai AFTER INSERT ON card_cache BEGIN
+  INSERT INTO card_search (rowid, name_norm) VALUES (new.id, new.name_norm);
+END;
+
+CREATE TRIGGER IF NOT EXISTS card_cache_search_ad AFTER DELETE ON card_cache BEGIN
+  INSERT INTO card_search (card_search, rowid, name_norm) VALUES ('delete', old.id, old.name_norm);
+END;
+
+CREATE TRIGGER IF NOT EXISTS card_cache_search_au AFTER UPDATE OF name_norm ON card_cache
+WHEN old.name_norm IS NOT new.name_norm BEGIN
+  INSERT INTO card_search (card_search, rowid, name_norm) VALUES ('delete', old.id, old.name_norm);
+  INSERT INTO card_search (rowid, name_norm) VALUES (new.id, new.name_norm);
+END;
+
+INSERT INTO card_search (card_search) VALUES ('rebuild');
@@ -0,0 +1,3 @@
+-- Tiny inline JPEG (a data: URI) of each card's image, shown while the real
+-- image loads. Filled in once the image is cached, so NULL until then.
+ALTER TABLE card_cache ADD COLUMN image_lqip TEXT;
@@ -0,0 +1,9 @@
+-- The CardKingdom pricelist behind the current ck_buylist: its meta.created_at
+-- and the HTTP validators to send with the next (conditional) download.
+CREATE TABLE IF NOT EXISTS ck_pricelist_meta (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  created_at TEXT,
+  etag TEXT,
+  last_modified TEXT,
+  fetched_at TEXT NOT NULL
+);
@@ -0,0 +1,4 @@
+-- ck_buylist is now rebuilt in a staging table and renamed into place, and a
+-- named secondary index can't follow it there. The primary key already leads
+-- with scryfall_id, so lookups by card don't need it.
+DROP INDEX IF EXISTS idx_ck_buylist_sid;
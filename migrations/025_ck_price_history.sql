@@ -0,0 +1,22 @@
+-- CardKingdom buy price history. Each recorded buylist refresh is a snapshot;
+-- ck_price_history holds only the (scryfall_id, is_foil) values that changed
+-- since the previous snapshot (price_buy NULL = no longer on the buylist),
+-- except on keyframe snapshots, which hold every row.
+CREATE TABLE IF NOT EXISTS ck_price_snapshots (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  created_at TEXT,
+  recorded_at TEXT NOT NULL,
+  is_keyframe INTEGER NOT NULL DEFAULT 0,
+  row_count INTEGER NOT NULL DEFAULT 0,
+  changed INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS ck_price_history (
+  scryfall_id TEXT NOT NULL,
+  is_foil INTEGER NOT NULL,
+  snapshot_id INTEGER NOT NULL REFERENCES ck_price_snapshots(id) ON DELETE CASCADE,
+  price_buy REAL,
+  qty_buying INTEGER,
+  PRIMARY KEY (scryfall_id, is_foil, snapshot_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_ck_price_history_snapshot ON ck_price_history(snapshot_id);
@@ -0,0 +1,5 @@
+-- When a batch's put-wall was last computed. A batch with no order lines has
+-- no slots, so "built" can't be inferred from put_wall_slots.
+ALTER TABLE batches ADD COLUMN put_wall_built_at TEXT;
+UPDATE batches SET put_wall_built_at = updated_at
+WHERE id IN (SELECT DISTINCT batch_id FROM put_wall_slots);
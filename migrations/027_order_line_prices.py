@@ -0,0 +1,43 @@
+"""Recompute manapool_order_lines.price with the same fallback chain as
+main._extract_purchase_price; 013's backfill only read the item-level keys."""
+import json
+
+DIRECT_KEYS = ('purchase_price', 'unit_price', 'price', 'value')
+CENTS_KEYS = ('purchase_price_cents', 'unit_price_cents', 'price_cents', 'value_cents')
+
+
+def _to_float(value):
+    try:
+        if value is None or value == '':
+            return None
+        return float(value)
+    except Exception:
+        return None
+
+
+def _price(item):
+    single = (item.get('product') or {}).get('single') or {}
+    for source in (item, single):
+        for key in DIRECT_KEYS:
+            price = _to_float(source.get(key))
+            if price is not None and price >= 0:
+                return price
+        for key in CENTS_KEYS:
+            cents = _to_float(source.get(key))
+            if cents is not None and cents >= 0:
+                return cents / 100.0
+    return None
+
+
+def migrate(conn):
+    updates = []
+    for order_id, raw_json in conn.execute('SELECT order_id, raw_json FROM manapool_orders_cache'):
+        try:
+            items = ((json.loads(raw_json) or {}).get('order') or {}).get('items') or []
+        except (TypeError, ValueError, AttributeError):
+            continue
+        for line_no, item in enumerate(items):
+            if isinstance(item, dict):
+                updates.append((_price(item), order_id, line_no))
+    conn.executemany('UPDATE manapool_order_lines SET price = ? WHERE order_id = ? AND line_no = ?', updates)
+    conn.commit()
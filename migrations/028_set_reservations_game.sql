@@ -0,0 +1,30 @@
+-- Reservations are per (game, set_code): different games can share a set
+-- code. Existing rows take the game of a matching batch line.
+CREATE TABLE IF NOT EXISTS set_reservations_new (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  batch_id INTEGER NOT NULL,
+  game TEXT NOT NULL DEFAULT '',
+  set_code TEXT NOT NULL,
+  reserved_by TEXT,
+  reserved_at TEXT NOT NULL,
+  UNIQUE(batch_id, game, set_code),
+  FOREIGN KEY(batch_id) REFERENCES batches(id)
+);
+
+INSERT INTO set_reservations_new (id, batch_id, game, set_code, reserved_by, reserved_at)
+SELECT
+  r.id,
+  r.batch_id,
+  COALESCE((
+    SELECT bi.game FROM batch_items bi
+    WHERE bi.batch_id = r.batch_id AND lower(bi.set_code) = lower(r.set_code)
+    ORDER BY bi.id LIMIT 1
+  ), ''),
+  r.set_code,
+  r.reserved_by,
+  r.reserved_at
+FROM set_reservations r;
+
+DROP TABLE set_reservations;
+ALTER TABLE set_reservations_new RENAME TO set_reservations;
+CREATE INDEX IF NOT EXISTS idx_set_reservations_batch ON set_reservations(batch_id);
@@ -0,0 +1,15 @@
+-- Scryfall bulk-data ingests get their own log (mirrors manapool_sync_log)
+-- instead of sharing the CardKingdom one.
+CREATE TABLE IF NOT EXISTS scryfall_sync_log (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  started_at TEXT NOT NULL,
+  finished_at TEXT,
+  status TEXT,
+  summary_json TEXT,
+  error_text TEXT
+);
+
+INSERT INTO scryfall_sync_log (started_at, finished_at, status, summary_json, error_text)
+SELECT started_at, finished_at, status, summary_json, error_text
+FROM ck_sync_log WHERE kind = 'scryfall_bulk' ORDER BY id;
+DELETE FROM ck_sync_log WHERE kind = 'scryfall_bulk';
@@ -0,0 +1,105 @@
+"""Compare card_cache storage formats: size per card and decode time.
+
+    python scripts/bench_card_codec.py                 # synthetic Scryfall-shaped cards
+    python scripts/bench_card_codec.py cards.json 5000 # first N cards of a bulk file
+"""
+import json
+import sys
+import time
+import uuid
+import zlib
+from itertools import islice
+
+from app import cardcodec, jsonstream
+
+
+def _synthetic(n):
+    rarities = ['common', 'uncommon', 'rare', 'mythic']
+    for i in range(n):
+        sid = str(uuid.UUID(int=i * 7919 + 1))
+        set_code = f's{i % 40:02d}'
+        img = f'{sid[0]}/{sid[1]}/{sid}.jpg?1562{i:06d}'
+        yield {
+            'object': 'card', 'id': sid, 'oracle_id': str(uuid.UUID(int=i * 104729 + 3)),
+            'multiverse_ids': [400000 + i], 'mtgo_id': 60000 + i, 'arena_id': 70000 + i, 'tcgplayer_id': 100000 + i,
+            'cardmarket_id': 200000 + i, 'name': f'Card Name {i}', 'lang': 'en', 'released_at': '2021-04-23',
+            'uri': f'https://api.scryfall.com/cards/{sid}', 'scryfall_uri': f'https://scryfall.com/card/{set_code}/{i}/card-name-{i}?utm_source=api',
+            'layout': 'normal', 'highres_image': True, 'image_status': 'highres_scan',
+            'image_uris': {size: f'https://cards.scryfall.io/{size}/front/{img}' for size in ('small', 'normal', 'large', 'png', 'art_crop', 'border_crop')},
+            'mana_cost': '{2}{G}{G}', 'cmc': 4.0, 'type_line': 'Creature — Elf Warrior',
+            'oracle_text': f'Trample\nWhen Card Name {i} enters, create a 1/1 green Elf Warrior creature token for each other Elf you control.',
+            'power': '4', 'toughness': '4', 'colors': ['G'], 'color_identity': ['G'], 'keywords': ['Trample'],
+            'legalities': {f: ('legal' if (i + k) % 3 else 'not_legal') for k, f in enumerate(
+                ['standard', 'future', 'historic', 'timeless', 'gladiator', 'pioneer', 'explorer', 'modern', 'legacy', 'pauper',
+                 'vintage', 'penny', 'commander', 'oathbreaker', 'standardbrawl', 'brawl', 'alchemy', 'paupercommander',
+                 'duel', 'oldschool', 'premodern', 'predh'])},
+            'games': ['paper', 'mtgo', 'arena'], 'reserved': False, 'foil': True, 'nonfoil': True,
+            'finishes': ['nonfoil', 'foil'], 'oversized': False, 'promo': False, 'reprint': False, 'variation': False,
+            'set_id': str(uuid.UUID(int=i % 40 + 11)), 'set': set_code, 'set_name': f'Set Number {i % 40}', 'set_type': 'expansion',
+            'set_uri': f'https://api.scryfall.com/sets/{set_code}', 'set_search_uri': f'https://api.scryfall.com/cards/search?order=set&q=e%3A{set_code}&unique=prints',
+            'scryfall_set_uri': f'https://scryfall.com/sets/{set_code}?utm_source=api', 'rulings_uri': f'https://api.scryfall.com/cards/{sid}/rulings',
+            'prints_search_uri': f'https://api.scryfall.com/cards/search?order=released&q=oracleid%3A{sid}&unique=prints',
+            'collector_number': str(i % 300 + 1), 'digital': False, 'rarity': rarities[i % 4],
+            'flavor_text': 'The forest remembers every footstep.', 'card_back_id': '0aeebaf5-8c7d-4636-9e82-8c27447861f7',
+            'artist': 'Some Artist', 'artist_ids': [str(uuid.UUID(int=i % 97 + 5))], 'illustration_id': str(uuid.UUID(int=i * 31 + 9)),
+            'border_color': 'black', 'frame': '2015', 'security_stamp': 'oval', 'full_art': False, 'textless': False, 'booster': True,
+            'story_spotlight': False, 'edhrec_rank': 5000 + i, 'penny_rank': 900 + i,
+            'prices': {'usd': f'{(i % 500) / 100:.2f}', 'usd_foil': f'{(i % 900) / 100:.2f}', 'usd_etched': None, 'eur': '0.12', 'eur_foil': '0.40', 'tix': '0.03'},
+            'related_uris': {
+                'gatherer': f'https://gatherer.wizards.com/Pages/Card/Details.aspx?multiverseid={400000 + i}',
+                'tcgplayer_infinite_articles': f'https://tcgplayer.pxf.io/c/4931599/1830156/21018?subId1=api&trafcat=infinite&u=https%3A%2F%2Finfinite.tcgplayer.com%2Fsearch%3FcontentMode%3Darticle%26game%3Dmagic%26partner%3Dscryfall%26q%3DCard%2BName%2B{i}',
+                'edhrec': f'https://edhrec.com/route/?cc=Card+Name+{i}',
+            },
+            'purchase_uris': {
+                'tcgplayer': f'https://tcgplayer.pxf.io/c/4931599/1830156/21018?subId1=api&u=https%3A%2F%2Fwww.tcgplayer.com%2Fproduct%2F{100000 + i}',
+                'cardmarket': f'https://www.cardmarket.com/en/Magic/Products/Search?referrer=scryfall&searchString=Card+Name+{i}',
+                'cardhoarder': f'https://www.cardhoarder.com/cards/{60000 + i}?affiliate_id=scryfall&ref=card-profile&utm_source=scryfall',
+            },
+        }
+
+
+def _time_per_card(fn, values, rounds=3):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for v in values:
+            fn(v)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(values) * 1e6
+
+
+def main():
+    if len(sys.argv) > 1:
+        limit = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+        with open(sys.argv[1], encoding='utf-8') as f:
+            cards = list(islice(jsonstream.iter_array(f), limit))
+        source = sys.argv[1]
+    else:
+        cards = list(_synthetic(5000))
+        source = 'synthetic'
+
+    plain = [json.dumps(c) for c in cards]
+    pruned = [json.dumps(cardcodec.prune(c), separators=(',', ':')) for c in cards]
+    zlib_only = [zlib.compress(p.encode('utf-8'), cardcodec.LEVEL) for p in pruned]
+    encoded = [cardcodec.encode(c) for c in cards]
+
+    def avg(values):
+        return sum(len(v) for v in values) / len(values)
+
+    base = avg(plain)
+    print(f'{len(cards)} cards ({source})')
+    print(f'{"format":<28}{"bytes/card":>12}{"vs plain":>10}')
+    for label, values in (
+        ('plain JSON (before)', plain),
+        ('pruned JSON', pruned),
+        ('pruned + zlib', zlib_only),
+        ('pruned + zlib + zdict (v1)', encoded),
+    ):
+        print(f'{label:<28}{avg(values):>12.0f}{avg(values) / base:>10.1%}')
+    print(f'decode plain  (json.loads):        {_time_per_card(json.loads, plain):.1f} us/card')
+    print(f'decode v1     (cardcodec.decode):  {_time_per_card(cardcodec.decode, encoded):.1f} us/card')
+
+
+if __name__ == '__main__':
+    main()
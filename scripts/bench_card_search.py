@@ -0,0 +1,59 @@
+"""Time local card search (app/cardsearch.py) against an ingested card cache.
+
+    python scripts/bench_card_search.py                  # 100k synthetic cards in memory
+    python scripts/bench_card_search.py data/app.db      # the real database
+"""
+import random
+import sqlite3
+import sys
+import time
+
+from app import cardsearch, scryfall
+from app.db import apply_migrations
+
+QUERIES = ['bolt', 'lightning bolt', 'ob', 'dra', 'drakel', 'serra angel', 'mystic set:s14', 'set:s12 cn:13', 'wrath of', 'rosgon', 'tor dra', 'zzzz']
+
+
+def _synthetic(conn, n):
+    # ~30k distinct names over ~100k printings, roughly like default_cards.
+    rng = random.Random(1)
+    syllables = ['ar', 'bel', 'cor', 'dra', 'el', 'fen', 'gor', 'hal', 'is', 'jor', 'kel', 'lor', 'mor', 'nix',
+                 'ob', 'pra', 'quel', 'ros', 'ser', 'tor', 'ul', 'vor', 'wyn', 'xan', 'yar', 'zek', 'gon', 'bolt']
+    lexicon = sorted({''.join(rng.choice(syllables) for _ in range(rng.randint(2, 3))).capitalize() for _ in range(3000)})
+    names = [' '.join(rng.choice(lexicon) for _ in range(rng.randint(1, 3))) for _ in range(30_000)]
+    names += ['Lightning Bolt', 'Serra Angel', 'Wrath of God', 'Ob Nixilis Reignited', 'Elvish Mystic']
+    cards = []
+    for i in range(n):
+        cards.append({'id': f'id{i}', 'name': names[i % len(names)], 'set': f's{i % 400:02d}',
+                      'collector_number': str(i % 300 + 1), 'released_at': f'20{i % 25:02d}-01-01'})
+        if len(cards) == 5000:
+            scryfall.save_cards(conn, cards)
+            cards = []
+    if cards:
+        scryfall.save_cards(conn, cards)
+
+
+def main():
+    if len(sys.argv) > 1:
+        conn = sqlite3.connect(sys.argv[1])
+        conn.row_factory = sqlite3.Row
+    else:
+        conn = sqlite3.connect(':memory:')
+        conn.row_factory = sqlite3.Row
+        apply_migrations(conn)
+        _synthetic(conn, 100_000)
+    total = conn.execute('SELECT COUNT(*) FROM card_cache').fetchone()[0]
+    print(f'{total} cached cards')
+    for query in QUERIES:
+        cardsearch.search_local(conn, query)
+        best = None
+        for _ in range(5):
+            start = time.perf_counter()
+            results = cardsearch.search_local(conn, query)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(f'{query!r:<22}{len(results):>4} results {best * 1000:>8.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+import argparse
+
+from app import bulkdata
+from app.db import get_conn, init_db
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load a Scryfall bulk-data file into card_cache.')
+    parser.add_argument('path', nargs='?', help='local bulk JSON file (.json or .json.gz); downloads the latest if omitted')
+    parser.add_argument('--type', default=bulkdata.BULK_TYPE, help='bulk-data type to download (default: %(default)s)')
+    parser.add_argument('--force', action='store_true', help='download even if Scryfall reports no new file')
+    args = parser.parse_args()
+
+    init_db()
+    with get_conn() as conn:
+        summary, err = bulkdata.run(conn, path=args.path, force=args.force, bulk_type=args.type)
+    if err:
+        raise SystemExit(f'Bulk ingest failed: {err}')
+    print(summary)
+
+
+if __name__ == '__main__':
+    main()
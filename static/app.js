@@ -122,7 +122,7 @@ function toggleImageSize(imgId) {
   if (!img) return;
   const size = img.dataset.size === 'normal' ? 'large' : 'normal';
   img.dataset.size = size;
-  img.src = img.dataset.base + '?size=' + size;
+  img.src = img.dataset[size] || (img.dataset.base + '?size=' + size);
 }
 
 /* ── Card Modal ───────────────────────────────────────── */
@@ -205,11 +205,12 @@ function syncPickerNameHidden() {
 }
 
 /* ── Set Management ───────────────────────────────────── */
-function reserveSet(setCode) {
+function reserveSet(game, setCode) {
   const items = document.getElementById('items');
   if (!items) return;
   const batchId = items.dataset.batchId;
   const body = new URLSearchParams();
+  body.set('game', game);
   body.set('set_code', setCode);
   body.set('reserved_by', getUserName());
   fetch(`/batch/${batchId}/reserve-set`, {
@@ -219,8 +220,9 @@ function reserveSet(setCode) {
   });
 }
 
-function applyReservation(setCode, reservedBy) {
-  document.querySelectorAll(`.set-group[data-set-code="${setCode}"]`).forEach((group) => {
+function applyReservation(game, setCode, reservedBy) {
+  document.querySelectorAll('.set-group[data-set-code]').forEach((group) => {
+    if (group.dataset.game !== game || group.dataset.setCode !== setCode) return;
     const actions = group.querySelector('.set-actions');
     if (!actions) return;
     const existing = actions.querySelector('.reserve-badge');
@@ -234,6 +236,34 @@ function applyReservation(setCode, reservedBy) {
   });
 }
 
+function splitWaves(rebalance) {
+  const items = document.getElementById('items');
+  const input = document.getElementById('wave-pickers');
+  const status = document.getElementById('wave-status');
+  if (!items || !input) return;
+  const batchId = items.dataset.batchId;
+  const body = new URLSearchParams();
+  body.set('pickers', input.value);
+  fetch(`/batch/${batchId}/waves${rebalance ? '/rebalance' : ''}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/x-www-form-urlencoded' },
+    body: body.toString(),
+  })
+    .then(async (resp) => {
+      const data = await resp.json();
+      if (!resp.ok) throw new Error(data.detail || 'Wave split failed');
+      return data;
+    })
+    .then((data) => {
+      if (status) {
+        status.textContent = (data.waves || []).map(w => `${w.picker}: ${w.sets.length} sets / ${w.copies} cards`).join(' | ');
+      }
+    })
+    .catch((err) => {
+      if (status) status.textContent = err.message;
+    });
+}
+
 function toggleSetGroup(setCode) {
   const group = document.querySelector(`.set-group[data-set-code="${setCode}"]`);
   if (!group) return;
@@ -322,7 +352,13 @@ function initRealtime() {
         if (msg.type === 'item_update') {
           refreshItem(msg.item_id);
         } else if (msg.type === 'set_reserved') {
-          applyReservation(msg.set_code, msg.reserved_by);
+          applyReservation(msg.game, msg.set_code, msg.reserved_by);
+        } else if (msg.type === 'waves_assigned') {
+          const pickers = new Map((msg.assignments || []).map(a => [`${a.game}\n${a.set_code}`, a.picker]));
+          document.querySelectorAll('.set-group[data-set-code]').forEach((group) => {
+            const { game, setCode } = group.dataset;
+            applyReservation(game, setCode, pickers.get(`${game}\n${setCode}`) || null);
+          });
         }
       } catch (e) {
         // ignore
@@ -395,6 +431,7 @@ function generateManaPoolPicklist() {
 function assistedModeLabel(mode) {
   if (mode === 'bottom_up') return 'Bottom up';
   if (mode === 'middle_out') return 'Middle out';
+  if (mode === 'bin_path') return 'Walk path';
   return 'Top down';
 }
 
@@ -404,10 +441,16 @@ function _isNonEnglish(lang) {
   return lang && !_ENGLISH_LANGS.has(lang.toLowerCase());
 }
 
-function _loadAssistedImage(img, url, noImage, attempt) {
+function _loadAssistedImage(img, url, noImage, attempt, placeholder) {
   attempt = attempt || 0;
-  img.onerror = () => {
-    img.onerror = null;
+  img.dataset.src = url;
+  // With a placeholder, show it straight away and swap in the full image
+  // once it has loaded in the background.
+  const target = placeholder && attempt === 0 ? new Image() : img;
+  target.onerror = () => {
+    target.onerror = null;
+    if (img.dataset.src !== url) return;
+    img.classList.remove('lqip');
     if (attempt < 2) {
       setTimeout(() => _loadAssistedImage(img, url, noImage, attempt + 1), Math.pow(2, attempt) * 600);
     } else {
@@ -424,7 +467,20 @@ function _loadAssistedImage(img, url, noImage, attempt) {
     }
   };
   const sep = url.includes('?') ? '&' : '?';
-  img.src = attempt > 0 ? `${url}${sep}t=${Date.now()}` : url;
+  const src = attempt > 0 ? `${url}${sep}t=${Date.now()}` : url;
+  if (target !== img) {
+    img.onerror = null;
+    img.src = placeholder;
+    img.classList.add('lqip');
+    target.onload = () => {
+      if (img.dataset.src !== url) return;
+      img.src = src;
+      img.classList.remove('lqip');
+    };
+  } else {
+    img.classList.remove('lqip');
+  }
+  target.src = src;
   img.style.display = 'block';
   noImage.style.display = 'none';
 }
@@ -514,7 +570,7 @@ function renderAssistedSnapshot(data) {
 
   // Image loading with retry
   if (data.item.image_url) {
-    _loadAssistedImage(image, data.item.image_url, noImage, 0);
+    _loadAssistedImage(image, data.item.image_url, noImage, 0, data.item.placeholder);
   } else {
     image.removeAttribute('src');
     image.style.display = 'none';
@@ -535,11 +591,31 @@ function renderAssistedSnapshot(data) {
       nextName.textContent = data.next_item.card_name || '';
       nextSet.textContent = [data.next_item.set_code, data.next_item.collector_number].filter(Boolean).join(' #');
       if (data.next_item.image_url) {
-        nextImg.onerror = () => { nextImg.style.display = 'none'; nextNoImg.style.display = 'block'; };
-        nextImg.src = data.next_item.image_url;
+        const nextUrl = data.next_item.image_url;
+        const nextFailed = () => { nextImg.style.display = 'none'; nextNoImg.style.display = 'block'; };
+        nextImg.dataset.src = nextUrl;
+        nextImg.onerror = nextFailed;
+        if (data.next_item.placeholder) {
+          // Same as the current card: blurred preview until the image is in.
+          nextImg.src = data.next_item.placeholder;
+          nextImg.classList.add('lqip');
+          const full = new Image();
+          full.onload = () => {
+            if (nextImg.dataset.src !== nextUrl) return;
+            nextImg.src = nextUrl;
+            nextImg.classList.remove('lqip');
+          };
+          full.onerror = () => { if (nextImg.dataset.src === nextUrl) nextFailed(); };
+          full.src = nextUrl;
+        } else {
+          nextImg.classList.remove('lqip');
+          nextImg.src = nextUrl;
+        }
         nextImg.style.display = 'block';
         nextNoImg.style.display = 'none';
       } else {
+        delete nextImg.dataset.src;
+        nextImg.classList.remove('lqip');
         nextImg.removeAttribute('src');
         nextImg.style.display = 'none';
         nextNoImg.style.display = 'block';
@@ -0,0 +1,34 @@
+import sqlite3
+
+import pytest
+
+from app.db import apply_migrations
+
+
+def _connect(path):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    apply_migrations(conn)
+    return conn
+
+
+@pytest.fixture
+def conn():
+    """An in-memory database with every migration applied."""
+    conn = _connect(':memory:')
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    """Open migrated database files under tmp_path, e.g. `db_file('app.db')`."""
+    opened = []
+
+    def _open(name='app.db'):
+        conn = _connect(tmp_path / name)
+        opened.append(conn)
+        return conn
+    yield _open
+    for conn in opened:
+        conn.close()
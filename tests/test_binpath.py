@@ -0,0 +1,60 @@
+import itertools
+import random
+
+from app import binpath
+from app.logic import sort_items
+
+
+def test_parse_location_formats():
+    assert binpath.parse_location('A-3-12') == (1, 3, 12)
+    assert binpath.parse_location('2.1.7') == (2, 1, 7)
+    assert binpath.parse_location('B12') == (2, None, 12)
+    assert binpath.parse_location('b-4') == (2, None, 4)
+    assert binpath.parse_location('C') == (3, None, None)
+    assert binpath.parse_location('') == (None, None, None)
+
+
+def test_two_part_labels_are_positions_along_the_aisle():
+    b2, b9 = binpath.bin_coords({'location': 'B2'}), binpath.bin_coords({'location': 'B9'})
+    assert (b2, b9) == ((2, 0, 2), (2, 0, 9))
+    assert binpath.distance(b2, b9) == 7
+
+
+def test_distance_routes_through_cross_aisle():
+    assert binpath.distance((1, 0, 5), (1, 0, 9)) == 4
+    # Leave aisle 1 at the front, then walk up aisle 2.
+    assert binpath.distance((1, 0, 5), (2, 0, 9)) == 5 + 9 + binpath.AISLE_SPACING
+
+
+def test_plan_route_visits_each_point_once_and_is_optimal_on_small_input():
+    rng = random.Random(7)
+    points = [(rng.randint(1, 3), rng.randint(0, 3), rng.randint(0, 20)) for _ in range(7)]
+    order = binpath.plan_route(points)
+    assert sorted(order) == list(range(len(points)))
+    best = min(binpath.route_length([points[i] for i in perm]) for perm in itertools.permutations(range(len(points))))
+    got = binpath.route_length([points[i] for i in order])
+    assert got <= best * 1.15
+
+
+def test_plan_route_beats_alphabetical_on_scattered_bins():
+    rng = random.Random(1)
+    points = [(rng.randint(1, 10), rng.randint(0, 4), rng.randint(0, 30)) for _ in range(120)]
+    planned = binpath.route_length([points[i] for i in binpath.plan_route(points)])
+    assert planned < binpath.route_length(points) / 2
+
+
+def test_set_order_puts_unbinned_sets_last():
+    bins = {('magic', 'woe'): (2, 0, 3), ('magic', 'lci'): (1, 0, 8), ('magic', 'dsk'): (1, 0, 2)}
+    order = binpath.set_order([('Magic', 'woe'), ('Magic', 'zzz'), ('Magic', 'lci'), ('Magic', 'dsk'), ('Magic', 'abc')], bins)
+    assert order == [('magic', 'dsk'), ('magic', 'lci'), ('magic', 'woe'), ('magic', 'abc'), ('magic', 'zzz')]
+
+
+def test_sort_items_path_mode_follows_rank():
+    items = [
+        {'game': 'Magic', 'set_code': 'aaa', 'card_name': 'A'},
+        {'game': 'Magic', 'set_code': 'zzz', 'card_name': 'Z'},
+        {'game': 'Magic', 'set_code': 'mmm', 'card_name': 'M'},
+    ]
+    rank = {('magic', 'zzz'): 0, ('magic', 'aaa'): 1}
+    out = sort_items(items, sort_by='path', set_rank=rank)
+    assert [i['card_name'] for i in out] == ['Z', 'A', 'M']
@@ -0,0 +1,64 @@
+import io
+import json
+import sqlite3
+
+import pytest
+
+from app import bulkdata, cardcodec, jsonstream
+
+
+def test_iter_array_handles_elements_split_across_chunks():
+    values = [{'id': 'a', 'text': 'has ] and , and "quotes"'}, [1, [2, 3]], 12345, 'x', None, {'nested': {'k': [{}]}}]
+    text = ' \n' + json.dumps(values, indent=2) + '\n'
+    for chunk_size in (1, 3, 7, 64):
+        assert list(jsonstream.iter_array(io.StringIO(text), chunk_size=chunk_size)) == values
+
+
+def test_iter_array_rejects_non_arrays_and_truncation():
+    assert list(jsonstream.iter_array(io.StringIO('  '))) == []
+    with pytest.raises(ValueError):
+        list(jsonstream.iter_array(io.StringIO('{"a": 1}')))
+    with pytest.raises(ValueError):
+        list(jsonstream.iter_array(io.StringIO('[{"a": 1}, {"b"'), chunk_size=4))
+
+
+def test_ingest_upserts_in_chunks_and_skips_unchanged(conn):
+    cards = [{'id': f'c{i}', 'name': f'Card {i}', 'set': 'abc', 'collector_number': str(i)} for i in range(5)]
+    first = bulkdata.ingest(conn, io.StringIO(json.dumps(cards + [{'object': 'no id'}])), chunk_size=2)
+    assert first == {'seen': 6, 'inserted': 5, 'updated': 0, 'unchanged': 0, 'skipped': 1}
+
+    cards[3]['name'] = 'Renamed'
+    second = bulkdata.ingest(conn, io.StringIO(json.dumps(cards)), chunk_size=2)
+    assert second == {'seen': 5, 'inserted': 0, 'updated': 1, 'unchanged': 4, 'skipped': 0}
+
+    row = conn.execute("SELECT card_name, data_json FROM card_cache WHERE scryfall_id = 'c3'").fetchone()
+    assert row['card_name'] == 'Renamed'
+    assert cardcodec.decode(row['data_json'])['name'] == 'Renamed'
+    assert conn.execute('SELECT COUNT(*) AS c FROM card_cache').fetchone()['c'] == 5
+
+
+def test_ingest_keeps_in_lists_under_the_variable_limit(conn, monkeypatch):
+    # Like an old SQLite build's 999-variable limit, scaled down.
+    monkeypatch.setattr(bulkdata, 'IN_CHUNK', 4)
+    conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 32)
+    cards = [{'id': f'c{i}', 'name': f'Card {i}', 'set': 'abc'} for i in range(40)]
+    assert bulkdata.ingest(conn, io.StringIO(json.dumps(cards)), chunk_size=40)['inserted'] == 40
+    assert bulkdata.ingest(conn, io.StringIO(json.dumps(cards)), chunk_size=40)['unchanged'] == 40
+
+
+def test_run_skips_download_when_bulk_file_unchanged(conn, monkeypatch, tmp_path):
+    path = tmp_path / 'cards.json'
+    path.write_text(json.dumps([{'id': 'a', 'name': 'A'}]), encoding='utf-8')
+    info = {'type': 'default_cards', 'updated_at': '2026-01-01T00:00:00', 'download_uri': 'https://example/x.json'}
+    downloads = []
+    monkeypatch.setattr(bulkdata, 'bulk_info', lambda bulk_type=None: info)
+    monkeypatch.setattr(bulkdata, 'download', lambda i: downloads.append(i) or path)
+
+    summary, err = bulkdata.run(conn)
+    assert err is None and summary['inserted'] == 1
+    summary, err = bulkdata.run(conn)
+    assert err is None and 'inserted' not in summary
+    assert len(downloads) == 1
+    assert bulkdata.last_run(conn)['status'] == 'unchanged'
+    assert conn.execute('SELECT COUNT(*) FROM scryfall_sync_log').fetchone()[0] == 2
+    assert conn.execute('SELECT COUNT(*) FROM ck_sync_log').fetchone()[0] == 0
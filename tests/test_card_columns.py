@@ -0,0 +1,57 @@
+import json
+from pathlib import Path
+
+from app import scryfall
+
+MIGRATION = Path(__file__).resolve().parent.parent / 'migrations' / '017_card_cache_columns.sql'
+
+SINGLE = {
+    'id': 'a', 'name': 'Bolt', 'set': 'LEA', 'set_name': 'Alpha', 'collector_number': '161', 'rarity': 'common',
+    'oracle_id': 'o-a', 'released_at': '1993-08-05',
+    'image_uris': {'small': 'https://img/a/s.jpg', 'normal': 'https://img/a/n.jpg', 'large': 'https://img/a/l.jpg', 'png': 'https://img/a/p.png'},
+}
+DFC = {
+    'id': 'b', 'name': 'Front // Back', 'set': 'lea', 'set_name': 'Alpha', 'collector_number': '1', 'rarity': 'rare',
+    'released_at': '1993-08-01',
+    'card_faces': [
+        {'oracle_id': 'o-b', 'image_uris': {'small': 'https://img/b/s.jpg', 'normal': 'https://img/b/n.jpg'}},
+        {'image_uris': {'small': 'https://img/b/s2.jpg'}},
+    ],
+}
+
+
+def _columns(conn, sid):
+    return dict(conn.execute(
+        'SELECT set_name, rarity, image_small, image_normal, image_large, face_count, oracle_id, released_at '
+        'FROM card_cache WHERE scryfall_id = ?', (sid,),
+    ).fetchone())
+
+
+def test_migration_backfills_columns_and_sets(conn):
+    conn.execute('DELETE FROM sets')
+    for card in (SINGLE, DFC):
+        conn.execute(
+            "INSERT INTO card_cache (scryfall_id, card_name, set_code, collector_number, data_json, updated_at) VALUES (?, ?, ?, ?, ?, 't')",
+            (card['id'], card['name'], card['set'], card['collector_number'], json.dumps(card)),
+        )
+    conn.execute("INSERT INTO card_cache (scryfall_id, data_json, updated_at) VALUES ('bad', 'not json', 't')")
+    # Re-run only the backfill part; the columns already exist.
+    sql = MIGRATION.read_text(encoding='utf-8')
+    conn.executescript(sql[sql.index('UPDATE card_cache'):])
+
+    assert _columns(conn, 'b') == {
+        'set_name': 'Alpha', 'rarity': 'rare', 'image_small': 'https://img/b/s.jpg', 'image_normal': 'https://img/b/n.jpg',
+        'image_large': None, 'face_count': 2, 'oracle_id': 'o-b', 'released_at': '1993-08-01',
+    }
+    assert _columns(conn, 'a')['face_count'] == 1
+    assert [tuple(r) for r in conn.execute('SELECT code, name, released_at FROM sets')] == [('lea', 'Alpha', '1993-08-01')]
+
+
+def test_save_populates_columns_and_set_catalog(conn):
+    scryfall._save_card_cache(conn, SINGLE)
+    scryfall.save_cards(conn, [DFC])
+
+    assert _columns(conn, 'a')['image_large'] == 'https://img/a/l.jpg'
+    assert _columns(conn, 'b')['oracle_id'] == 'o-b'
+    assert scryfall.card_image_url(conn, 'b', 'normal') == 'https://img/b/n.jpg'
+    assert [tuple(r) for r in conn.execute('SELECT code, name, released_at FROM sets')] == [('lea', 'Alpha', '1993-08-01')]
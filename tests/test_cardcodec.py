@@ -0,0 +1,56 @@
+import json
+import sqlite3
+from pathlib import Path
+
+from app import cardcodec
+from app.db import apply_migrations
+
+CARD = {
+    'object': 'card', 'id': '0000579f-7b35-4ed3-b44c-db2a538066fe', 'name': 'Fury Sliver', 'lang': 'en',
+    'set': 'tsp', 'set_name': 'Time Spiral', 'collector_number': '157', 'rarity': 'uncommon',
+    'oracle_text': 'All Sliver creatures have double strike.', 'prices': {'usd': '0.37', 'usd_foil': '3.25'},
+    'legalities': {'standard': 'not_legal', 'modern': 'legal', 'legacy': 'legal'},
+    'purchase_uris': {'tcgplayer': 'https://example/t'},
+    'image_uris': {'normal': 'https://cards.scryfall.io/normal/front/0/0/0000579f.jpg'},
+}
+
+
+def test_round_trip_prunes_unused_fields():
+    blob = cardcodec.encode(CARD)
+    assert blob[0] == cardcodec.VERSION
+    card = cardcodec.decode(blob)
+    assert card['name'] == 'Fury Sliver'
+    assert card['image_uris'] == CARD['image_uris']
+    assert 'legalities' not in card and 'purchase_uris' not in card
+    assert len(blob) < len(json.dumps(CARD)) / 2
+
+
+def test_legacy_plain_json_still_decodes():
+    assert cardcodec.decode(json.dumps(CARD))['legalities']['modern'] == 'legal'
+    assert cardcodec.decode(json.dumps(CARD).encode('utf-8'))['id'] == CARD['id']
+
+
+def test_python_migration_compresses_existing_rows(tmp_path):
+    migrations = Path(__file__).resolve().parent.parent / 'migrations'
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    # Apply everything up to (not including) the compression migration, then
+    # insert a legacy row, then run the rest.
+    staged = tmp_path / 'migrations'
+    staged.mkdir()
+    for path in sorted(migrations.iterdir()):
+        if path.name < '018':
+            (staged / path.name).write_text(path.read_text(encoding='utf-8'), encoding='utf-8')
+    apply_migrations(conn, staged)
+    conn.execute(
+        "INSERT INTO card_cache (scryfall_id, card_name, data_json, updated_at) VALUES (?, 'Fury Sliver', ?, 't')",
+        (CARD['id'], json.dumps(CARD)),
+    )
+    conn.execute("INSERT INTO card_cache (scryfall_id, data_json, updated_at) VALUES ('bad', 'not json', 't')")
+    conn.commit()
+    apply_migrations(conn, migrations)
+
+    row = conn.execute('SELECT typeof(data_json) AS t, data_json FROM card_cache WHERE scryfall_id = ?', (CARD['id'],)).fetchone()
+    assert row['t'] == 'blob'
+    assert cardcodec.decode(row['data_json'])['name'] == 'Fury Sliver'
+    assert conn.execute("SELECT data_json FROM card_cache WHERE scryfall_id = 'bad'").fetchone()['data_json'] == 'not json'
@@ -1,6 +1,13 @@
+import io
+import json
 import sqlite3
+import threading
+import tracemalloc
 
-from app.cardkingdom import normalize_rows
+import pytest
+
+from app import cardkingdom
+from app.db import apply_migrations
 from app.buylist import compute_report, finish_to_foil, build_ck_sell_csv
 
 
@@ -33,20 +40,35 @@ def test_finish_to_foil():
     assert finish_to_foil(None) == 0
 
 
-def test_normalize_rows_dedup_and_types():
+def _best_rows(data):
+    """Expected buylist: normalized entries, highest price_buy per (scryfall_id, is_foil)."""
+    best = {}
+    for entry in data:
+        row = cardkingdom._normalize_entry(entry)
+        if row is not None and (row[:2] not in best or best[row[:2]]['price_buy'] < row[6]):
+            best[row[:2]] = dict(zip(cardkingdom.ROW_COLUMNS, row))
+    return best
+
+
+def test_load_buylist_dedup_and_types():
     data = [
         {'scryfall_id': 'a', 'is_foil': 'false', 'price_buy': '1.50', 'qty_buying': '3', 'name': 'X'},
         {'scryfall_id': 'a', 'is_foil': 'false', 'price_buy': '2.00', 'qty_buying': '1', 'name': 'X'},  # higher -> wins
+        {'scryfall_id': 'a', 'is_foil': 'false', 'price_buy': '1.75', 'qty_buying': '9', 'name': 'X'},  # lower -> ignored
         {'scryfall_id': 'a', 'is_foil': 'true', 'price_buy': '5.00', 'qty_buying': '2', 'name': 'X'},
         {'scryfall_id': 'b', 'is_foil': 'false', 'price_buy': '0', 'qty_buying': '0'},  # dropped (price 0)
         {'scryfall_id': '', 'is_foil': 'false', 'price_buy': '9'},  # dropped (no id)
     ]
-    rows = {(r['scryfall_id'], r['is_foil']): r for r in normalize_rows(data)}
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    apply_migrations(conn)
+    count, _ = cardkingdom.load_buylist(conn, io.StringIO(json.dumps({'data': data})), chunk_size=2)
+    rows = {(r['scryfall_id'], r['is_foil']): r for r in conn.execute('SELECT * FROM ck_buylist').fetchall()}
     assert rows[('a', 0)]['price_buy'] == 2.00
     assert rows[('a', 0)]['qty_buying'] == 1
     assert rows[('a', 1)]['price_buy'] == 5.00
     assert ('b', 0) not in rows
-    assert len(rows) == 2
+    assert count == len(rows) == 2
 
 
 def test_compute_report_ratio_value_and_threshold():
@@ -146,3 +168,208 @@ def test_compute_report_foil_must_match():
     conn.execute("INSERT INTO manapool_inventory VALUES ('i1','a',null,'X','s','1','NM','FO','EN',1000,3,'t')")
     conn.commit()
     assert compute_report(conn) == []
+
+
+def _pricelist(n):
+    data = [
+        {
+            'id': i, 'sku': f'SKU-{i}', 'scryfall_id': f'sid-{i // 2:06d}', 'url': f'mtg/set/card-{i}',
+            'name': f'Card {i}', 'variation': '', 'edition': 'Some Edition', 'is_foil': 'true' if i % 3 == 0 else 'false',
+            'price_retail': '1.99', 'qty_retail': 4, 'price_buy': f'{(i % 50) / 10:.2f}', 'qty_buying': 8,
+        }
+        for i in range(n)
+    ]
+    return {'meta': {'created_at': '2026-01-02 03:04:05', 'base_url': 'https://www.cardkingdom.com/'}, 'data': data}
+
+
+class _Download:
+    def __init__(self, path, status_code=200, headers=None):
+        self.path = path
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.sent = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_content(self, chunk_size=1):
+        with open(self.path, 'rb') as f:
+            while chunk := f.read(chunk_size):
+                self.sent += len(chunk)
+                yield chunk
+
+
+def test_load_buylist_streams_and_keeps_best_rows(db_file):
+    payload = _pricelist(500)
+    conn = db_file('a.db')
+    conn.execute("INSERT INTO ck_buylist VALUES ('stale',0,'X','S','sku','u',8.0,5)")
+    count, meta = cardkingdom.load_buylist(conn, io.StringIO(json.dumps(payload)), chunk_size=7)
+    assert meta['created_at'] == '2026-01-02 03:04:05'
+    expected = _best_rows(payload['data'])
+    rows = {(r['scryfall_id'], r['is_foil']): dict(r) for r in conn.execute('SELECT * FROM ck_buylist').fetchall()}
+    assert count == len(rows) == len(expected)
+    assert rows == expected
+
+
+def test_refresh_peak_memory_is_bounded(db_file, monkeypatch, tmp_path):
+    path = tmp_path / 'pricelist.json'
+    path.write_text(json.dumps(_pricelist(20_000)), encoding='utf-8')
+    monkeypatch.setattr(cardkingdom, 'DOWNLOAD_DIR', tmp_path / 'dl')
+    monkeypatch.setattr(cardkingdom.SESSION, 'get', lambda url, headers=None, stream=False, timeout=None: _Download(path))
+
+    def whole_payload(conn):
+        # What a refresh used to do: resp.json(), dedup into dicts, then a tuple per row.
+        payload = json.loads(path.read_bytes())
+        rows = list(_best_rows(payload['data']).values())
+        conn.execute('DELETE FROM ck_buylist')
+        conn.executemany(
+            'INSERT OR REPLACE INTO ck_buylist VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [tuple(r[c] for c in cardkingdom.ROW_COLUMNS) for r in rows],
+        )
+        conn.commit()
+        return len(rows)
+
+    def peak(fn, conn):
+        tracemalloc.start()
+        try:
+            result = fn(conn)
+            return tracemalloc.get_traced_memory()[1], result
+        finally:
+            tracemalloc.stop()
+
+    before, expected = peak(whole_payload, db_file('before.db'))
+    after, (summary, err) = peak(cardkingdom.refresh_buylist_cache, db_file('after.db'))
+    assert err is None and summary['rows'] == expected
+    assert summary['created_at'] == '2026-01-02 03:04:05'
+    assert before / after >= 5, (before, after)
+    assert [p.name for p in (tmp_path / 'dl').iterdir()] == ['buylist.lock']
+
+
+def test_refresh_is_conditional_and_skips_unchanged_pricelists(db_file, monkeypatch, tmp_path):
+    path = tmp_path / 'pricelist.json'
+    path.write_text(json.dumps(_pricelist(10)), encoding='utf-8')
+    monkeypatch.setattr(cardkingdom, 'DOWNLOAD_DIR', tmp_path / 'dl')
+    sent = []
+
+    def get(url, headers=None, stream=False, timeout=None):
+        sent.append(dict(headers or {}))
+        if (headers or {}).get('If-None-Match') == '"v1"':
+            return _Download(path, 304, {'ETag': '"v1"'})
+        return _Download(path, 200, {'ETag': '"v1"', 'Last-Modified': 'Fri, 02 Jan 2026 03:04:05 GMT'})
+    monkeypatch.setattr(cardkingdom.SESSION, 'get', get)
+    conn = db_file('app.db')
+
+    summary, err = cardkingdom.refresh_buylist_cache(conn)
+    assert err is None and summary['rows'] == 8 and 'unchanged' not in summary
+    assert cardkingdom.pricelist_state(conn)['created_at'] == '2026-01-02 03:04:05'
+
+    # 304 Not Modified: nothing downloaded or rewritten.
+    summary, err = cardkingdom.refresh_buylist_cache(conn)
+    assert err is None and summary['unchanged'] and summary['rows'] == 8
+    assert sent[1] == {'If-None-Match': '"v1"', 'If-Modified-Since': 'Fri, 02 Jan 2026 03:04:05 GMT'}
+
+    # A server ignoring validators still can't make us reload the same pricelist.
+    conn.execute("UPDATE ck_pricelist_meta SET etag = NULL")
+    conn.execute('DELETE FROM ck_buylist WHERE is_foil = 1')
+    conn.commit()
+    summary, err = cardkingdom.refresh_buylist_cache(conn)
+    assert err is None and summary['unchanged'] and summary['rows'] == 5
+
+    summary, err = cardkingdom.refresh_buylist_cache(conn, force=True)
+    assert err is None and summary['rows'] == 8 and sent[-1] == {}
+
+
+def test_unchanged_pricelist_download_stops_after_meta(db_file, monkeypatch, tmp_path):
+    path = tmp_path / 'pricelist.json'
+    path.write_text(json.dumps(_pricelist(5000)), encoding='utf-8')
+    monkeypatch.setattr(cardkingdom, 'DOWNLOAD_DIR', tmp_path / 'dl')
+    downloads = []
+
+    def get(url, headers=None, stream=False, timeout=None):
+        downloads.append(_Download(path))
+        return downloads[-1]
+    monkeypatch.setattr(cardkingdom.SESSION, 'get', get)
+    conn = db_file('app.db')
+
+    summary, err = cardkingdom.refresh_buylist_cache(conn)
+    assert err is None and 'unchanged' not in summary
+    assert downloads[0].sent == path.stat().st_size
+
+    # No validators honoured, but the body is dropped after its first chunk.
+    summary, err = cardkingdom.refresh_buylist_cache(conn)
+    assert err is None and summary['unchanged']
+    assert downloads[1].sent < path.stat().st_size / 4
+    assert [p.name for p in (tmp_path / 'dl').iterdir()] == ['buylist.lock']
+
+
+def test_concurrent_refreshes_run_one_at_a_time(db_file, monkeypatch, tmp_path):
+    path = tmp_path / 'pricelist.json'
+    path.write_text(json.dumps(_pricelist(200)), encoding='utf-8')
+    monkeypatch.setattr(cardkingdom, 'DOWNLOAD_DIR', tmp_path / 'dl')
+    active = []
+    overlaps = []
+
+    class Tracked(_Download):
+        def iter_content(self, chunk_size=1):
+            overlaps.append(len(active))
+            active.append(self)
+            try:
+                yield from super().iter_content(chunk_size)
+            finally:
+                active.remove(self)
+    monkeypatch.setattr(cardkingdom.SESSION, 'get', lambda url, headers=None, stream=False, timeout=None: Tracked(path))
+    db_file('app.db').close()
+    start = threading.Barrier(3)
+    results = []
+
+    def refresh():
+        conn = sqlite3.connect(tmp_path / 'app.db', timeout=30)
+        conn.row_factory = sqlite3.Row
+        start.wait()
+        results.append(cardkingdom.refresh_buylist_cache(conn, force=True))
+    threads = [threading.Thread(target=refresh) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert [err for _, err in results] == [None] * 3
+    assert [summary['rows'] for summary, _ in results] == [164] * 3
+    assert overlaps == [0, 0, 0]
+    assert [p.name for p in (tmp_path / 'dl').iterdir()] == ['buylist.lock']
+
+
+def test_load_buylist_swaps_staging_table_and_rolls_back(db_file, monkeypatch, tmp_path):
+    monkeypatch.setattr(cardkingdom, 'DOWNLOAD_DIR', tmp_path / 'dl')
+    conn = db_file('app.db')
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute("INSERT INTO ck_buylist VALUES ('old',0,'Old','S','sku','u',8.0,5)")
+    conn.execute("INSERT INTO ck_pricelist_meta (id, created_at, fetched_at) VALUES (1, 'c0', 't')")
+    conn.commit()
+    reader = sqlite3.connect(tmp_path / 'app.db')
+    seen = []
+    normalize = cardkingdom._normalize_entry
+
+    def observing(entry):
+        # Mid-load, other connections still read the complete old snapshot.
+        seen.append(reader.execute('SELECT scryfall_id FROM ck_buylist').fetchall())
+        return normalize(entry)
+    monkeypatch.setattr(cardkingdom, '_normalize_entry', observing)
+
+    count, _ = cardkingdom.load_buylist(conn, io.StringIO(json.dumps(_pricelist(20))), chunk_size=3)
+    assert count == 16 and set(map(tuple, seen)) == {(('old',),)}
+    assert reader.execute('SELECT COUNT(*) FROM ck_buylist').fetchone()[0] == 16
+    assert conn.execute('SELECT scryfall_id FROM ck_buylist_prev').fetchall()[0][0] == 'old'
+
+    # A broken pricelist leaves the live table alone.
+    monkeypatch.setattr(cardkingdom, '_normalize_entry', normalize)
+    with pytest.raises(ValueError):
+        cardkingdom.load_buylist(conn, io.StringIO('{"data": [{"scryfall_id": "x"'))
+    assert conn.execute('SELECT COUNT(*) FROM ck_buylist').fetchone()[0] == 16
+
+    assert cardkingdom.rollback_buylist(conn) == (1, None)
+    assert conn.execute('SELECT COUNT(*) FROM ck_buylist_prev').fetchone()[0] == 16
+    assert cardkingdom.pricelist_state(conn) == {}
+    assert cardkingdom.rollback_buylist(conn) == (16, None)
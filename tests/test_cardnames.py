@@ -0,0 +1,85 @@
+import io
+import json
+
+from app import bulkdata, cardnames, scryfall
+
+
+def _seed(conn):
+    scryfall._cards.clear()
+    scryfall.save_cards(conn, [
+        {'id': 'bolt-m10', 'name': 'Lightning Bolt', 'set': 'm10', 'collector_number': '146', 'released_at': '2009-07-17'},
+        {'id': 'bolt-a25', 'name': 'Lightning Bolt', 'set': 'a25', 'collector_number': '141', 'released_at': '2018-03-16'},
+        {'id': 'helix', 'name': 'Lightning Helix', 'set': 'rav', 'collector_number': '213', 'released_at': '2005-10-07'},
+        {'id': 'delver', 'name': 'Delver of Secrets // Insectile Aberration', 'set': 'isd', 'collector_number': '51', 'released_at': '2011-09-30'},
+        {'id': 'jotun', 'name': 'Jötun Grunt', 'set': 'csp', 'collector_number': '8', 'released_at': '2006-07-21'},
+    ])
+
+
+def test_distance_and_similarity():
+    assert cardnames.distance('kitten', 'sitting') == 3
+    assert cardnames.distance('', 'abc') == 3
+    assert cardnames.similarity('bolt', 'bolt') == 1.0
+    assert cardnames.similarity('', 'bolt') == 0.0
+
+
+def test_best_matches_exact_typo_face_and_miss(conn):
+    _seed(conn)
+    out = cardnames.best_matches(conn, [
+        ('Lightning Bolt', None),
+        ('lightning bolt', 'M10'),
+        ('Lightnig Bolt', None),
+        ('Delver of Secrets', None),
+        ('Jotun Grunt', None),
+        ('Totally Unknown Card', None),
+    ])
+    assert out[0] == ('bolt-a25', 1.0)
+    assert out[1] == ('bolt-m10', 1.0)
+    assert out[2][0] == 'bolt-a25' and cardnames.MIN_CONFIDENCE <= out[2][1] < 1.0
+    assert out[3] == ('delver', 1.0)
+    assert out[4] == ('jotun', 1.0)
+    assert out[5][1] < cardnames.MIN_CONFIDENCE
+
+
+def test_resolve_cards_matches_names_locally(conn, monkeypatch):
+    _seed(conn)
+    named = []
+    monkeypatch.setattr(scryfall, '_fetch_named', lambda conn, name: named.append(name))
+    items = [
+        {'card_name': 'Lightnig Bolt', 'set_code': 'm10'},
+        {'card_name': 'Delver of Secrets'},
+        {'card_name': 'Totally Unknown Card'},
+    ]
+
+    out = scryfall.resolve_cards(conn, items, remote=False)
+    assert [(c or {}).get('id') for c, _ in out] == ['bolt-m10', 'delver', None]
+    assert named == []
+
+    scryfall.resolve_cards(conn, items)
+    assert named == ['Totally Unknown Card']
+
+
+def test_name_index_rebuilds_when_cache_changes(conn):
+    _seed(conn)
+    assert cardnames.best_match(conn, 'Goblin Guidee')[1] < cardnames.MIN_CONFIDENCE
+    scryfall._save_card_cache(conn, {'id': 'guide', 'name': 'Goblin Guide', 'set': 'zen', 'collector_number': '126'})
+    sid, score = cardnames.best_match(conn, 'Goblin Guidee')
+    assert sid == 'guide' and score >= cardnames.MIN_CONFIDENCE
+
+
+def test_name_index_is_patched_on_save_and_rebuilt_after_bulk_ingest(db_file, monkeypatch):
+    monkeypatch.setattr(cardnames, '_index', None)
+    conn = db_file()
+    _seed(conn)
+    index = cardnames.name_index(conn)
+    statements = []
+    conn.set_trace_callback(statements.append)
+    assert cardnames.name_index(conn) is index
+    assert statements == ['PRAGMA database_list']  # no card_cache scan per lookup
+
+    scryfall._save_card_cache(conn, {'id': 'guide', 'name': 'Goblin Guide', 'set': 'zen', 'collector_number': '126'})
+    assert cardnames.name_index(conn) is index
+    assert cardnames.best_match(conn, 'Goblin Guidee')[0] == 'guide'
+
+    bulkdata.ingest(conn, io.StringIO(json.dumps([{'id': 'hero', 'name': 'Hero of Bladehold', 'set': 'som', 'collector_number': '11'}])))
+    assert cardnames.name_index(conn) is not index
+    assert cardnames.best_match(conn, 'Hero of Bladehald')[0] == 'hero'
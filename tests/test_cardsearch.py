@@ -0,0 +1,64 @@
+import pytest
+
+from app import cardsearch, scryfall
+
+
+@pytest.fixture(autouse=True)
+def _empty_card_lru():
+    scryfall._cards.clear()
+
+
+def _card(sid, name, set_code, number, released='2020-01-01'):
+    return {'id': sid, 'name': name, 'set': set_code, 'collector_number': number, 'released_at': released}
+
+
+def _ids(cards):
+    return [c['id'] for c in cards]
+
+
+def test_parse_query_extracts_filters():
+    assert cardsearch.parse_query('Lightning  Bolt SET:M10 cn:"146"') == ('Lightning Bolt', {'set': 'm10', 'cn': '146'})
+    assert cardsearch.parse_query('foo:bar bolt') == ('foo:bar bolt', {})
+
+
+def test_search_local_ranks_and_filters(conn):
+    scryfall.save_cards(conn, [
+        _card('a', 'Lightning Bolt', 'm10', '146', '2009-07-17'),
+        _card('b', 'Lightning Bolt', 'a25', '141', '2018-03-16'),
+        _card('c', 'Chain Lightning', 'leg', '137'),
+        _card('d', 'Lightning Helix', 'rav', '213'),
+        _card('e', 'Ob Nixilis Reignited', 'bfz', '119'),
+    ])
+
+    assert _ids(cardsearch.search_local(conn, 'lightning bolt')) == ['b', 'a']
+    assert _ids(cardsearch.search_local(conn, 'lightning')) == ['b', 'a', 'd', 'c']
+    assert _ids(cardsearch.search_local(conn, 'bolt lightn')) == ['b', 'a']
+    assert _ids(cardsearch.search_local(conn, 'bolt set:M10')) == ['a']
+    assert _ids(cardsearch.search_local(conn, 'set:a25 cn:141')) == ['b']
+    assert _ids(cardsearch.search_local(conn, 'ob nix')) == ['e']
+    assert _ids(cardsearch.search_local(conn, 'ob')) == ['e']
+    assert cardsearch.search_local(conn, 'nothing like it') == []
+
+
+def test_index_follows_renames_and_resaves(conn):
+    scryfall._save_card_cache(conn, _card('a', 'Old Name', 'abc', '1'))
+    scryfall._save_card_cache(conn, _card('a', 'New Name', 'abc', '1'))
+    assert cardsearch.search_local(conn, 'old name') == []
+    assert _ids(cardsearch.search_local(conn, 'new name')) == ['a']
+    conn.execute("DELETE FROM card_cache WHERE scryfall_id = 'a'")
+    assert cardsearch.search_local(conn, 'new name') == []
+
+
+def test_search_falls_back_to_scryfall_and_caches(conn, monkeypatch):
+    calls = []
+
+    def fake_search(query, limit=10):
+        calls.append(query)
+        return [_card('r1', 'Remote Card', 'xyz', '5')]
+    monkeypatch.setattr(scryfall, 'search_cards', fake_search)
+
+    cards, source = cardsearch.search(conn, 'remote card')
+    assert source == 'scryfall' and _ids(cards) == ['r1']
+    cards, source = cardsearch.search(conn, 'remote card')
+    assert source == 'local' and _ids(cards) == ['r1']
+    assert calls == ['remote card']
@@ -0,0 +1,86 @@
+from app import delist, manapool
+
+
+def _seed(conn):
+    conn.execute("INSERT INTO batches (id, name, status, source, created_at, updated_at) VALUES (1, 'CK', 'open', 'cardkingdom', 't', 't')")
+    for item_id in (1, 2):
+        conn.execute(
+            "INSERT INTO batch_items (id, batch_id, game, set_code, card_name, qty_required, updated_at) VALUES (?, 1, 'Magic', 's', 'X', 1, 't')",
+            (item_id,),
+        )
+    conn.execute("INSERT INTO manapool_inventory VALUES ('i1','a',null,'X','s','1','NM','NF','EN',1000,3,'t')")
+    conn.execute("INSERT INTO manapool_inventory VALUES ('i2','b',null,'Y','s','2','LP','FO','EN',500,1,'t')")
+    conn.commit()
+
+
+def _rows():
+    return [
+        (1, {'inventory_id': 'i1', 'scryfall_id': 'a', 'sell_qty': 2}),
+        (2, {'inventory_id': 'i2', 'scryfall_id': 'b', 'sell_qty': 1}),
+    ]
+
+
+def test_enqueue_is_durable_and_idempotent(conn):
+    _seed(conn)
+    summary = delist.enqueue(conn, 1, _rows())
+    conn.commit()
+    assert summary['queued'] == 2
+    out = {r['batch_item_id']: r for r in conn.execute('SELECT * FROM mp_delist_outbox').fetchall()}
+    assert out[1]['new_quantity'] == 1   # 3 listed - 2 sent
+    assert out[2]['new_quantity'] == 0   # last copy -> delete
+    assert out[1]['status'] == 'pending'
+    quantities = 'SELECT inventory_id, quantity FROM manapool_inventory ORDER BY inventory_id'
+    assert [tuple(r) for r in conn.execute(quantities)] == [('i1', 1), ('i2', 0)]
+    # Re-enqueueing the same batch items must not create duplicate intents
+    # or take the copies off the local inventory twice.
+    assert delist.enqueue(conn, 1, _rows())['queued'] == 0
+    conn.commit()
+    assert conn.execute('SELECT COUNT(*) FROM mp_delist_outbox').fetchone()[0] == 2
+    assert [tuple(r) for r in conn.execute(quantities)] == [('i1', 1), ('i2', 0)]
+    item = conn.execute('SELECT mp_delisted, mp_delist_status FROM batch_items WHERE id = 1').fetchone()
+    assert item['mp_delisted'] == 0
+    assert item['mp_delist_status'] == 'pending'
+
+
+def test_drain_once_marks_items_and_retries_errors(conn, monkeypatch):
+    _seed(conn)
+    delist.enqueue(conn, 1, _rows())
+    conn.commit()
+    calls = []
+
+    def _fake(scryfall_id, condition_id, finish_id, language_id, new_quantity, price_cents):
+        calls.append((scryfall_id, new_quantity))
+        if scryfall_id == 'b':
+            return None, 'ManaPool error: 500'
+        return {'action': 'update', 'dry_run': False}, None
+
+    monkeypatch.setattr(manapool, 'set_inventory_quantity', _fake)
+    summary = delist.drain_once(conn)
+    assert summary['attempted'] == 2
+    assert summary['ok'] == 1
+    assert summary['retried'] == 1
+    assert sorted(calls) == [('a', 1), ('b', 0)]
+
+    ok = conn.execute('SELECT mp_delisted, mp_delist_status FROM batch_items WHERE id = 1').fetchone()
+    assert (ok['mp_delisted'], ok['mp_delist_status']) == (1, 'done')
+    failed = conn.execute('SELECT * FROM mp_delist_outbox WHERE batch_item_id = 2').fetchone()
+    assert failed['status'] == 'retry'
+    assert failed['attempts'] == 1
+    assert failed['next_attempt_at'] is not None
+
+    # The retry isn't due yet, and completed rows are never re-sent.
+    assert delist.drain_once(conn)['attempted'] == 0
+    status = delist.batch_status(conn, 1)
+    assert status['done'] == 1
+    assert status['pending'] == 1
+
+
+def test_recover_requeues_rows_left_sending(conn):
+    _seed(conn)
+    delist.enqueue(conn, 1, _rows())
+    conn.commit()
+    claimed = delist._claim(conn, 10)
+    assert len(claimed) == 2
+    delist.recover(conn)
+    statuses = {r['status'] for r in conn.execute('SELECT status FROM mp_delist_outbox').fetchall()}
+    assert statuses == {'pending'}
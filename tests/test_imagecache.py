@@ -0,0 +1,227 @@
+import io
+import os
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from app import imagecache, lru, renditions, scryfall
+from app.db import apply_migrations
+
+
+def _fresh(monkeypatch, tmp_path, budget):
+    monkeypatch.setattr(imagecache, 'ROOT', tmp_path)
+    monkeypatch.setattr(imagecache, '_scanned', False)
+    monkeypatch.setattr(imagecache, '_index', lru.LRUCache('test_images', max_entries=1000, max_bytes=budget, on_evict=imagecache._evicted))
+    # Downloads here have no card_cache to store placeholders in.
+    monkeypatch.setattr(scryfall, '_placeholder_for_new_image', lambda scryfall_id: None)
+
+
+def _write(path, nbytes, mtime):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b'x' * nbytes)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_scan_shards_legacy_files_and_enforces_budget(monkeypatch, tmp_path):
+    _write(tmp_path / 'aa11_normal.jpg', 40, 1000)
+    _write(tmp_path / 'bb22_normal.jpg', 40, 2000)
+    _write(tmp_path / 'cc' / 'cc33_large.jpg', 40, 3000)
+    _fresh(monkeypatch, tmp_path, budget=100)
+
+    # The oldest file doesn't fit the budget and is deleted on the first scan.
+    assert imagecache.lookup('aa11', 'normal') is None
+    assert not (tmp_path / 'aa' / 'aa11_normal.jpg').exists()
+    assert imagecache.lookup('bb22', 'normal') == tmp_path / 'bb' / 'bb22_normal.jpg'
+    assert not (tmp_path / 'bb22_normal.jpg').exists()
+    assert imagecache.stats()['bytes'] == 80
+
+
+def test_add_evicts_least_recently_used(monkeypatch, tmp_path):
+    _fresh(monkeypatch, tmp_path, budget=100)
+    for sid in ('aa01', 'bb02'):
+        imagecache.add(_write(imagecache.path_for(sid, 'normal'), 40, 1000))
+    # A hit makes aa01 most recent and bumps its mtime for the next restart.
+    assert imagecache.lookup('aa01', 'normal')
+    assert os.stat(imagecache.path_for('aa01', 'normal')).st_mtime > 1000
+
+    imagecache.add(_write(imagecache.path_for('cc03', 'normal'), 40, 1000))
+    assert not imagecache.path_for('bb02', 'normal').exists()
+    assert imagecache.lookup('bb02', 'normal') is None
+    assert imagecache.lookup('aa01', 'normal') and imagecache.lookup('cc03', 'normal')
+    stats = imagecache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (3, 1, 1)
+
+
+JPEG = b'\xff\xd8' + b'\x00' * 100 + b'\xff\xd9'
+
+
+class _Stream:
+    def __init__(self, body, length=None):
+        self.status_code = 200
+        self.body = body
+        self.headers = {'Content-Length': str(len(body) if length is None else length)}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.body), 10):
+            yield self.body[i:i + 10]
+
+
+def test_write_rejects_truncated_and_non_jpeg(monkeypatch, tmp_path):
+    _fresh(monkeypatch, tmp_path, budget=10_000)
+    path = imagecache.path_for('aa01', 'normal')
+    for body, length in ((JPEG, len(JPEG) + 5), (JPEG[:-2], None), (b'<html>', None)):
+        with pytest.raises(ValueError):
+            imagecache.write(path, [body[:10], body[10:]], length)
+    assert list(path.parent.iterdir()) == []
+    assert imagecache.write(path, [JPEG], len(JPEG)).read_bytes() == JPEG
+
+
+def test_concurrent_requests_download_once(monkeypatch, tmp_path):
+    _fresh(monkeypatch, tmp_path, budget=10_000)
+    gets = []
+
+    class Session:
+        def get(self, url, stream=False, timeout=None):
+            gets.append(url)
+            time.sleep(0.05)
+            return _Stream(JPEG)
+    monkeypatch.setattr(scryfall, '_http', lambda: Session())
+    monkeypatch.setattr(scryfall.IMAGE_LIMIT, 'rate', 0)
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(scryfall.cache_image('aa01', 'https://img/aa01.jpg', 'normal')))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(gets) == 1
+    assert results == [imagecache.path_for('aa01', 'normal')] * 8
+    assert imagecache.path_for('aa01', 'normal').read_bytes() == JPEG
+
+
+def _card(sid):
+    return {'id': sid, 'image_uris': {s: f'https://img/{sid}_{s}.jpg' for s in ('small', 'normal', 'large')}}
+
+
+def _recording_session(monkeypatch, body=JPEG):
+    gets = []
+
+    class Session:
+        def get(self, url, stream=False, timeout=None):
+            gets.append(url)
+            return _Stream(body)
+    monkeypatch.setattr(scryfall, '_http', lambda: Session())
+    monkeypatch.setattr(scryfall.IMAGE_LIMIT, 'rate', 0)
+    return gets
+
+
+def test_renditions_come_from_one_downloaded_master(monkeypatch, tmp_path):
+    _fresh(monkeypatch, tmp_path, budget=10_000)
+    gets = _recording_session(monkeypatch)
+    monkeypatch.setattr(renditions, 'Image', object())
+    rendered = []
+
+    def fake_render(master, size, ext):
+        rendered.append((master.name, size, ext))
+        return b'RIFF\x00\x00\x00\x00WEBP' if ext == 'webp' else JPEG
+    monkeypatch.setattr(renditions, '_render', fake_render)
+
+    card = _card('aa01')
+    assert scryfall.ensure_image_cached(card, size='normal') == imagecache.path_for('aa01', 'normal')
+    assert scryfall.ensure_image_cached(card, size='large') == imagecache.path_for('aa01', 'large')
+    assert scryfall.ensure_image_cached(card, size='small', ext='webp') == imagecache.path_for('aa01', 'small', 'webp')
+    assert scryfall.ensure_image_cached(card, size='normal') == imagecache.path_for('aa01', 'normal')
+    assert gets == ['https://img/aa01_large.jpg']
+    assert rendered == [('aa01_large.jpg', 'normal', 'jpg'), ('aa01_large.jpg', 'small', 'webp')]
+
+
+def test_without_pillow_each_size_is_downloaded(monkeypatch, tmp_path):
+    _fresh(monkeypatch, tmp_path, budget=10_000)
+    gets = _recording_session(monkeypatch)
+    monkeypatch.setattr(renditions, 'Image', None)
+
+    card = _card('aa01')
+    assert not renditions.wants_webp('image/avif,image/webp,*/*')
+    assert scryfall.ensure_image_cached(card, size='normal') == imagecache.path_for('aa01', 'normal')
+    # WebP can't be made, so the JPEG is served instead.
+    assert scryfall.ensure_image_cached(card, size='large', ext='webp') == imagecache.path_for('aa01', 'large')
+    assert gets == ['https://img/aa01_normal.jpg', 'https://img/aa01_large.jpg']
+
+
+def test_render_resizes_master_with_pillow(tmp_path):
+    Image = pytest.importorskip('PIL.Image')
+    master = tmp_path / 'master.jpg'
+    Image.new('RGB', (672, 936), 'red').save(master, 'JPEG')
+    out = tmp_path / 'out.webp'
+    out.write_bytes(renditions._render(master, 'normal', 'webp'))
+    with Image.open(out) as img:
+        assert (img.format, img.size) == ('WEBP', (488, 680))
+
+
+def test_validators_hash_content_written_or_found(monkeypatch, tmp_path):
+    _fresh(monkeypatch, tmp_path, budget=10_000)
+    written = imagecache.write(imagecache.path_for('aa01', 'normal'), [JPEG[:10], JPEG[10:]])
+    found = _write(imagecache.path_for('bb02', 'normal'), 0, 1000)
+    found.write_bytes(JPEG)
+    imagecache.add(found)
+
+    digest, _ = imagecache.validators(written)
+    assert imagecache.validators(found)[0] == digest
+    assert len(digest) == imagecache.DIGEST_BYTES * 2
+    # Eviction forgets the hash along with the file.
+    imagecache._index.pop(str(written))
+    imagecache._evicted(str(written), None)
+    with pytest.raises(FileNotFoundError):
+        imagecache.validators(written)
+
+
+def test_placeholder_stored_once_from_cached_image(monkeypatch, tmp_path):
+    Image = pytest.importorskip('PIL.Image')
+    _fresh(monkeypatch, tmp_path / 'images', budget=1_000_000)
+    conn = sqlite3.connect(tmp_path / 'app.db')
+    conn.row_factory = sqlite3.Row
+    apply_migrations(conn)
+    scryfall.save_cards(conn, [{'id': 'aa01', 'name': 'A', 'set': 'aaa'}])
+    assert scryfall.ensure_placeholder(conn, 'aa01') is None
+
+    path = imagecache.path_for('aa01', 'large')
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.new('RGB', (672, 936), 'green').save(path, 'JPEG')
+    imagecache.add(path)
+    uri = scryfall.ensure_placeholder(conn, 'aa01')
+    assert uri.startswith('data:image/jpeg;base64,') and len(uri) < 1500
+    assert scryfall.placeholders(conn, ['aa01', 'zz99', None]) == {'aa01': uri}
+    path.unlink()
+    assert scryfall.ensure_placeholder(conn, 'aa01') == uri
+
+
+def test_first_download_stores_placeholder(monkeypatch, tmp_path):
+    Image = pytest.importorskip('PIL.Image')
+    placeholder_for_new_image = scryfall._placeholder_for_new_image
+    _fresh(monkeypatch, tmp_path / 'images', budget=1_000_000)
+    monkeypatch.setattr(scryfall, '_placeholder_for_new_image', placeholder_for_new_image)
+    conn = sqlite3.connect(tmp_path / 'app.db')
+    conn.row_factory = sqlite3.Row
+    apply_migrations(conn)
+    monkeypatch.setattr(scryfall, 'get_conn', lambda: conn)
+    scryfall.save_cards(conn, [{'id': 'bb02', 'name': 'B', 'set': 'bbb'}])
+    buf = io.BytesIO()
+    Image.new('RGB', (488, 680), 'blue').save(buf, 'JPEG')
+    _recording_session(monkeypatch, buf.getvalue())
+
+    # e.g. the card modal caching an image prefetch never saw.
+    assert scryfall.ensure_image_cached(_card('bb02'), size='normal')
+    assert scryfall.placeholders(conn, ['bb02'])['bb02'].startswith('data:image/jpeg;base64,')
@@ -0,0 +1,26 @@
+from app.lru import LRUCache
+
+
+def test_evicts_least_recently_used_by_entry_count():
+    cache = LRUCache('test_entries', max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # 'b' is now least recently used
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (3, 1, 1)
+
+
+def test_evicts_by_bytes_and_skips_oversized_entries():
+    cache = LRUCache('test_bytes', max_entries=100, max_bytes=10)
+    cache.put('a', 'x', size=4)
+    cache.put('b', 'y', size=4)
+    cache.put('c', 'z', size=4)
+    assert cache.get('a') is None
+    assert cache.stats()['bytes'] == 8
+    cache.put('huge', 'w', size=11)
+    assert cache.get('huge') is None
+    assert cache.pop('b') == 'y'
+    assert cache.stats()['bytes'] == 4
@@ -0,0 +1,54 @@
+import json
+from pathlib import Path
+
+from app import manapool
+from app.db import _run_python_migration
+
+MIGRATIONS = Path(__file__).resolve().parent.parent / 'migrations'
+MIGRATION = MIGRATIONS / '013_order_lines.sql'
+
+
+def _order(label, ship_name, items):
+    return {'order': {'label': label, 'shipping_address': {'name': ship_name}, 'items': items}}
+
+
+def test_migration_backfills_lines_from_cached_orders(conn):
+    data = _order('1001', 'Ada', [
+        {'quantity': 2, 'price_cents': 150, 'product': {'single': {'scryfall_id': 'a', 'condition_id': 'NM', 'finish_id': 'FO', 'language_id': 'EN'}}},
+        {'product': {'single': {'scryfall_id': 'b'}}},
+    ])
+    conn.execute("INSERT INTO manapool_orders_cache (order_id, raw_json, fetched_at) VALUES ('o1', ?, 't')", (json.dumps(data),))
+    conn.execute("INSERT INTO manapool_orders_cache (order_id, raw_json, fetched_at) VALUES ('bad', 'not json', 't')")
+    conn.executescript(MIGRATION.read_text(encoding='utf-8'))
+
+    rows = conn.execute('SELECT * FROM manapool_order_lines ORDER BY line_no').fetchall()
+    assert [(r['order_id'], r['scryfall_id'], r['quantity']) for r in rows] == [('o1', 'a', 2), ('o1', 'b', 1)]
+    assert rows[0]['label'] == '1001'
+    assert rows[0]['ship_name'] == 'Ada'
+    assert rows[0]['finish_id'] == 'FO'
+    assert rows[0]['price'] == 1.5
+
+
+def test_price_backfill_falls_back_to_single(conn):
+    data = _order('1002', 'Ada', [
+        {'product': {'single': {'scryfall_id': 'a', 'price_cents': 250}}},
+        {'price': '1.25', 'product': {'single': {'scryfall_id': 'b', 'price_cents': 999}}},
+        {'product': {'single': {'scryfall_id': 'c'}}},
+    ])
+    conn.execute("INSERT INTO manapool_orders_cache (order_id, raw_json, fetched_at) VALUES ('o2', ?, 't')", (json.dumps(data),))
+    conn.execute("INSERT INTO manapool_orders_cache (order_id, raw_json, fetched_at) VALUES ('bad', 'not json', 't')")
+    conn.executescript(MIGRATION.read_text(encoding='utf-8'))
+    _run_python_migration(conn, MIGRATIONS / '027_order_line_prices.py')
+
+    rows = conn.execute('SELECT scryfall_id, price FROM manapool_order_lines ORDER BY line_no').fetchall()
+    assert [(r['scryfall_id'], r['price']) for r in rows] == [('a', 2.5), ('b', 1.25), ('c', None)]
+
+
+def test_save_order_lines_replaces_existing_order(conn):
+    manapool.save_order_lines(conn, ['o1'], [
+        ('o1', 0, '1', 'Ada', 'a', 'NM', 'NF', 'EN', 1, None),
+        ('o1', 1, '1', 'Ada', 'b', 'NM', 'NF', 'EN', 1, None),
+    ])
+    manapool.save_order_lines(conn, ['o1'], [('o1', 0, '1', 'Ada', 'c', 'NM', 'NF', 'EN', 3, 2.0)])
+    rows = conn.execute('SELECT scryfall_id, quantity FROM manapool_order_lines').fetchall()
+    assert [(r['scryfall_id'], r['quantity']) for r in rows] == [('c', 3)]
@@ -0,0 +1,93 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from app import prefetch, scryfall
+from app.db import apply_migrations
+
+
+def _setup(monkeypatch, tmp_path, status='open'):
+    db = tmp_path / 'app.db'
+
+    def get_conn():
+        conn = sqlite3.connect(db)
+        conn.row_factory = sqlite3.Row
+        return conn
+    conn = get_conn()
+    apply_migrations(conn)
+    conn.execute("INSERT INTO batches (id, name, status, source, created_at, updated_at) VALUES (1, 'B', ?, 'manapool', 't', 't')", (status,))
+    items = [
+        # (scryfall_id, set_code, card_name, qty_required, qty_picked)
+        ('z1', 'zzz', 'Zeta', 1, 0),
+        ('a1', 'aaa', 'Beta', 2, 0),
+        ('a2', 'aaa', 'Alpha', 1, 0),
+        ('a1', 'aaa', 'Beta', 1, 0),
+        ('m1', 'mmm', 'Picked', 1, 1),
+    ]
+    for sid, set_code, name, required, picked in items:
+        conn.execute(
+            "INSERT INTO batch_items (batch_id, game, set_code, card_name, scryfall_id, qty_required, qty_picked, updated_at) "
+            "VALUES (1, 'Magic', ?, ?, ?, ?, ?, 't')",
+            (set_code, name, sid, required, picked),
+        )
+    scryfall._cards.clear()
+    scryfall.save_cards(conn, [{'id': sid, 'name': name, 'set': s} for sid, s, name, _, _ in items])
+    conn.commit()
+
+    fetched = []
+    monkeypatch.setattr(prefetch, 'get_conn', get_conn)
+    monkeypatch.setattr(prefetch, 'SIZES', ('normal', 'large'))
+    monkeypatch.setattr(scryfall, 'ensure_image_cached', lambda card, size: fetched.append((card['id'], size)) or 'path')
+    monkeypatch.setattr(prefetch, 'kick', lambda: True)
+    monkeypatch.setattr(scryfall, 'ensure_placeholder', lambda conn, sid: None)
+    monkeypatch.setattr(prefetch, '_jobs', {})
+    return fetched
+
+
+def _run(batch_id):
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        job = prefetch._jobs[batch_id]
+        job['status'] = 'running'
+        prefetch._run_job(job, executor)
+    return prefetch.status(batch_id)
+
+
+def test_prefetches_unpicked_cards_in_pick_order(monkeypatch, tmp_path):
+    fetched = _setup(monkeypatch, tmp_path)
+    assert prefetch.enqueue(1)
+    assert not prefetch.enqueue(1)
+
+    job = _run(1)
+
+    assert fetched == [('a2', 'normal'), ('a2', 'large'), ('a1', 'normal'), ('a1', 'large'), ('z1', 'normal'), ('z1', 'large')]
+    assert (job['status'], job['total'], job['done'], job['failed']) == ('done', 3, 3, 0)
+
+
+def test_prefetch_follows_the_bin_path(monkeypatch, tmp_path):
+    fetched = _setup(monkeypatch, tmp_path)
+    conn = sqlite3.connect(tmp_path / 'app.db')
+    conn.executemany(
+        "INSERT INTO set_bins (game, set_code, location, aisle, shelf, position, updated_at) VALUES ('Magic', ?, ?, ?, 1, 1, 't')",
+        [('zzz', 'A1', 1), ('aaa', 'C1', 3)],
+    )
+    conn.commit()
+    prefetch.enqueue(1)
+    _run(1)
+    assert [sid for sid, size in fetched if size == 'normal'] == ['z1', 'a2', 'a1']
+
+
+def test_cancel_and_closed_batches_skip_downloads(monkeypatch, tmp_path):
+    fetched = _setup(monkeypatch, tmp_path)
+    prefetch.enqueue(1)
+    assert prefetch.cancel(1)
+    assert prefetch.status(1)['status'] == 'cancelled'
+
+    prefetch._jobs[1] = prefetch._new_job(1)
+    prefetch._jobs[1]['cancelled'] = True
+    assert _run(1)['status'] == 'cancelled'
+    assert fetched == []
+
+    (tmp_path / 'closed').mkdir()
+    fetched = _setup(monkeypatch, tmp_path / 'closed', status='closed')
+    prefetch.enqueue(1)
+    assert _run(1)['status'] == 'cancelled'
+    assert fetched == []
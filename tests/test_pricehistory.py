@@ -0,0 +1,88 @@
+from app import pricehistory
+
+
+def _buylist(conn, rows):
+    conn.execute('DELETE FROM ck_buylist')
+    conn.executemany(
+        "INSERT INTO ck_buylist (scryfall_id, is_foil, name, edition, price_buy, qty_buying) VALUES (?, ?, ?, 'Ed', ?, ?)",
+        [(sid, foil, sid.upper(), price, qty) for (sid, foil), (price, qty) in rows.items()],
+    )
+    conn.commit()
+
+
+def _history_rows(conn):
+    return conn.execute('SELECT COUNT(*) FROM ck_price_history').fetchone()[0]
+
+
+def test_only_changes_are_stored_between_keyframes(conn, monkeypatch):
+    monkeypatch.setattr(pricehistory, 'KEYFRAME_EVERY', 0)
+    rows = {(f'c{i}', 0): (1.0, 4) for i in range(100)}
+    _buylist(conn, rows)
+    first = pricehistory.record(conn, 'day0')
+    assert first['keyframe'] and first['changed'] == 100
+    for day in range(1, 10):
+        rows[(f'c{day}', 0)] = (1.0 + day, 4)
+        _buylist(conn, rows)
+        assert pricehistory.record(conn, f'day{day}')['changed'] == 1
+    # An unchanged buylist costs a snapshot row and nothing else.
+    _buylist(conn, rows)
+    assert pricehistory.record(conn, 'day10')['changed'] == 0
+    assert _history_rows(conn) == 109
+
+
+def test_series_tracks_changes_removals_and_keyframes(conn, monkeypatch):
+    monkeypatch.setattr(pricehistory, 'KEYFRAME_EVERY', 3)
+    prices = [
+        {('a', 0): (2.0, 4), ('b', 0): (5.0, 1)},
+        {('a', 0): (2.0, 4), ('b', 0): (5.0, 1)},
+        {('a', 0): (2.5, 4)},  # b leaves the buylist
+        {('a', 0): (2.5, 4), ('b', 0): (6.0, 2)},  # keyframe; b is back
+        {('a', 0): (3.0, 4), ('b', 0): (6.0, 2)},
+    ]
+    results = []
+    for day, rows in enumerate(prices):
+        _buylist(conn, rows)
+        results.append(pricehistory.record(conn, f'day{day}'))
+    assert [r['keyframe'] for r in results] == [True, False, False, True, False]
+    assert [r['changed'] for r in results] == [2, 0, 2, 2, 1]
+
+    series = pricehistory.price_series(conn, 'a')
+    assert [(p['created_at'], p['price_buy']) for p in series] == [('day0', 2.0), ('day2', 2.5), ('day4', 3.0)]
+    series = pricehistory.price_series(conn, 'b')
+    assert [(p['created_at'], p['price_buy'], p['qty_buying']) for p in series] == [
+        ('day0', 5.0, 1), ('day2', None, None), ('day3', 6.0, 2),
+    ]
+    assert pricehistory.price_series(conn, 'a', is_foil=1) == []
+
+
+def test_biggest_movers_since_last_refresh(conn):
+    _buylist(conn, {('a', 0): (10.0, 1), ('b', 0): (1.0, 1), ('c', 1): (4.0, 1), ('d', 0): (3.0, 1)})
+    pricehistory.record(conn, 'day0')
+    assert pricehistory.biggest_movers(conn) == []
+
+    # a +10%, b +100%, c -50%, d dropped, e new.
+    _buylist(conn, {('a', 0): (11.0, 1), ('b', 0): (2.0, 1), ('c', 1): (2.0, 1), ('e', 0): (9.0, 1)})
+    pricehistory.record(conn, 'day1')
+    movers = pricehistory.biggest_movers(conn)
+    assert [(m['scryfall_id'], m['change_pct']) for m in movers] == [('b', 100.0), ('c', -50.0), ('a', 10.0)]
+    assert movers[1] == {
+        'scryfall_id': 'c', 'is_foil': 1, 'name': 'C', 'edition': 'Ed',
+        'old_price': 4.0, 'new_price': 2.0, 'change': -2.0, 'change_pct': -50.0,
+    }
+    assert [m['scryfall_id'] for m in pricehistory.biggest_movers(conn, limit=1)] == ['b']
+    assert [m['scryfall_id'] for m in pricehistory.biggest_movers(conn, min_price=5)] == ['a']
+
+
+def test_removal_on_a_keyframe_is_recorded(conn, monkeypatch):
+    monkeypatch.setattr(pricehistory, 'KEYFRAME_EVERY', 2)
+    for day, rows in enumerate([
+        {('a', 0): (1.0, 1), ('b', 0): (2.0, 1)},
+        {('a', 0): (1.5, 1), ('b', 0): (2.0, 1)},
+        {('a', 0): (1.5, 1)},  # keyframe; b leaves the buylist
+        {('a', 0): (1.5, 1)},
+    ]):
+        _buylist(conn, rows)
+        result = pricehistory.record(conn, f'day{day}')
+    series = pricehistory.price_series(conn, 'b')
+    assert [(p['created_at'], p['price_buy']) for p in series] == [('day0', 2.0), ('day2', None)]
+    assert result['changed'] == 0
@@ -0,0 +1,102 @@
+from app import putwall
+from app.putwall import assign_slots, allocate
+
+
+def _seed(conn):
+    conn.execute("INSERT INTO batches (id, name, status, source, created_at, updated_at) VALUES (1, 'B', 'open', 'manapool', 't', 't')")
+    conn.execute(
+        "INSERT INTO batch_items (id, batch_id, game, set_code, card_name, scryfall_id, condition, language, printing, "
+        "qty_required, qty_picked, updated_at) VALUES (10, 1, 'Magic', 's', 'A', 'a', 'NM', 'EN', 'Normal', 3, 2, 't')"
+    )
+    for order_id, label in (('o1', '1'), ('o2', '2')):
+        conn.execute(
+            "INSERT INTO manapool_order_lines (order_id, line_no, label, scryfall_id, condition_id, finish_id, language_id, quantity) "
+            "VALUES (?, 0, ?, 'a', 'NM', 'NF', 'EN', ?)",
+            (order_id, label, 2 if order_id == 'o1' else 1),
+        )
+    conn.commit()
+
+
+def _key(line):
+    return (line['scryfall_id'], line['condition_id'], line['language_id'], 'Normal')
+
+
+def test_assign_slots_orders_numeric_labels_first():
+    orders = [
+        {'order_id': 'x', 'label': '1010'},
+        {'order_id': 'y', 'label': 'A-7'},
+        {'order_id': 'z', 'label': '999'},
+    ]
+    assert assign_slots(orders) == {'z': 1, 'x': 2, 'y': 3}
+
+
+def test_allocate_splits_aggregated_lines_across_orders():
+    key_a = ('a', 'NM', 'EN', 'Normal')
+    key_b = ('b', 'NM', 'EN', 'Foil')
+    slots = {'o1': 1, 'o2': 2}
+    items = [{'id': 10, 'key': key_a, 'qty': 3}, {'id': 11, 'key': key_b, 'qty': 1}]
+    lines = [
+        {'order_id': 'o2', 'key': key_a, 'qty': 1},
+        {'order_id': 'o1', 'key': key_a, 'qty': 2},
+        {'order_id': 'o1', 'key': key_b, 'qty': 1},
+    ]
+    assert allocate(items, lines, slots) == [(10, 1, 2), (10, 2, 1), (11, 1, 1)]
+
+
+def test_allocate_ignores_unmatched_keys_and_caps_at_item_qty():
+    key = ('a', 'NM', 'EN', 'Normal')
+    slots = {'o1': 1, 'o2': 2}
+    items = [{'id': 1, 'key': key, 'qty': 1}]
+    lines = [
+        {'order_id': 'o1', 'key': key, 'qty': 1},
+        {'order_id': 'o2', 'key': key, 'qty': 1},
+        {'order_id': 'o1', 'key': ('a', 'LP', 'EN', 'Normal'), 'qty': 4},
+    ]
+    assert allocate(items, lines, slots) == [(1, 1, 1)]
+
+
+def test_build_allocates_picked_copies_and_marks_batch_built(conn):
+    _seed(conn)
+    assert not putwall.is_built(conn, 1)
+    assert putwall.build(conn, 1, ['o1', 'o2'], _key) == 2
+    rows = conn.execute('SELECT slot, qty FROM put_wall_allocations ORDER BY slot').fetchall()
+    assert [tuple(r) for r in rows] == [(1, 2)]  # 2 picked of 3 required
+    assert putwall.is_built(conn, 1)
+
+    # A batch without order lines has no slots but is still built.
+    assert putwall.build(conn, 1, [], _key) == 0
+    assert putwall.is_built(conn, 1)
+
+
+def test_put_never_overfills_an_allocation(conn, monkeypatch):
+    _seed(conn)
+    conn.execute('UPDATE batch_items SET qty_picked = 3')
+    putwall.build(conn, 1, ['o1', 'o2'], _key)
+    assert putwall.put(conn, 1, item_id=10)['item_qty_put'] == 1
+    stale = putwall._open_allocation(conn, 1, 10)
+    assert putwall.put(conn, 1, item_id=10)['slot'] == 1
+
+    # Another scan filled slot 1 after this one read it: move on to slot 2.
+    real = putwall._open_allocation
+    calls = []
+
+    def racing(conn, batch_id, batch_item_id):
+        calls.append(batch_item_id)
+        return stale if len(calls) == 1 else real(conn, batch_id, batch_item_id)
+    monkeypatch.setattr(putwall, '_open_allocation', racing)
+    info = putwall.put(conn, 1, item_id=10)
+    assert (info['slot'], info['item_qty'], info['item_qty_put']) == (2, 1, 1)
+    rows = conn.execute('SELECT slot, qty, qty_put FROM put_wall_allocations ORDER BY slot').fetchall()
+    assert [tuple(r) for r in rows] == [(1, 2, 2), (2, 1, 1)]
+    assert putwall.put(conn, 1, item_id=10) is None
+
+
+def test_packing_slips_list_every_order_line_and_mark_shorts(conn):
+    _seed(conn)
+    putwall.build(conn, 1, ['o1', 'o2'], _key)
+    putwall.put(conn, 1, item_id=10)
+    slips = putwall.packing_slips(conn, 1, _key)
+
+    assert [(s['slot'], s['order_id'], s['qty'], s['qty_put'], s['short']) for s in slips] == [(1, 'o1', 2, 1, 0), (2, 'o2', 0, 0, 1)]
+    line = slips[1]['lines'][0]
+    assert (line['item_id'], line['card_name'], line['qty'], line['qty_picked'], line['short']) == (10, 'A', 1, 0, 1)
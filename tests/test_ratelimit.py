@@ -0,0 +1,82 @@
+import gc
+import threading
+import time
+
+from app import ratelimit
+
+
+def test_bucket_allows_burst_then_spaces_requests():
+    bucket = ratelimit.TokenBucket('test_spacing', 50, burst=2)
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    elapsed = time.monotonic() - start
+    # Two tokens up front, then three more at 20 ms each.
+    assert 0.05 <= elapsed < 0.5
+    assert bucket.metrics()['priorities']['bulk']['requests'] == 5
+
+
+class _Clock:
+    """A clock that only moves when told to, so no token refills mid-setup."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.001)
+
+
+def test_interactive_waiters_go_first():
+    clock = _Clock()
+    bucket = ratelimit.TokenBucket('test_priority', 20, burst=1, clock=clock)
+    bucket.acquire()  # drain the bucket so everyone below has to queue
+    order = []
+    lock = threading.Lock()
+
+    def worker(level, tag):
+        bucket.acquire(level)
+        with lock:
+            order.append(tag)
+
+    threads = [threading.Thread(target=worker, args=(ratelimit.BULK, f'bulk{i}')) for i in range(3)]
+    for t in threads:
+        t.start()
+    _wait_until(lambda: bucket.metrics()['queue_depth'] == 3)
+    urgent = threading.Thread(target=worker, args=(ratelimit.INTERACTIVE, 'modal'))
+    urgent.start()
+    _wait_until(lambda: bucket.metrics()['queue_depth'] == 4)
+    # Release one token at a time.
+    for served in range(1, 5):
+        clock.now += 1
+        _wait_until(lambda: len(order) == served)
+    for t in threads + [urgent]:
+        t.join(2)
+
+    assert order[0] == 'modal'
+    assert sorted(order[1:]) == ['bulk0', 'bulk1', 'bulk2']
+    assert bucket.metrics()['queue_depth'] == 0
+
+
+def test_metrics_only_lists_live_buckets():
+    bucket = ratelimit.TokenBucket('test_throwaway', 1)
+    assert 'test_throwaway' in [m['name'] for m in ratelimit.metrics()]
+    del bucket
+    gc.collect()
+    assert 'test_throwaway' not in [m['name'] for m in ratelimit.metrics()]
+
+
+def test_priority_context_sets_default_level():
+    bucket = ratelimit.TokenBucket('test_context', 0)
+    with ratelimit.priority(ratelimit.INTERACTIVE):
+        bucket.acquire()
+    bucket.acquire()
+    stats = bucket.metrics()['priorities']
+    assert stats['interactive']['requests'] == 1
+    assert stats['bulk']['requests'] == 1
@@ -0,0 +1,214 @@
+import sqlite3
+import time
+
+import pytest
+
+from app import scryfall
+from app.db import apply_migrations
+
+
+class _Resp:
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+class _Session:
+    """Fake Scryfall: cards c0..c199 in set abc; the collection endpoint misses c150."""
+
+    known = {f'c{i}' for i in range(200)}
+
+    def __init__(self):
+        self.posts = []
+        self.gets = []
+        self.refreshes = []
+
+    def _card(self, sid):
+        return {'id': sid, 'name': f'Card {sid}', 'set': 'abc', 'collector_number': sid[1:]}
+
+    def post(self, url, json=None, timeout=None):
+        self.posts.append(json['identifiers'])
+        data, not_found = [], []
+        for ident in json['identifiers']:
+            sid = ident.get('id') or f"c{ident.get('collector_number')}"
+            if sid in self.known and sid != 'c150':
+                data.append(self._card(sid))
+            else:
+                not_found.append(ident)
+        return _Resp(200, {'data': data, 'not_found': not_found})
+
+    def get(self, url, params=None, timeout=None):
+        self.gets.append(url)
+        if url.endswith('/cards/c150'):
+            return _Resp(200, self._card('c150'))
+        return _Resp(404)
+
+
+def _setup(monkeypatch):
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    apply_migrations(conn)
+    session = _Session()
+    monkeypatch.setattr(scryfall, '_http', lambda: session)
+    monkeypatch.setattr(scryfall.API_LIMIT, 'rate', 0)
+    monkeypatch.setattr(scryfall, '_schedule_refresh', session.refreshes.extend)
+    scryfall._cards.clear()
+    return conn, session
+
+
+def test_fetch_cards_by_ids_batches_and_falls_back_for_not_found(monkeypatch):
+    conn, session = _setup(monkeypatch)
+    ids = [f'c{i}' for i in range(160)] + ['gone']
+
+    cards = scryfall.fetch_cards_by_ids(conn, ids)
+
+    assert sorted(len(chunk) for chunk in session.posts) == [11, 75, 75]
+    # Only the two ids the collection endpoint didn't return were fetched singly.
+    assert sorted(u.rsplit('/', 1)[1] for u in session.gets) == ['c150', 'gone']
+    assert len(cards) == 160 and 'gone' not in cards
+    assert conn.execute('SELECT COUNT(*) AS c FROM card_cache').fetchone()['c'] == 160
+
+    session.posts.clear()
+    assert len(scryfall.fetch_cards_by_ids(conn, ids[:10])) == 10
+    assert session.posts == []
+
+
+def test_resolve_cards_uses_set_and_number_in_bulk(monkeypatch):
+    conn, session = _setup(monkeypatch)
+    items = [
+        {'scryfall_id': 'c7'},
+        {'set_code': 'ABC', 'collector_number': '1'},
+        {'set_code': 'abc', 'collector_number': '999'},
+        {'card_name': 'Nothing'},
+    ]
+
+    out = scryfall.resolve_cards(conn, items, fuzzy=False)
+
+    assert [strategy for _, strategy in out] == ['id', 'set', None, None]
+    assert out[1][0]['id'] == 'c1'
+    assert len(session.posts) == 2
+
+
+def test_parsed_cards_are_cached_and_invalidated_on_save(monkeypatch):
+    conn, _ = _setup(monkeypatch)
+    scryfall._save_card_cache(conn, {'id': 'lru1', 'name': 'Old'})
+    assert scryfall._load_card_cache(conn, 'lru1')['name'] == 'Old'
+    # A hit never touches SQLite.
+    conn.execute("UPDATE card_cache SET data_json = '{}' WHERE scryfall_id = 'lru1'")
+    assert scryfall._load_card_cache(conn, 'lru1')['name'] == 'Old'
+
+    scryfall._save_card_cache(conn, {'id': 'lru1', 'name': 'New'})
+    assert scryfall._load_cards_cache(conn, ['lru1'])['lru1']['name'] == 'New'
+
+
+def test_cached_cards_are_read_only_and_forgotten_after_commit(monkeypatch):
+    _setup(monkeypatch)
+
+    class RacingConnection(sqlite3.Connection):
+        def commit(self):
+            # A reader that missed the LRU just before the commit caches the old row.
+            stale = self.execute("SELECT scryfall_id, data_json, updated_at FROM card_cache WHERE scryfall_id = 'lru2'").fetchone()
+            super().commit()
+            if stale:
+                scryfall._decode_row(stale)
+
+    conn = sqlite3.connect(':memory:', factory=RacingConnection)
+    conn.row_factory = sqlite3.Row
+    apply_migrations(conn)
+    scryfall._save_card_cache(conn, {'id': 'lru2', 'name': 'Old', 'card_faces': [{'name': 'Old'}]})
+    scryfall.save_cards(conn, [{'id': 'lru2', 'name': 'New', 'card_faces': [{'name': 'New'}]}])
+    card = scryfall._load_card_cache(conn, 'lru2')
+    assert card['name'] == 'New'
+
+    # Hits hand out the LRU's own read-only card instead of a copy.
+    assert scryfall._load_cards_cache(conn, ['lru2'])['lru2'] is card
+    with pytest.raises(TypeError):
+        card['name'] = 'Changed'
+    with pytest.raises(TypeError):
+        card['card_faces'][0]['name'] = 'Changed'
+    assert card['card_faces'][0]['name'] == 'New'
+
+
+def test_stale_cards_are_served_and_refreshed_in_background(monkeypatch):
+    conn, session = _setup(monkeypatch)
+    monkeypatch.setattr(scryfall, 'CARD_TTL_HOURS', 24)
+    scryfall.fetch_cards_by_ids(conn, ['c1', 'c2'])
+    conn.execute("UPDATE card_cache SET updated_at = '2000-01-01 00:00:00' WHERE scryfall_id = 'c1'")
+    scryfall._cards.clear()
+    session.posts.clear()
+
+    cards = scryfall.fetch_cards_by_ids(conn, ['c1', 'c2'])
+
+    assert set(cards) == {'c1', 'c2'}
+    assert session.posts == []
+    assert session.refreshes == ['c1']
+    assert scryfall.fetch_card_by_id(conn, 'c1')['id'] == 'c1'
+    assert session.refreshes == ['c1', 'c1']
+
+
+def test_failed_background_refreshes_back_off(monkeypatch):
+    schedule = scryfall._schedule_refresh
+    conn, session = _setup(monkeypatch)
+    submitted = []
+    monkeypatch.setattr(scryfall._refresh_pool, 'submit', lambda fn, ids: submitted.append(ids))
+    monkeypatch.setattr(scryfall, 'get_conn', lambda: conn)
+    monkeypatch.setattr(scryfall, '_refreshing', set())
+    scryfall._refresh_backoff.clear()
+
+    scryfall._refresh(['gone', 'c1'])
+    assert scryfall._refresh_backoff.get('c1') is None
+    failures, retry_at = scryfall._refresh_backoff.get('gone')
+    assert failures == 1 and retry_at > time.monotonic() + scryfall.REFRESH_BACKOFF_SECONDS - 5
+    # Every access to the stale card used to queue another refresh.
+    schedule(['gone', 'c1'])
+    schedule(['gone'])
+    assert submitted == [['c1']]
+
+    scryfall._refresh_backoff.put('gone', (1, 0))
+    schedule(['gone'])
+    assert submitted[-1] == ['gone']
+    scryfall._refresh(['gone'])
+    failures, retry_at = scryfall._refresh_backoff.get('gone')
+    assert failures == 2 and retry_at > time.monotonic() + 2 * scryfall.REFRESH_BACKOFF_SECONDS - 5
+
+
+def test_not_found_lookups_are_negatively_cached(monkeypatch):
+    conn, session = _setup(monkeypatch)
+    assert scryfall.fetch_card_by_id(conn, 'nope') is None
+    assert scryfall.fetch_card_by_id(conn, 'nope') is None
+    assert scryfall.fetch_cards_by_ids(conn, ['nope']) == {}
+    assert session.gets == ['https://api.scryfall.com/cards/nope']
+    assert session.posts == []
+
+    monkeypatch.setattr(scryfall, 'NEGATIVE_TTL_HOURS', 0)
+    assert scryfall.fetch_card_by_id(conn, 'nope') is None
+    assert len(session.gets) == 2
+
+
+def test_set_and_name_lookups_use_the_cache(monkeypatch):
+    conn, session = _setup(monkeypatch)
+    scryfall._save_card_cache(conn, {'id': 'x1', 'name': "Æther Vial’s Echo", 'set': 'xyz', 'collector_number': '7'})
+
+    assert scryfall.normalize_name("Æther Vial’s Echo") == 'aether vials echo'
+    assert scryfall.fetch_card_by_set(conn, 'XYZ', '7')['id'] == 'x1'
+    assert scryfall.fetch_card_fuzzy(conn, 'aether vials echo')['id'] == 'x1'
+    assert scryfall.fetch_cards_by_set(conn, [('XYZ', '7')])[('xyz', '7')]['id'] == 'x1'
+    assert session.gets == [] and session.posts == []
+
+    # Only the requested printings are read, not the rest of the set.
+    scryfall.save_cards(conn, [{'id': f'x{n}', 'name': f'Card {n}', 'set': 'xyz', 'collector_number': str(n)} for n in range(8, 20)])
+    loaded = []
+    load = scryfall._load_cards_cache
+    monkeypatch.setattr(scryfall, '_load_cards_cache', lambda conn, ids: loaded.extend(ids) or load(conn, ids))
+    statements = []
+    conn.set_trace_callback(statements.append)
+    found = scryfall.fetch_cards_by_set(conn, [('xyz', '7'), ('xyz', '12')])
+    conn.set_trace_callback(None)
+    assert {k: v['id'] for k, v in found.items()} == {('xyz', '7'): 'x1', ('xyz', '12'): 'x12'}
+    assert sorted(loaded) == ['x1', 'x12']
+    lookup = next(sql for sql in statements if 'collector_number' in sql)
+    plan = ' '.join(r[3] for r in conn.execute(f'EXPLAIN QUERY PLAN {lookup}'))
+    assert 'USING INDEX idx_card_cache_set_number (set_code=? AND collector_number=?)' in plan
@@ -0,0 +1,114 @@
+import os
+
+import pytest
+
+from app import imagecache, lru, renditions, scryfall, sprites
+
+
+def _seed(conn):
+    conn.execute("INSERT INTO batches (id, name, status, source, created_at, updated_at) VALUES (1, 'B', 'open', 'manapool', 't', 't')")
+    for sid, set_code, picked in (('aa01', 'aaa', 0), ('aa02', 'aaa', 1), ('aa01', 'aaa', 0), ('bb01', 'bbb', 0), (None, 'bbb', 0)):
+        conn.execute(
+            "INSERT INTO batch_items (batch_id, game, set_code, card_name, scryfall_id, qty_required, qty_picked, updated_at) "
+            "VALUES (1, 'Magic', ?, 'Card', ?, 1, ?, 't')",
+            (set_code, sid, picked),
+        )
+    conn.commit()
+
+
+def test_version_ignores_order_and_duplicates():
+    assert sprites.version(['b', 'a', 'a']) == sprites.version(['a', 'b'])
+    assert sprites.version(['a']) != sprites.version(['a', 'b'])
+
+
+def test_thumb_offsets_from_coordinate_map():
+    sheet = {'url': '/sprites/v.jpg', 'coords': {'aa01': [120, 84]}}
+    size = {'width': sprites.THUMB_WIDTH, 'height': sprites.THUMB_HEIGHT}
+    assert sprites.thumb(sheet, 'aa01') == {'url': '/sprites/v.jpg', 'placeholder': None, **size, 'x': 120, 'y': 84}
+    assert sprites.thumb(sheet, 'zz99') is None
+    assert sprites.thumb(None, 'aa01') is None
+    # Before its sheet is ready a row still shows its placeholder.
+    assert sprites.thumb(None, 'aa01', 'data:x') == {'url': None, 'placeholder': 'data:x', **size, 'x': 0, 'y': 0}
+
+
+def test_sheets_queue_missing_groups_once(conn, monkeypatch, tmp_path):
+    monkeypatch.setattr(imagecache, 'ROOT', tmp_path / 'images')
+    monkeypatch.setattr(imagecache, '_scanned', False)
+    monkeypatch.setattr(imagecache, '_index', lru.LRUCache('test_images', max_entries=100, max_bytes=10_000))
+    monkeypatch.setattr(renditions, 'Image', object())
+    scheduled = []
+    monkeypatch.setattr(sprites, 'schedule', lambda v, ids: scheduled.append(sorted(set(ids))))
+    _seed(conn)
+
+    # Picked lines stay in the sheet, so picking never changes its version.
+    assert sprites.sheets(conn, 1) == {'aaa': None, 'bbb': None}
+    assert scheduled == [['aa01', 'aa02'], ['bb01']]
+    assert sprites.sheets(conn, 1, 'bbb', build=False) == {'bbb': None}
+    assert len(scheduled) == 2
+
+    monkeypatch.setattr(renditions, 'Image', None)
+    assert sprites.sheets(conn, 1) == {}
+
+
+def test_build_composes_thumbnails(conn, monkeypatch, tmp_path):
+    Image = pytest.importorskip('PIL.Image')
+    monkeypatch.setattr(imagecache, 'ROOT', tmp_path / 'images')
+    monkeypatch.setattr(imagecache, '_scanned', False)
+    monkeypatch.setattr(imagecache, '_index', lru.LRUCache('test_images', max_entries=100, max_bytes=10_000_000))
+    for sid, colour in (('aa01', 'red'), ('aa02', 'blue')):
+        path = imagecache.path_for(sid, 'small')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        Image.new('RGB', (146, 204), colour).save(path, 'JPEG')
+        imagecache.add(path)
+    _seed(conn)
+    monkeypatch.setattr(sprites, 'get_conn', lambda: conn)
+
+    v = sprites.version(['aa01', 'aa02'])
+    sprites._build(v, ['aa01', 'aa02'])
+    coords = sprites._load(v)
+    assert coords == {'aa01': [0, 0], 'aa02': [sprites.THUMB_WIDTH, 0]}
+    with Image.open(sprites.sheet_path(v)) as sheet:
+        assert sheet.size == (2 * sprites.THUMB_WIDTH, sprites.THUMB_HEIGHT)
+        assert sheet.getpixel((sprites.THUMB_WIDTH + 5, 5))[2] > 200
+
+
+def test_missing_tiles_are_retried_and_maps_evicted_with_sheets(conn, monkeypatch, tmp_path):
+    Image = pytest.importorskip('PIL.Image')
+    monkeypatch.setattr(imagecache, 'ROOT', tmp_path / 'images')
+    monkeypatch.setattr(imagecache, '_scanned', False)
+    index = lru.LRUCache('test_images', max_entries=100, max_bytes=10_000_000, on_evict=imagecache._evicted)
+    monkeypatch.setattr(imagecache, '_index', index)
+    monkeypatch.setattr(renditions, 'Image', Image)
+    monkeypatch.setattr(scryfall, 'image_path_for_id', lambda conn, sid, size: None)
+
+    def cache_small(sid):
+        path = imagecache.path_for(sid, 'small')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        Image.new('RGB', (146, 204), 'red').save(path, 'JPEG')
+        imagecache.add(path)
+    cache_small('aa01')
+    _seed(conn)
+    monkeypatch.setattr(sprites, 'get_conn', lambda: conn)
+    scheduled = []
+    monkeypatch.setattr(sprites, 'schedule', lambda v, ids: scheduled.append(v))
+
+    v = sprites.version(['aa01', 'aa02'])
+    sprites._build(v, ['aa01', 'aa02'])  # aa02's image isn't available yet
+    first = sprites.sheets(conn, 1, 'aaa')['aaa']
+    assert first['coords'] == {'aa01': [0, 0]} and scheduled == []
+
+    # Once the retry interval has passed the sheet is rebuilt with the card.
+    old = sprites._map_path(v).stat().st_mtime - sprites.MISSING_RETRY_SECONDS - 1
+    os.utime(sprites._map_path(v), (old, old))
+    sprites.sheets(conn, 1, 'aaa')
+    assert scheduled == [v]
+    cache_small('aa02')
+    sprites._build(v, ['aa01', 'aa02'])
+    second = sprites.sheets(conn, 1, 'aaa')['aaa']
+    assert second['coords'] == {'aa01': [0, 0], 'aa02': [sprites.THUMB_WIDTH, 0]}
+    assert second['url'] != first['url']
+
+    # Evicting the sheet takes its coordinate map with it.
+    index.put('newer', (0, 0), index.max_bytes)
+    assert not sprites.sheet_path(v).exists()
+    assert not sprites._map_path(v).exists()
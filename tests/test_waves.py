@@ -0,0 +1,77 @@
+from app import waves
+
+
+def _seed(conn):
+    conn.execute("INSERT INTO batches (id, name, status, source, created_at, updated_at) VALUES (1, 'B', 'open', 'manapool', 't', 't')")
+
+
+def _item(conn, set_code, qty, picked=0, game='Magic'):
+    conn.execute(
+        "INSERT INTO batch_items (batch_id, game, set_code, card_name, qty_required, qty_picked, updated_at) VALUES (1, ?, ?, 'X', ?, ?, 't')",
+        (game, set_code, qty, picked),
+    )
+
+
+def _assignments(result):
+    return {(a['game'], a['set_code']): a['picker'] for a in result['assignments']}
+
+
+def _loads(weights, groups, pickers, base=None):
+    loads = list(base or [0] * pickers)
+    for w, g in zip(weights, groups):
+        loads[g] += w
+    return loads
+
+
+def test_partition_minimizes_heaviest_contiguous_load():
+    weights = [7, 2, 5, 10, 8]
+    groups = waves.partition(weights, 2)
+    assert groups == sorted(groups)
+    assert max(_loads(weights, groups, 2)) == 18
+
+
+def test_partition_counts_existing_load():
+    weights = [4, 4, 4, 4]
+    groups = waves.partition(weights, 2, base=[8, 0])
+    assert max(_loads(weights, groups, 2, base=[8, 0])) == 12
+    assert groups.count(1) == 3
+
+
+def test_plan_stores_reservations_for_every_remaining_set(conn):
+    _seed(conn)
+    for code, qty in [('aaa', 10), ('bbb', 10), ('ccc', 10), ('ddd', 10)]:
+        _item(conn, code, qty)
+    _item(conn, 'eee', 2, picked=2)
+
+    result = waves.plan(conn, 1, ['ana', 'ben'])
+
+    assert [a['set_code'] for a in result['assignments']] == ['aaa', 'bbb', 'ccc', 'ddd']
+    assert sorted(w['copies'] for w in result['waves']) == [20, 20]
+    rows = conn.execute('SELECT game, set_code, reserved_by FROM set_reservations WHERE batch_id = 1').fetchall()
+    assert {(r['game'], r['set_code']): r['reserved_by'] for r in rows} == _assignments(result)
+
+
+def test_rebalance_keeps_started_sets_and_moves_untouched_ones(conn):
+    _seed(conn)
+    for code in ('aaa', 'bbb', 'ccc', 'ddd'):
+        _item(conn, code, 10)
+    waves.plan(conn, 1, ['ana', 'ben'])
+    # ana has finished; ben has only started on ccc.
+    conn.execute("UPDATE batch_items SET qty_picked = qty_required WHERE set_code IN ('aaa', 'bbb')")
+    conn.execute("UPDATE batch_items SET qty_picked = 1 WHERE set_code = 'ccc'")
+
+    result = waves.rebalance(conn, 1)
+
+    assert _assignments(result) == {('Magic', 'ccc'): 'ben', ('Magic', 'ddd'): 'ana'}
+
+
+def test_games_sharing_a_set_code_keep_separate_pickers(conn):
+    _seed(conn)
+    _item(conn, 'abc', 10, game='Magic')
+    _item(conn, 'abc', 10, game='Lorcana')
+
+    result = waves.plan(conn, 1, ['ana', 'ben'])
+
+    assert sorted(_assignments(result).values()) == ['ana', 'ben']
+    rows = conn.execute('SELECT game, set_code, reserved_by FROM set_reservations WHERE batch_id = 1').fetchall()
+    assert {(r['game'], r['set_code']): r['reserved_by'] for r in rows} == _assignments(result)